@@ -0,0 +1,127 @@
+"""
+Synthetic, reproducible inputs for the service benchmarks.
+
+Everything is generated from a seed, so two runs with the same arguments send
+byte-identical requests. The audio is not speech, but it has what the
+pipeline reacts to: voiced stretches with a pitch and syllable rhythm, pauses
+between utterances for the VAD to find, and a low noise floor.
+"""
+import os
+import wave
+from typing import Dict, List
+
+import numpy as np
+
+SAMPLE_RATE = 16000
+
+_ENGLISH_WORDS = (
+    "the patient child mother therapist session goal speech language communication "
+    "assessment progress weekly improved reported started responded play turn taking "
+    "eye contact words phrases picture exchange follow-up clinic school teacher parent "
+    "sensory motor attention routine behaviour today during before after with and"
+).split()
+_HEBREW_WORDS = (
+    "המטופל הילד האם המטפלת מפגש מטרה דיבור שפה תקשורת אבחון התקדמות שבועי שיפור "
+    "דיווחה התחיל הגיב משחק תור קשר עין מילים משפטים גן מורה הורים היום במהלך עם"
+).split()
+_NAMES = ["Noa", "Daniel", "Dr. Cohen", "Maya", "Yosef", "Tel Aviv", "Sheba", "ADOS"]
+
+
+def sentence(rng: np.random.Generator, hebrew_ratio: float = 0.3) -> str:
+    words = _HEBREW_WORDS if rng.random() < hebrew_ratio else _ENGLISH_WORDS
+    tokens = [words[i] for i in rng.integers(0, len(words), size=int(rng.integers(6, 16)))]
+    if rng.random() < 0.5:
+        tokens.insert(int(rng.integers(0, len(tokens))), _NAMES[int(rng.integers(0, len(_NAMES)))])
+    return " ".join(tokens).capitalize() + "."
+
+
+def transcript(seed: int, sentences: int) -> str:
+    """
+    A transcript-like text of `sentences` sentences, unique per seed.
+    """
+    rng = np.random.default_rng(seed)
+    return " ".join(sentence(rng) for _ in range(sentences))
+
+
+def documents(seed: int, count: int) -> List[Dict[str, str]]:
+    """
+    Search index documents with stable "benchmark-" ids.
+    """
+    rng = np.random.default_rng(seed)
+    return [
+        {
+            "id": f"benchmark-{index}",
+            "type": "recording_segment",
+            "title": f"Benchmark document {index}",
+            "text": " ".join(sentence(rng) for _ in range(3)),
+        }
+        for index in range(count)
+    ]
+
+
+def alignment(seed: int, segments: int) -> Dict[str, List[Dict]]:
+    """
+    Transcript segments and overlapping two-speaker turns for /speech/align.
+    """
+    rng = np.random.default_rng(seed)
+    segment_list, turns = [], []
+    time = 0.0
+    for _ in range(segments):
+        duration = float(rng.uniform(1.5, 6.0))
+        segment_list.append({"text": sentence(rng, hebrew_ratio=0.0), "start_time": round(time, 3),
+                             "end_time": round(time + duration, 3)})
+        time += duration + float(rng.uniform(0.0, 0.8))
+    turn_time, speaker = 0.0, 0
+    while turn_time < time:
+        duration = float(rng.uniform(2.0, 12.0))
+        # Turns start slightly before the previous one ends: people talk over each other.
+        turns.append({"speaker": f"SPEAKER_0{speaker}", "start_time": round(max(turn_time - 0.4, 0.0), 3),
+                      "end_time": round(turn_time + duration, 3)})
+        turn_time += duration
+        speaker = 1 - speaker
+    return {"segments": segment_list, "turns": turns}
+
+
+def speech_like_audio(seconds: float, seed: int) -> np.ndarray:
+    """
+    Mono float32 audio at 16 kHz: utterances of 1-6 s of harmonic, syllable-
+    modulated tones (one pitch per "speaker") separated by 0.3-1.5 s pauses.
+    """
+    rng = np.random.default_rng(seed)
+    total = int(seconds * SAMPLE_RATE)
+    audio = rng.normal(0.0, 0.002, total).astype(np.float32)
+    pitches = (110.0, 210.0)
+    position = int(rng.uniform(0.2, 1.0) * SAMPLE_RATE)
+    while position < total:
+        length = min(int(rng.uniform(1.0, 6.0) * SAMPLE_RATE), total - position)
+        t = np.arange(length) / SAMPLE_RATE
+        pitch = pitches[int(rng.integers(0, len(pitches)))] * (1.0 + 0.05 * np.sin(2 * np.pi * 0.7 * t))
+        phase = 2 * np.pi * np.cumsum(pitch) / SAMPLE_RATE
+        voiced = sum(np.sin(harmonic * phase) / harmonic for harmonic in (1, 2, 3, 4))
+        syllables = 0.5 * (1.0 + np.sin(2 * np.pi * rng.uniform(3.0, 5.0) * t)) ** 2
+        audio[position:position + length] += (0.15 * voiced * syllables).astype(np.float32)
+        position += length + int(rng.uniform(0.3, 1.5) * SAMPLE_RATE)
+    return np.clip(audio, -1.0, 1.0)
+
+
+def write_wav(path: str, audio: np.ndarray):
+    with wave.open(path, "wb") as handle:
+        handle.setnchannels(1)
+        handle.setsampwidth(2)
+        handle.setframerate(SAMPLE_RATE)
+        handle.writeframes((audio * 32767).astype("<i2").tobytes())
+
+
+def audio_files(directory: str, count: int, seconds: float, seed: int) -> List[str]:
+    """
+    Writes `count` distinct recordings of `seconds` each (reusing files from an
+    earlier run with the same parameters) and returns their paths.
+    """
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    for index in range(count):
+        path = os.path.join(directory, f"benchmark-{seed}-{index}-{seconds:g}s.wav")
+        if not os.path.exists(path):
+            write_wav(path, speech_like_audio(seconds, seed + index))
+        paths.append(path)
+    return paths
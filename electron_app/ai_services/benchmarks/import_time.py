@@ -0,0 +1,81 @@
+"""
+Import-time benchmark for the AI service.
+
+Each module is imported in a fresh interpreter so results are not skewed by
+modules cached from earlier imports. Run from the electron_app directory:
+
+    python -m ai_services.benchmarks.import_time --max-main-seconds 1.0
+
+The exit code is 1 when `ai_services.main` takes longer than the threshold,
+which lets CI catch startup regressions.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from typing import Dict, List
+
+MODULES = [
+    "ai_services.main",
+    "ai_services.speech.transcription",
+    "ai_services.nlp.ner",
+    "ai_services.nlp.search",
+    "ai_services.training.jobs",
+]
+
+_TIMER = (
+    "import time, importlib; started = time.perf_counter(); "
+    "importlib.import_module({module!r}); print(time.perf_counter() - started)"
+)
+
+
+def measure_import(module: str, repeat: int) -> List[float]:
+    env = dict(os.environ, AI_STARTUP_MODE="background")
+    timings = []
+    for _ in range(repeat):
+        output = subprocess.run(
+            [sys.executable, "-c", _TIMER.format(module=module)],
+            check=True, capture_output=True, text=True, env=env,
+        ).stdout
+        timings.append(float(output.strip().splitlines()[-1]))
+    return timings
+
+
+def run(modules: List[str], repeat: int) -> Dict[str, Dict[str, float]]:
+    results = {}
+    for module in modules:
+        timings = measure_import(module, repeat)
+        results[module] = {
+            "median_seconds": round(statistics.median(timings), 4),
+            "max_seconds": round(max(timings), 4),
+        }
+    return results
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=3, help="Fresh interpreters per module.")
+    parser.add_argument("--max-main-seconds", type=float, default=None,
+                        help="Fail if importing ai_services.main takes longer (median).")
+    parser.add_argument("--output", help="Also write the JSON results to this file.")
+    args = parser.parse_args(argv)
+
+    results = run(MODULES, args.repeat)
+    report = json.dumps(results, indent=2)
+    print(report)
+    if args.output:
+        with open(args.output, "w") as handle:
+            handle.write(report)
+
+    main_seconds = results["ai_services.main"]["median_seconds"]
+    if args.max_main_seconds is not None and main_seconds > args.max_main_seconds:
+        print(f"Importing ai_services.main took {main_seconds}s (limit {args.max_main_seconds}s)",
+              file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
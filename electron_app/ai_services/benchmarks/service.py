@@ -0,0 +1,455 @@
+"""
+Endpoint benchmark for the AI service.
+
+Drives the FastAPI app with synthetic audio and text, either in-process
+(through the ASGI interface, no network) or over HTTP against a running or
+freshly launched server. Run from the electron_app directory:
+
+    python -m ai_services.benchmarks.service --requests 50 --concurrency 4
+    python -m ai_services.benchmarks.service --transport http --launch-server
+    python -m ai_services.benchmarks.service --transport http --url http://127.0.0.1:8000 \\
+        --scenarios transcribe,pipeline --baseline benchmark-results/previous.json
+
+For every scenario it reports p50/p95/p99 latency, throughput, the first
+(cold) request against the warm median, real-time factor for audio
+endpoints and tokens/s for summaries; for the run, start-up time and peak
+RSS. Results are written as JSON so runs can be compared with --baseline.
+
+In-process runs use a temporary data directory and disable the result cache
+(unless --result-cache), so repeated inputs measure inference, not lookups.
+Over HTTP the server's own settings apply; audio files must be readable by
+the server, which is the case when it runs on the same machine.
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+from . import corpus
+
+ELECTRON_APP_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class Scenario:
+    """
+    One endpoint under load. `payload(index)` builds the request body for the
+    index-th request; audio scenarios set `audio_seconds`, summarizing ones
+    `output_tokens(response)` to count generated tokens.
+    """
+
+    def __init__(self, name: str, method: str, path: str, payload: Callable[[int], Any],
+                 audio_seconds: float = 0.0, output_tokens: Optional[Callable[[Dict], int]] = None,
+                 setup: Optional[List[tuple]] = None, teardown: Optional[List[tuple]] = None):
+        self.name = name
+        self.method = method
+        self.path = path
+        self.payload = payload
+        self.audio_seconds = audio_seconds
+        self.output_tokens = output_tokens
+        self.setup = setup or []
+        self.teardown = teardown or []
+
+
+def _tokens(text: Optional[str]) -> int:
+    return len(text.split()) if text else 0
+
+
+def build_scenarios(args: argparse.Namespace, audio_paths: List[str]) -> Dict[str, Scenario]:
+    def audio(index: int) -> str:
+        return audio_paths[index % len(audio_paths)]
+
+    documents = corpus.documents(args.seed, args.documents)
+    alignment = corpus.alignment(args.seed, args.align_segments)
+    return {
+        "summarize": Scenario(
+            "summarize", "POST", "/ai/summarize",
+            lambda i: {"recording_id": i, "transcription_text": corpus.transcript(args.seed + i, args.sentences)},
+            output_tokens=lambda response: _tokens(response.get("summary")),
+        ),
+        "ner": Scenario(
+            "ner", "POST", "/nlp/ner",
+            lambda i: {"recording_id": i, "text": corpus.transcript(args.seed + i, args.sentences)},
+        ),
+        "search": Scenario(
+            "search", "POST", "/nlp/semantic_search",
+            lambda i: {"query": corpus.transcript(args.seed + i, 1), "top_k": 10, "mode": "hybrid"},
+            setup=[("POST", "/nlp/index/upsert", {"documents": documents})],
+            teardown=[("POST", "/nlp/index/delete", {"ids": [document["id"] for document in documents]})],
+        ),
+        "align": Scenario("align", "POST", "/speech/align", lambda i: alignment),
+        "transcribe": Scenario(
+            "transcribe", "POST", "/speech/transcribe_completed_audio",
+            lambda i: {"recording_id": i, "audio_data_ref": audio(i)},
+            audio_seconds=args.audio_seconds,
+        ),
+        "diarize": Scenario(
+            "diarize", "POST", "/speech/diarize",
+            lambda i: {"recording_id": i, "audio_data_ref": audio(i)},
+            audio_seconds=args.audio_seconds,
+        ),
+        "pipeline": Scenario(
+            "pipeline", "POST", "/pipeline/process",
+            lambda i: {"recording_id": i, "audio_data_ref": audio(i)},
+            audio_seconds=args.audio_seconds,
+            output_tokens=lambda response: _tokens(response.get("summary")),
+        ),
+    }
+
+# --- Measurement ---
+
+def _percentiles(values: List[float], scale: float = 1.0, digits: int = 2) -> Dict[str, Optional[float]]:
+    if not values:
+        return {"p50": None, "p95": None, "p99": None, "mean": None, "max": None}
+    array = np.asarray(values) * scale
+    p50, p95, p99 = np.percentile(array, [50, 95, 99])
+    return {
+        "p50": round(float(p50), digits), "p95": round(float(p95), digits), "p99": round(float(p99), digits),
+        "mean": round(float(array.mean()), digits), "max": round(float(array.max()), digits),
+    }
+
+
+def peak_rss_mb(pid: Optional[int] = None) -> Optional[float]:
+    """
+    Peak resident set size of this process, or of `pid` (Linux only).
+    """
+    if pid is None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux reports kilobytes, macOS bytes.
+        return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+    try:
+        with open(f"/proc/{pid}/status") as handle:
+            for line in handle:
+                if line.startswith("VmHWM:"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    return None
+
+
+async def _request(client, method: str, path: str, body: Any) -> tuple:
+    started = time.perf_counter()
+    response = await client.request(method, path, json=body)
+    elapsed = time.perf_counter() - started
+    try:
+        if response.headers.get("content-type", "").startswith("application/x-msgpack"):
+            import msgpack
+            content = msgpack.unpackb(response.content)
+        else:
+            content = response.json()
+    except ValueError:
+        content = None
+    return response.status_code, elapsed, content, len(response.content)
+
+
+async def run_scenario(client, scenario: Scenario, requests: int, concurrency: int, warmup: int,
+                       rss_pid: Optional[int]) -> Dict[str, Any]:
+    for method, path, body in scenario.setup:
+        status, _, _, _ = await _request(client, method, path, body)
+        if status >= 400:
+            return {"status": "setup_failed", "setup_status_code": status}
+
+    # The first request pays for lazy model loading: that is the cold latency.
+    status, first_latency, _, _ = await _request(client, scenario.method, scenario.path, scenario.payload(0))
+    if status >= 400:
+        return {"status": "unavailable", "status_code": status}
+    for index in range(1, warmup + 1):
+        await _request(client, scenario.method, scenario.path, scenario.payload(index))
+
+    latencies: List[float] = []
+    response_bytes: List[int] = []
+    tokens: List[int] = []
+    stages: Dict[str, List[float]] = {}
+    status_codes: Dict[str, int] = {}
+    pending = iter(range(warmup + 1, warmup + 1 + requests))
+
+    async def worker():
+        for index in pending:
+            status, latency, content, size = await _request(client, scenario.method, scenario.path,
+                                                            scenario.payload(index))
+            status_codes[str(status)] = status_codes.get(str(status), 0) + 1
+            if status >= 400:
+                continue
+            latencies.append(latency)
+            response_bytes.append(size)
+            if scenario.output_tokens and isinstance(content, dict):
+                tokens.append(scenario.output_tokens(content))
+            if isinstance(content, dict) and isinstance(content.get("timings"), dict):
+                for stage, seconds in content["timings"].items():
+                    stages.setdefault(stage, []).append(seconds)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(max(1, concurrency))))
+    wall = time.perf_counter() - started
+
+    for method, path, body in scenario.teardown:
+        await _request(client, method, path, body)
+
+    latency_ms = _percentiles(latencies, scale=1000.0)
+    result: Dict[str, Any] = {
+        "status": "ok",
+        "endpoint": f"{scenario.method} {scenario.path}",
+        "requests": requests,
+        "concurrency": concurrency,
+        "completed": len(latencies),
+        "errors": requests - len(latencies),
+        "status_codes": status_codes,
+        "wall_seconds": round(wall, 3),
+        "throughput_rps": round(len(latencies) / wall, 2) if wall else None,
+        "latency_ms": latency_ms,
+        "cold_first_request_ms": round(first_latency * 1000.0, 2),
+        "cold_over_warm": round(first_latency * 1000.0 / latency_ms["p50"], 2) if latency_ms["p50"] else None,
+        "response_bytes_p50": int(np.median(response_bytes)) if response_bytes else None,
+    }
+    if scenario.audio_seconds:
+        # Real-time factor: processing time over audio duration (below 1 is faster than real time).
+        result["audio_seconds"] = scenario.audio_seconds
+        result["rtf"] = _percentiles([latency / scenario.audio_seconds for latency in latencies], digits=4)
+        result["audio_seconds_per_second"] = round(len(latencies) * scenario.audio_seconds / wall, 2) if wall else None
+    if tokens:
+        result["output_tokens_per_request"] = round(float(np.mean(tokens)), 1)
+        # Per-request generation speed, and what the service delivers across all concurrent requests.
+        result["tokens_per_second"] = round(sum(tokens) / sum(latencies), 1) if sum(latencies) else None
+        result["aggregate_tokens_per_second"] = round(sum(tokens) / wall, 1) if wall else None
+    if stages:
+        result["stage_seconds_p50"] = {stage: round(float(np.median(values)), 4) for stage, values in stages.items()}
+    result["peak_rss_mb"] = peak_rss_mb(rss_pid)
+    return result
+
+# --- Targets ---
+
+def _service_env(args: argparse.Namespace, data_dir: str) -> Dict[str, str]:
+    env = {"AI_SERVICES_DATA_DIR": data_dir, "AI_SEARCH_INDEX_DIR": os.path.join(data_dir, "search_index")}
+    if not args.result_cache:
+        env["AI_RESULT_CACHE_MAX_MB"] = "0"
+    return env
+
+
+async def _wait_ready(client, timeout: float, server: Optional[subprocess.Popen] = None) -> float:
+    started = time.perf_counter()
+    while time.perf_counter() - started < timeout:
+        if server is not None and server.poll() is not None:
+            raise RuntimeError(f"The AI service exited with code {server.returncode} before it was ready "
+                               "(run with --verbose to see its output).")
+        try:
+            response = await client.get("/ready")
+            if response.status_code == 200 and response.json().get("ready"):
+                return time.perf_counter() - started
+        except Exception:
+            pass # The server is not accepting connections yet
+        await asyncio.sleep(0.05)
+    raise TimeoutError(f"The AI service was not ready after {timeout}s.")
+
+
+def _headers(args: argparse.Namespace) -> Dict[str, str]:
+    return {"accept": args.accept} if args.accept else {}
+
+
+@contextlib.asynccontextmanager
+async def in_process_target(args: argparse.Namespace, data_dir: str):
+    import httpx
+
+    # Settings are read at import time, so the environment is set first.
+    os.environ.update(_service_env(args, data_dir))
+    started = time.perf_counter()
+    from ai_services.main import app
+    import_seconds = time.perf_counter() - started
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=None,
+                                     headers=_headers(args)) as client:
+            ready_seconds = await _wait_ready(client, args.ready_timeout)
+            yield client, {
+                "import_seconds": round(import_seconds, 3),
+                "start_to_ready_seconds": round(import_seconds + ready_seconds, 3),
+            }, None
+
+
+@contextlib.asynccontextmanager
+async def http_target(args: argparse.Namespace, data_dir: str):
+    import httpx
+
+    server = None
+    started = time.perf_counter()
+    url = args.url
+    if args.launch_server:
+        url = f"http://127.0.0.1:{args.port}"
+        server = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "ai_services.main:app", "--port", str(args.port), "--log-level", "warning"],
+            cwd=ELECTRON_APP_DIR, env=dict(os.environ, **_service_env(args, data_dir)),
+            stdout=None if args.verbose else subprocess.DEVNULL, stderr=None if args.verbose else subprocess.DEVNULL,
+        )
+    try:
+        async with httpx.AsyncClient(base_url=url, timeout=None, headers=_headers(args)) as client:
+            ready_seconds = await _wait_ready(client, args.ready_timeout, server)
+            startup = {"start_to_ready_seconds": round(time.perf_counter() - started, 3)} if server else {
+                "note": "Server already running; start-up not measured.", "ready_check_seconds": round(ready_seconds, 3)}
+            yield client, startup, server.pid if server else args.server_pid
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait(timeout=30)
+
+# --- Reporting ---
+
+async def _service_info(client) -> Dict[str, Any]:
+    info: Dict[str, Any] = {}
+    for key, path in (("inference_profile", "/inference/profile"), ("models", "/models")):
+        response = await client.get(path)
+        if response.status_code == 200:
+            info[key] = response.json()
+    if "models" in info:
+        info["models"] = [model["name"] for model in info["models"].get("models", []) if model.get("loaded")]
+    return info
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ELECTRON_APP_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any]) -> Dict[str, Dict[str, Optional[float]]]:
+    """
+    Ratios against a baseline run: latency above 1.0 and throughput below 1.0 are regressions.
+    """
+    comparison = {}
+    for name, current in results["scenarios"].items():
+        previous = baseline.get("scenarios", {}).get(name)
+        if current.get("status") != "ok" or not previous or previous.get("status") != "ok":
+            continue
+
+        def ratio(now, before):
+            return round(now / before, 3) if now is not None and before else None
+
+        comparison[name] = {
+            "p50_latency_ratio": ratio(current["latency_ms"]["p50"], previous["latency_ms"]["p50"]),
+            "p99_latency_ratio": ratio(current["latency_ms"]["p99"], previous["latency_ms"]["p99"]),
+            "throughput_ratio": ratio(current["throughput_rps"], previous["throughput_rps"]),
+        }
+    return comparison
+
+
+def _summary_table(results: Dict[str, Any]) -> str:
+    lines = [f"{'scenario':<11} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'req/s':>8} {'cold ms':>9} {'RTF p50':>8} {'tok/s':>7}"]
+    for name, result in results["scenarios"].items():
+        if result.get("status") != "ok":
+            lines.append(f"{name:<11} {result.get('status')}")
+            continue
+        latency = result["latency_ms"]
+        rtf = result.get("rtf", {}).get("p50")
+        lines.append(
+            f"{name:<11} {latency['p50']:>9} {latency['p95']:>9} {latency['p99']:>9} {result['throughput_rps']:>8} "
+            f"{result['cold_first_request_ms']:>9} {rtf if rtf is not None else '-':>8} "
+            f"{result.get('tokens_per_second', '-'):>7}"
+        )
+    lines.append(f"peak RSS: {results['peak_rss_mb']} MB, start-up: {results['startup']}")
+    return "\n".join(lines)
+
+
+async def run(args: argparse.Namespace) -> Dict[str, Any]:
+    data_dir = args.data_dir or tempfile.mkdtemp(prefix="ai-benchmark-")
+    audio_paths = corpus.audio_files(args.audio_dir or os.path.join(data_dir, "audio"),
+                                     args.audio_files, args.audio_seconds, args.seed)
+    scenarios = build_scenarios(args, audio_paths)
+    selected = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    unknown = [name for name in selected if name not in scenarios]
+    if unknown:
+        raise SystemExit(f"Unknown scenarios: {', '.join(unknown)} (available: {', '.join(scenarios)})")
+
+    target = in_process_target if args.transport == "inprocess" else http_target
+    results: Dict[str, Any] = {
+        "meta": {
+            "started_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "transport": args.transport,
+            "url": args.url if args.transport == "http" and not args.launch_server else None,
+            "git_commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "result_cache": ("enabled" if args.result_cache else "disabled")
+                            if args.transport == "inprocess" or args.launch_server else "server setting",
+            "arguments": {key: value for key, value in vars(args).items() if key != "baseline"},
+        },
+        "scenarios": {},
+    }
+    async with target(args, data_dir) as (client, startup, rss_pid):
+        results["startup"] = startup
+        for name in selected:
+            print(f"Benchmarking {name}...", file=sys.stderr)
+            results["scenarios"][name] = await run_scenario(
+                client, scenarios[name], args.requests, args.concurrency, args.warmup, rss_pid)
+        results["service"] = await _service_info(client)
+        results["peak_rss_mb"] = peak_rss_mb(rss_pid)
+    return results
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--transport", choices=("inprocess", "http"), default="inprocess")
+    parser.add_argument("--url", default="http://127.0.0.1:8000", help="Server to benchmark with --transport http.")
+    parser.add_argument("--launch-server", action="store_true",
+                        help="Start a fresh uvicorn server (measures cold start and its peak RSS).")
+    parser.add_argument("--port", type=int, default=8765, help="Port for --launch-server.")
+    parser.add_argument("--server-pid", type=int, help="PID of an already running server, for its peak RSS.")
+    parser.add_argument("--scenarios", default="summarize,ner,search,align,transcribe,diarize,pipeline")
+    parser.add_argument("--requests", type=int, default=50, help="Measured requests per scenario.")
+    parser.add_argument("--concurrency", type=int, default=4, help="Requests in flight at once.")
+    parser.add_argument("--warmup", type=int, default=2, help="Unmeasured requests after the first (cold) one.")
+    parser.add_argument("--audio-seconds", type=float, default=60.0, help="Length of each synthetic recording.")
+    parser.add_argument("--audio-files", type=int, default=3, help="Distinct recordings, used in turn.")
+    parser.add_argument("--audio-dir", help="Where to write the synthetic recordings (default: the data directory).")
+    parser.add_argument("--sentences", type=int, default=40, help="Sentences per synthetic transcript.")
+    parser.add_argument("--documents", type=int, default=500, help="Documents indexed for the search scenario.")
+    parser.add_argument("--align-segments", type=int, default=400, help="Transcript segments per alignment request.")
+    parser.add_argument("--accept", help="Accept header, e.g. application/x-msgpack or "
+                        "application/vnd.apache.arrow.stream, to compare segment response encodings.")
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--data-dir", help="Data directory for in-process or launched servers (default: temporary).")
+    parser.add_argument("--result-cache", action="store_true", help="Keep the result cache enabled.")
+    parser.add_argument("--ready-timeout", type=float, default=300.0)
+    parser.add_argument("--verbose", action="store_true", help="Show the service's own log output.")
+    parser.add_argument("--output", help="JSON results file (default: benchmark-results/service-<time>.json).")
+    parser.add_argument("--baseline", help="Earlier results file to compare against.")
+    parser.add_argument("--max-p50-regression", type=float, default=None,
+                        help="Fail if any scenario's p50 latency grew by more than this fraction over the baseline.")
+    args = parser.parse_args(argv)
+
+    with contextlib.ExitStack() as stack:
+        if not args.verbose:
+            stack.enter_context(contextlib.redirect_stdout(stack.enter_context(open(os.devnull, "w"))))
+        results = asyncio.run(run(args))
+
+    exit_code = 0
+    if args.baseline:
+        with open(args.baseline) as handle:
+            results["comparison"] = compare(results, json.load(handle))
+        if args.max_p50_regression is not None:
+            for name, ratios in results["comparison"].items():
+                ratio = ratios["p50_latency_ratio"]
+                if ratio is not None and ratio > 1.0 + args.max_p50_regression:
+                    print(f"{name}: p50 latency is {ratio}x the baseline", file=sys.stderr)
+                    exit_code = 1
+
+    output = args.output or os.path.join("benchmark-results", f"service-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as handle:
+        json.dump(results, handle, indent=2, ensure_ascii=False)
+    print(_summary_table(results), file=sys.stderr)
+    print(f"Results written to {output}", file=sys.stderr)
+    return exit_code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,149 @@
+import json
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import numpy as np
+from fastapi import Request
+from fastapi.responses import Response
+from pydantic import BaseModel
+
+from .metrics import stage
+from .speech.segment_table import SegmentTable
+
+# --- Response Encoding ---
+# Segment-heavy endpoints (transcription, diarization, alignment, pipeline)
+# build their payload with SegmentTables and encode it here, in the format the
+# client asks for in its Accept header, without per-segment Pydantic models:
+#   application/json (default)           the same rows as before, encoded with
+#                                        orjson when it is installed
+#   application/x-msgpack                tables as columns; numeric columns are
+#                                        raw little-endian arrays ("msgpack")
+#   application/vnd.apache.arrow.stream  an Arrow IPC stream of the payload's
+#                                        first table, with the rest of the
+#                                        payload as JSON in the schema metadata
+#                                        ("pyarrow")
+# A binary format whose package is not installed falls back to JSON; the
+# Content-Type header says which format the client got.
+
+JSON = "application/json"
+MSGPACK = "application/x-msgpack"
+ARROW = "application/vnd.apache.arrow.stream"
+
+_ACCEPTED = {"application/msgpack": MSGPACK, MSGPACK: MSGPACK, ARROW: ARROW}
+
+
+def response_format(request: Request) -> str:
+    """
+    The first binary format listed in the Accept header, else JSON.
+    """
+    for part in request.headers.get("accept", "").split(","):
+        media_type = _ACCEPTED.get(part.split(";")[0].strip().lower())
+        if media_type:
+            return media_type
+    return JSON
+
+
+def _plain(value: Any, tables: Callable[[SegmentTable], Any]) -> Any:
+    if isinstance(value, SegmentTable):
+        return tables(value)
+    if isinstance(value, BaseModel):
+        return value.model_dump()
+    if isinstance(value, dict):
+        return {key: _plain(item, tables) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_plain(item, tables) for item in value]
+    return value
+
+
+def to_json(payload: Any) -> bytes:
+    plain = _plain(payload, SegmentTable.to_dicts)
+    try:
+        import orjson
+    except ImportError:
+        return json.dumps(plain, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    return orjson.dumps(plain)
+
+
+def _msgpack_columns(table: SegmentTable) -> Dict[str, Any]:
+    columns: Dict[str, Any] = {"length": len(table), "dtypes": {}}
+    for name, column in table.columns().items():
+        if isinstance(column, np.ndarray):
+            column = np.ascontiguousarray(column, dtype=column.dtype.newbyteorder("<"))
+            columns["dtypes"][name] = column.dtype.str
+            # msgpack packs buffers as bin without copying them first.
+            column = memoryview(column).cast("B")
+        columns[name] = column
+    return columns
+
+
+def _arrow_table(table: SegmentTable):
+    import pyarrow as pa
+
+    speakers = pa.array(table.speakers, type=pa.string())
+    arrays = {
+        "start_time": pa.array(table.start),
+        "end_time": pa.array(table.end),
+        "speaker": pa.DictionaryArray.from_arrays(pa.array(table.speaker, mask=table.speaker < 0), speakers),
+    }
+    if table.text is not None:
+        arrays["text"] = pa.DictionaryArray.from_arrays(pa.array(table.text), pa.array(table.texts, type=pa.string()))
+    if table.overlap_offsets is not None:
+        heard = pa.DictionaryArray.from_arrays(pa.array(table.overlap_speakers), speakers)
+        arrays["overlapping_speakers"] = pa.ListArray.from_arrays(pa.array(table.overlap_offsets), heard)
+    return pa.table(arrays)
+
+
+def _first_table(payload: Any) -> Tuple[Optional[str], Optional[SegmentTable]]:
+    if isinstance(payload, SegmentTable):
+        return None, payload
+    if isinstance(payload, dict):
+        for key, value in payload.items():
+            if isinstance(value, SegmentTable):
+                return key, value
+    return None, None
+
+
+def _to_arrow(payload: Any) -> Optional[memoryview]:
+    key, table = _first_table(payload)
+    if table is None:
+        return None
+    import pyarrow as pa
+
+    arrow_table = _arrow_table(table)
+    if key is not None:
+        rest = {name: value for name, value in payload.items() if name != key}
+        metadata = {"table": key, "payload": to_json(rest).decode("utf-8")}
+        arrow_table = arrow_table.replace_schema_metadata(metadata)
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, arrow_table.schema) as writer:
+        writer.write_table(arrow_table)
+    return memoryview(sink.getvalue())
+
+
+def encode(payload: Any, media_type: str = JSON) -> Response:
+    """
+    Encodes a payload (SegmentTables, models, lists and dicts) as a response.
+    """
+    with stage("encode"):
+        if media_type == MSGPACK:
+            try:
+                import msgpack
+            except ImportError:
+                media_type = JSON
+            else:
+                return Response(msgpack.packb(_plain(payload, _msgpack_columns), use_bin_type=True),
+                                media_type=MSGPACK)
+        if media_type == ARROW:
+            try:
+                body = _to_arrow(payload)
+            except ImportError:
+                body = None
+            if body is not None:
+                return Response(body, media_type=ARROW)
+        return Response(to_json(payload), media_type=JSON)
+
+
+def encoded(media_type: str, fn: Callable, *args: Any) -> Response:
+    """
+    encode(fn(*args), media_type), so an endpoint can run both in a worker pool.
+    """
+    return encode(fn(*args), media_type)
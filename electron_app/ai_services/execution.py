@@ -0,0 +1,177 @@
+import asyncio
+import contextvars
+import heapq
+import itertools
+import math
+import threading
+import time
+from concurrent.futures import Future
+from enum import IntEnum
+from typing import Any, Callable, Dict, List, Optional
+
+from . import settings
+from .metrics import metrics
+
+# --- Execution Pools ---
+# CPU-bound inference never runs on the event loop. Each workload class has
+# its own pool of worker threads (model runtimes release the GIL while they
+# compute), so a long transcription can only occupy speech workers while
+# search and NER keep theirs and /status, /ready and /metrics stay on the loop.
+# Training and batch transcription run in their own process pools on top.
+#
+# A pool's queue is bounded and ordered by priority: interactive calls
+# (search, streaming partials, single-text NER) start before normal ones
+# (file transcription, summaries), which start before batch work (indexing,
+# bulk NER). Batch work may only fill half the queue so interactive calls
+# always find room. A full queue raises PoolSaturated, which the API turns
+# into 429 with a Retry-After estimated from the pool's recent service times.
+
+
+class Priority(IntEnum):
+    INTERACTIVE = 0
+    NORMAL = 1
+    BATCH = 2
+
+
+class PoolSaturated(Exception):
+    def __init__(self, pool: str, retry_after: int):
+        super().__init__(f"The {pool} workers are saturated; retry in {retry_after}s.")
+        self.pool = pool
+        self.retry_after = retry_after
+
+
+pool_tasks = metrics.counter(
+    "ai_pool_tasks_total", "Tasks submitted to an execution pool, by outcome.", ("pool", "priority", "outcome"))
+pool_wait = metrics.histogram(
+    "ai_pool_queue_wait_seconds", "Time tasks waited in an execution pool's queue.", ("pool", "priority"))
+
+
+class WorkloadPool:
+    def __init__(self, name: str, workers: int, max_queue: int):
+        self.name = name
+        self.workers = max(1, workers)
+        self.max_queue = max(1, max_queue)
+        self._queue: List[tuple] = []
+        self._order = itertools.count()
+        self._condition = threading.Condition()
+        self._threads: List[threading.Thread] = []
+        self._busy = 0
+        self._closed = False
+        # Moving average of task durations, for Retry-After estimates.
+        self._average_seconds = 1.0
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self._queue)
+
+    @property
+    def busy(self) -> int:
+        return self._busy
+
+    def _queue_limit(self, priority: Priority) -> int:
+        return self.max_queue if priority < Priority.BATCH else max(1, self.max_queue // 2)
+
+    def retry_after(self) -> int:
+        """
+        Seconds until the queue has likely drained enough to take new work.
+        """
+        backlog = (len(self._queue) + self._busy) / self.workers
+        return int(min(max(math.ceil(backlog * self._average_seconds), 1), 60))
+
+    def submit(self, fn: Callable, *args: Any, priority: Priority = Priority.NORMAL) -> Future:
+        """
+        Queues fn(*args). Raises PoolSaturated if the queue is full for this priority.
+        """
+        future: Future = Future()
+        with self._condition:
+            if self._closed:
+                raise RuntimeError(f"The {self.name} pool is shut down.")
+            if len(self._queue) >= self._queue_limit(priority):
+                pool_tasks.inc(self.name, priority.name.lower(), "rejected")
+                raise PoolSaturated(self.name, self.retry_after())
+            if len(self._threads) < self.workers:
+                thread = threading.Thread(target=self._work, name=f"{self.name}-pool-{len(self._threads)}", daemon=True)
+                self._threads.append(thread)
+                thread.start()
+            heapq.heappush(self._queue, (priority, next(self._order), time.perf_counter(), future, fn, args))
+            self._condition.notify()
+        pool_tasks.inc(self.name, priority.name.lower(), "accepted")
+        return future
+
+    async def run(self, fn: Callable, *args: Any, priority: Priority = Priority.NORMAL) -> Any:
+        """
+        Runs fn(*args) in the pool with the caller's context (so request stage
+        timings are kept) and waits for it without blocking the event loop.
+        If the caller is cancelled while the task is still queued, it never runs.
+        """
+        context = contextvars.copy_context()
+        return await asyncio.wrap_future(self.submit(context.run, fn, *args, priority=priority))
+
+    def _work(self):
+        while True:
+            with self._condition:
+                while not self._queue and not self._closed:
+                    self._condition.wait()
+                if not self._queue:
+                    return
+                priority, _, queued_at, future, fn, args = heapq.heappop(self._queue)
+                if not future.set_running_or_notify_cancel():
+                    continue
+                self._busy += 1
+            started = time.perf_counter()
+            pool_wait.observe(started - queued_at, self.name, priority.name.lower())
+            try:
+                future.set_result(fn(*args))
+            except BaseException as error:
+                future.set_exception(error)
+            finally:
+                elapsed = time.perf_counter() - started
+                with self._condition:
+                    self._busy -= 1
+                    self._average_seconds = 0.8 * self._average_seconds + 0.2 * elapsed
+
+    def shutdown(self):
+        """
+        Cancels queued tasks; running ones finish, then the workers exit.
+        """
+        with self._condition:
+            self._closed = True
+            pending, self._queue = self._queue, []
+            self._condition.notify_all()
+        for entry in pending:
+            entry[3].cancel()
+
+    def stats(self) -> Dict:
+        return {
+            "name": self.name,
+            "workers": self.workers,
+            "busy": self._busy,
+            "queue_depth": len(self._queue),
+            "max_queue": self.max_queue,
+            "average_task_seconds": round(self._average_seconds, 3),
+            "retry_after_seconds": self.retry_after(),
+        }
+
+
+speech_pool = WorkloadPool("speech", settings.SPEECH_POOL_WORKERS, settings.SPEECH_POOL_MAX_QUEUE)
+nlp_pool = WorkloadPool("nlp", settings.NLP_POOL_WORKERS, settings.NLP_POOL_MAX_QUEUE)
+POOLS = {pool.name: pool for pool in (speech_pool, nlp_pool)}
+
+
+def shutdown_pools():
+    for pool in POOLS.values():
+        pool.shutdown()
+
+
+def _collect_metrics():
+    pools = list(POOLS.values())
+    return [
+        ("ai_queue_depth", "gauge", "Items waiting in a queue.",
+         [({"queue": f"{pool.name}_pool"}, pool.queue_depth) for pool in pools]),
+        ("ai_pool_busy_workers", "gauge", "Execution pool workers running a task.",
+         [({"pool": pool.name}, pool.busy) for pool in pools]),
+        ("ai_pool_workers", "gauge", "Execution pool size.", [({"pool": pool.name}, pool.workers) for pool in pools]),
+    ]
+
+
+metrics.register_collector(_collect_metrics)
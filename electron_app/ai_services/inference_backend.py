@@ -0,0 +1,311 @@
+import gc
+import os
+import re
+import statistics
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from pydantic import BaseModel
+from typing_extensions import Literal
+
+from . import settings
+from .execution import PoolSaturated
+from .model_registry import registry
+
+# --- Inference Backend ---
+# One compute profile decides how the speech, NER and embedding models run on
+# the CPU:
+#   fp32  PyTorch float32 (CTranslate2 float32 for Whisper)
+#   int8  PyTorch dynamic int8 quantization of Linear layers (CTranslate2 int8)
+#   onnx  ONNX Runtime for NER and embeddings (Whisper stays on CTranslate2 int8,
+#         which is already an optimized runtime)
+# plus intra-op (threads per operator) and inter-op (parallel operators) thread
+# counts. Loaders read the active profile when a model is loaded, so changing
+# the profile evicts the affected models and they reload on next use.
+
+Precision = Literal["fp32", "int8", "onnx"]
+PRECISIONS: Tuple[str, ...] = ("fp32", "int8", "onnx")
+# Registry keys of the models a profile applies to.
+PROFILE_MODELS = ("asr", "ner", "embedding")
+
+
+class InferenceProfile(BaseModel):
+    precision: Precision = "int8"
+    intra_op_threads: int = 1
+    inter_op_threads: int = 1
+
+
+_profile = InferenceProfile(
+    precision=settings.INFERENCE_PRECISION,
+    intra_op_threads=settings.INFERENCE_INTRA_OP_THREADS,
+    inter_op_threads=settings.INFERENCE_INTER_OP_THREADS,
+)
+_profile_lock = threading.Lock()
+
+
+def get_profile() -> InferenceProfile:
+    return _profile
+
+
+def set_profile(profile: InferenceProfile) -> List[str]:
+    """
+    Makes `profile` active and evicts loaded models built with the old one.
+    Returns the evicted model names. A model busy right now finishes its
+    current calls with the old profile; every later call gets a model loaded
+    with the new one, so results are never cached under the wrong precision.
+    """
+    global _profile
+    with _profile_lock:
+        _profile = profile
+    apply_torch_threads(profile)
+    print(f"AI Service (Inference): Profile set to {profile.precision} "
+          f"({profile.intra_op_threads} intra-op / {profile.inter_op_threads} inter-op threads)")
+    return [name for name in PROFILE_MODELS if registry.is_registered(name) and registry.evict(name, retire_busy=True)]
+
+
+def apply_torch_threads(profile: InferenceProfile):
+    try:
+        import torch
+    except ImportError:
+        return
+    torch.set_num_threads(profile.intra_op_threads)
+    try:
+        torch.set_num_interop_threads(profile.inter_op_threads)
+    except RuntimeError:
+        pass # Only settable before PyTorch runs its first parallel operation
+
+
+def asr_compute_type(profile: InferenceProfile) -> str:
+    if settings.ASR_COMPUTE_TYPE:
+        return settings.ASR_COMPUTE_TYPE
+    return "float32" if profile.precision == "fp32" else "int8"
+
+
+def _onnx_session_options(profile: InferenceProfile):
+    import onnxruntime
+    options = onnxruntime.SessionOptions()
+    options.intra_op_num_threads = profile.intra_op_threads
+    options.inter_op_num_threads = profile.inter_op_threads
+    options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+    return options
+
+
+def _quantize_dynamic(model: Any) -> Any:
+    import torch
+    return torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+# --- Loaders ---
+
+def load_asr_model(profile: InferenceProfile):
+    import whisperx
+    compute_type = asr_compute_type(profile)
+    print(f"AI Service (Inference): Loading WhisperX model '{settings.ASR_MODEL}' on {settings.ASR_DEVICE} "
+          f"({compute_type}, {profile.intra_op_threads} threads)")
+    return whisperx.load_model(
+        settings.ASR_MODEL, settings.ASR_DEVICE, compute_type=compute_type,
+        language=settings.ASR_LANGUAGE, threads=profile.intra_op_threads,
+    )
+
+
+def load_ner_pipeline(model_name: str, profile: InferenceProfile):
+    from transformers import AutoTokenizer, pipeline
+    print(f"AI Service (Inference): Loading NER model '{model_name}' ({profile.precision})")
+    apply_torch_threads(profile)
+    if profile.precision == "onnx":
+        from optimum.onnxruntime import ORTModelForTokenClassification
+        model = ORTModelForTokenClassification.from_pretrained(
+            model_name, export=True, session_options=_onnx_session_options(profile),
+            provider="CPUExecutionProvider",
+        )
+        tokenizer = AutoTokenizer.from_pretrained(model_name)
+        return pipeline("token-classification", model=model, tokenizer=tokenizer, aggregation_strategy="simple")
+    ner_pipeline = pipeline("token-classification", model=model_name, aggregation_strategy="simple")
+    if profile.precision == "int8":
+        ner_pipeline.model = _quantize_dynamic(ner_pipeline.model)
+    return ner_pipeline
+
+
+def load_sentence_transformer(model_name: str, profile: InferenceProfile):
+    from sentence_transformers import SentenceTransformer
+    print(f"AI Service (Inference): Loading embedding model '{model_name}' ({profile.precision})")
+    apply_torch_threads(profile)
+    if profile.precision == "onnx":
+        return SentenceTransformer(model_name, backend="onnx", model_kwargs={
+            "session_options": _onnx_session_options(profile), "provider": "CPUExecutionProvider",
+        })
+    model = SentenceTransformer(model_name)
+    return _quantize_dynamic(model) if profile.precision == "int8" else model
+
+# --- Profile Comparison ---
+# A fixed test set is run under every profile. The fp32 outputs are the
+# reference: NER reports entity F1 against them, embeddings the mean cosine
+# similarity, speech the word accuracy (1 - WER) against reference
+# transcripts when the test set has them (<name>.txt next to <name>.wav).
+
+TEST_SENTENCES = [
+    "The patient underwent an ADOS assessment on Monday at the Tel Aviv clinic.",
+    "Dr. Cohen recommended weekly speech therapy sessions for Noa.",
+    "Key treatment goal: improve expressive language and turn taking.",
+    "המטופל עבר אבחון ADOS בבית החולים שיבא ביום שני.",
+    "מטרת הטיפול העיקרית: שיפור יכולות תקשורת.",
+    "The mother reported that Daniel started using two-word phrases in March.",
+    "Follow-up with the occupational therapist is scheduled for next Thursday.",
+    "The child responded well to picture exchange communication during the session.",
+]
+
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def _word_error_rate(reference: str, hypothesis: str) -> float:
+    ref, hyp = _WORD_RE.findall(reference.lower()), _WORD_RE.findall(hypothesis.lower())
+    if not ref:
+        return 0.0 if not hyp else 1.0
+    previous = list(range(len(hyp) + 1))
+    for i, ref_word in enumerate(ref, start=1):
+        current = [i] + [0] * len(hyp)
+        for j, hyp_word in enumerate(hyp, start=1):
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ref_word != hyp_word))
+        previous = current
+    return previous[-1] / len(ref)
+
+
+def _entity_f1(reference: List[set], predicted: List[set]) -> float:
+    true_positive = sum(len(r & p) for r, p in zip(reference, predicted))
+    reference_total = sum(len(r) for r in reference)
+    predicted_total = sum(len(p) for p in predicted)
+    if reference_total == 0 and predicted_total == 0:
+        return 1.0
+    precision = true_positive / predicted_total if predicted_total else 0.0
+    recall = true_positive / reference_total if reference_total else 0.0
+    return 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+
+
+def _timed(run: Callable[[Any], Any], items: List[Any], repeats: int) -> Tuple[List[Any], List[float]]:
+    run(items[0]) # Warm-up
+    outputs, latencies = [], []
+    for _ in range(repeats):
+        outputs = []
+        for item in items:
+            started = time.perf_counter()
+            outputs.append(run(item))
+            latencies.append(time.perf_counter() - started)
+    return outputs, latencies
+
+
+def _testset_audio() -> List[Tuple[str, Optional[str]]]:
+    directory = settings.INFERENCE_TESTSET_DIR
+    if not directory or not os.path.isdir(directory):
+        return []
+    pairs = []
+    for name in sorted(os.listdir(directory)):
+        if name.lower().endswith(".wav"):
+            reference = os.path.join(directory, name[:-4] + ".txt")
+            text = open(reference, encoding="utf-8").read() if os.path.isfile(reference) else None
+            pairs.append((os.path.join(directory, name), text))
+    return pairs
+
+
+def _run_ner(profile: InferenceProfile, repeats: int):
+    if not settings.NER_MODEL:
+        raise RuntimeError("AI_NER_MODEL is not set.")
+    with registry.temporary("ner", lambda: load_ner_pipeline(settings.NER_MODEL, profile)) as model:
+        run = lambda text: {(int(e["start"]), int(e["end"]), e["entity_group"]) for e in model(text)}
+        return _timed(run, TEST_SENTENCES, repeats)
+
+
+def _run_embedding(profile: InferenceProfile, repeats: int):
+    if settings.EMBEDDING_MODEL == "hashing":
+        raise RuntimeError("AI_EMBEDDING_MODEL is the hashing embedder.")
+    with registry.temporary("embedding", lambda: load_sentence_transformer(settings.EMBEDDING_MODEL, profile)) as model:
+        run = lambda text: model.encode([text], normalize_embeddings=True, show_progress_bar=False)[0]
+        return _timed(run, TEST_SENTENCES, repeats)
+
+
+def _run_asr(profile: InferenceProfile, repeats: int):
+    from .speech.asr import whisperx_available
+    from .speech.audio_io import open_audio
+    if not whisperx_available():
+        raise RuntimeError("whisperx is not installed.")
+    audio = _testset_audio()
+    if not audio:
+        raise RuntimeError("AI_INFERENCE_TESTSET_DIR has no .wav files.")
+    with registry.temporary("asr", lambda: load_asr_model(profile)) as model:
+
+        def run(path: str) -> str:
+            with open_audio(path) as source:
+                result = model.transcribe(source.read(0.0, source.duration), batch_size=settings.ASR_BATCH_SIZE)
+            return " ".join(segment["text"].strip() for segment in result.get("segments", []))
+
+        return _timed(run, [path for path, _ in audio], repeats)
+
+
+def _accuracy(family: str, outputs: List[Any], reference: List[Any]) -> Dict[str, float]:
+    if family == "ner":
+        return {"entity_f1_vs_fp32": round(_entity_f1(reference, outputs), 4)}
+    if family == "embedding":
+        import numpy as np
+        similarity = [float(np.dot(a, b)) for a, b in zip(outputs, reference)]
+        return {"mean_cosine_vs_fp32": round(float(np.mean(similarity)), 4)}
+    references = [text for _, text in _testset_audio()]
+    if all(text is not None for text in references):
+        errors = [_word_error_rate(ref, hyp) for ref, hyp in zip(references, outputs)]
+        return {"word_accuracy": round(1.0 - statistics.mean(errors), 4)}
+    errors = [_word_error_rate(ref, hyp) for ref, hyp in zip(reference, outputs)]
+    return {"word_agreement_vs_fp32": round(1.0 - statistics.mean(errors), 4)}
+
+
+_RUNNERS = {"ner": _run_ner, "embedding": _run_embedding, "asr": _run_asr}
+_compare_lock = threading.Lock()
+
+
+def compare_profiles(precisions: List[str], families: List[str], repeats: int = 3) -> Dict[str, Dict]:
+    """
+    Loads each model family under each precision (with the active thread
+    counts), runs the test set and reports latency and accuracy against fp32.
+    Models are loaded outside the registry, one at a time, but count against
+    its RAM budget; a variant that does not fit is reported as unavailable.
+    Only one comparison runs at a time; another one raises PoolSaturated.
+    """
+    if not _compare_lock.acquire(blocking=False):
+        raise PoolSaturated("inference comparison", retry_after=60)
+    try:
+        return _compare_profiles(precisions, families, repeats)
+    finally:
+        _compare_lock.release()
+
+
+def _compare_profiles(precisions: List[str], families: List[str], repeats: int) -> Dict[str, Dict]:
+    active = get_profile()
+    results: Dict[str, Dict] = {}
+    for family in families:
+        runner = _RUNNERS[family]
+        family_results: Dict[str, Dict] = {}
+        reference: Optional[List[Any]] = None
+        reference_latency: Optional[float] = None
+        # fp32 always runs first: it is the accuracy and speed baseline.
+        for precision in ["fp32"] + [p for p in precisions if p != "fp32"]:
+            profile = active.model_copy(update={"precision": precision})
+            try:
+                outputs, latencies = runner(profile, repeats)
+            except Exception as error:
+                family_results[precision] = {"status": "unavailable", "error": repr(error)}
+                continue
+            finally:
+                gc.collect()
+            latency = statistics.median(latencies)
+            entry = {
+                "status": "ok",
+                "latency_p50_ms": round(latency * 1000, 2),
+                "latency_mean_ms": round(statistics.mean(latencies) * 1000, 2),
+                "items": len(outputs),
+            }
+            if precision == "fp32":
+                reference, reference_latency = outputs, latency
+            if reference is not None:
+                entry.update(_accuracy(family, outputs, reference))
+                entry["speedup_vs_fp32"] = round(reference_latency / latency, 2) if latency else None
+            family_results[precision] = entry
+        results[family] = {p: family_results[p] for p in family_results if p in precisions or p == "fp32"}
+    apply_torch_threads(active)
+    return results
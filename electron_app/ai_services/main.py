@@ -1,7 +1,34 @@
-from fastapi import FastAPI, Body
+from fastapi import FastAPI, Body, HTTPException, Request
+from fastapi.exception_handlers import http_exception_handler
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from pydantic import BaseModel
+from starlette.exceptions import HTTPException as StarletteHTTPException
+from contextlib import asynccontextmanager
 from typing import Optional, List, Dict, Any
+import asyncio
+import importlib
+import json
+import time
+
+from . import settings
+from . import inference_backend
+from .execution import POOLS, PoolSaturated, Priority, nlp_pool, shutdown_pools
+from .inference_backend import InferenceProfile
+from .metrics import MetricsMiddleware, TracedRoute, metrics, stage
+from .model_registry import registry
+from .result_cache import result_cache
+from . import summarization
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+  await start_background_services()
+  yield
+  await stop_background_services()
 
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
+app.router.route_class = TracedRoute
+if settings.METRICS_ENABLED:
+  app.add_middleware(MetricsMiddleware)
 
 # Sample GET endpoint
 @app.get("/status")
@@ -49,13 +76,21 @@ async def transcribe_audio(
   }
 
 # Pydantic model for Summarization
+class SummarySegment(BaseModel):
+    text: str
+    speaker: Optional[str] = None
+    section: Optional[str] = None # e.g. the protocol step; chunks never span two sections
+
 class SummarizationRequest(BaseModel):
     recording_id: Optional[int] = None
     transcription_text: str
+    segments: Optional[List[SummarySegment]] = None # Chunk by speaker turn instead of by line
 
 class SummarizationResponse(BaseModel):
     recording_id: Optional[int]
     summary: str
+    chunks: Optional[int] = None # First-level chunks the transcript was split into
+    computed: Optional[int] = None # Chunk and final summaries computed (the rest came from the cache)
 
 # AI Service Placeholder Endpoint for Summarization
 @app.post("/ai/summarize", response_model=SummarizationResponse)
@@ -63,43 +98,275 @@ async def summarize_text(
     request_data: SummarizationRequest = Body(...)
 ):
   """
-  Placeholder endpoint for AI summarization.
-  Receives transcription text and returns a hardcoded dummy summary.
+  Endpoint for AI summarization.
+  Receives transcription text and returns the summarization backend's summary.
+  Long transcripts are summarized chunk by chunk, reusing cached chunk summaries.
   """
   print(f"AI Service: Received summarization request for recording_id: {request_data.recording_id}")
   print(f"Transcription text received: '{request_data.transcription_text[:100]}...'") # Print first 100 chars
 
-  # Hardcoded dummy summary
-  dummy_summary = (
-    f"This is a dummy AI-generated summary for recording ID {request_data.recording_id}. "
-    "The provided text discussed several important topics, including initial greetings and follow-up questions. "
-    "Further analysis would be required for a more detailed understanding, but this placeholder indicates "
-    "that the summarization process was successfully invoked."
-  )
-
-  # Simulate some processing time
-  # import asyncio
-  # await asyncio.sleep(1)
+  with stage("inference"):
+    result = await summarization.summarize(request_data.transcription_text, _summary_segments(request_data))
 
   return {
     "recording_id": request_data.recording_id,
-    "summary": dummy_summary
+    "summary": result["summary"],
+    "chunks": result["chunks"],
+    "computed": result["computed"],
+  }
+
+@app.post("/ai/summarize/stream")
+async def summarize_text_stream(
+    request_data: SummarizationRequest = Body(...)
+):
+  """
+  Same as /ai/summarize, streamed as Server-Sent Events: "progress" events as
+  chunk summaries finish, a "token" event per token of the final summary and
+  a "done" event with the whole summary.
+  """
+  print(f"AI Service: Received streaming summarization request for recording_id: {request_data.recording_id}")
+  events = summarization.summarize_stream(request_data.transcription_text, _summary_segments(request_data))
+
+  async def event_stream():
+    try:
+      async for event, data in events:
+        if event == "done":
+          data = {"recording_id": request_data.recording_id, **data}
+        yield f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+    except PoolSaturated as exc:
+      # The response has started, so saturation is reported in-stream instead of as a 429.
+      data = {"detail": str(exc), "pool": exc.pool, "retry_after": exc.retry_after}
+      yield f"event: error\ndata: {json.dumps(data)}\n\n"
+
+  return StreamingResponse(event_stream(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+def _summary_segments(request_data: SummarizationRequest) -> Optional[List[Dict[str, Any]]]:
+  return [segment.model_dump() for segment in request_data.segments] if request_data.segments else None
+
+# --- Sub-service Routers ---
+# Routers are grouped by capability. In "background" startup mode (the default)
+# they are imported in a worker thread after the server starts, so /status and
+# /ready answer immediately even when the routers pull in torch/transformers.
+# "eager" mode imports everything before the app is created.
+
+CAPABILITY_ROUTERS = {
+  "speech": [(".speech.transcription", "/speech"), (".speech.batch", "/speech")],
+  "nlp": [(".nlp.ner", "/nlp"), (".nlp.search", "/nlp"), (".nlp.ingestion", "/nlp")],
+  "training": [(".training.jobs", "/training")],
+  "pipeline": [(".pipeline", "/pipeline")],
+}
+
+capability_status: Dict[str, Dict[str, Any]] = {
+  name: {"status": "pending", "import_seconds": None, "error": None} for name in CAPABILITY_ROUTERS
+}
+
+def _import_capability(name: str) -> List[Any]:
+  started = time.perf_counter()
+  modules = [importlib.import_module(module, package=__package__) for module, _ in CAPABILITY_ROUTERS[name]]
+  capability_status[name]["import_seconds"] = round(time.perf_counter() - started, 3)
+  return modules
+
+def _include_capability(name: str, modules: List[Any]):
+  for module, (_, prefix) in zip(modules, CAPABILITY_ROUTERS[name]):
+    app.include_router(module.router, prefix=prefix, tags=[name])
+    # Routers may be mounted after app startup, so they expose plain hooks
+    # instead of router startup events.
+    if hasattr(module, "on_startup"):
+      module.on_startup()
+  app.openapi_schema = None # Regenerate the OpenAPI schema with the new routes
+  capability_status[name]["status"] = "ready"
+  print(f"AI Service: Capability '{name}' ready in {capability_status[name]['import_seconds']}s")
+
+async def _load_capabilities_in_background():
+  loop = asyncio.get_running_loop()
+  for name in CAPABILITY_ROUTERS:
+    capability_status[name]["status"] = "loading"
+    try:
+      modules = await loop.run_in_executor(None, _import_capability, name)
+    except Exception as error:
+      capability_status[name].update(status="failed", error=repr(error))
+      print(f"AI Service: Capability '{name}' failed to load: {error!r}")
+      continue
+    # Routes are added on the event loop thread, never concurrently with routing.
+    _include_capability(name, modules)
+
+if settings.STARTUP_MODE == "eager":
+  for _name in CAPABILITY_ROUTERS:
+    _include_capability(_name, _import_capability(_name))
+
+@app.get("/ready")
+async def get_readiness():
+  """
+  Reports readiness per capability (speech, nlp, training, pipeline).
+  """
+  return {
+    "ready": all(state["status"] == "ready" for state in capability_status.values()),
+    "capabilities": capability_status,
   }
 
-# Placeholder for including routers from sub-services
-from .speech import transcription as speech_transcription_router
-from .nlp import ner as nlp_ner_router
-from .nlp import search as nlp_search_router
-from .training import jobs as training_jobs_router # Import the new Training router
+@app.exception_handler(StarletteHTTPException)
+async def capability_not_ready_handler(request: Request, exc: StarletteHTTPException):
+  """
+  Answers 503 instead of 404 for routes whose capability is still loading.
+  """
+  if exc.status_code == 404:
+    for name, routers in CAPABILITY_ROUTERS.items():
+      pending = capability_status[name]["status"] in ("pending", "loading")
+      if pending and any(request.url.path.startswith(prefix + "/") for _, prefix in routers):
+        return JSONResponse(
+          status_code=503,
+          content={"detail": f"The {name} capability is still loading."},
+          headers={"Retry-After": "1"},
+        )
+  return await http_exception_handler(request, exc)
+
+@app.exception_handler(PoolSaturated)
+async def pool_saturated_handler(request: Request, exc: PoolSaturated):
+  """
+  Answers 429 when the workers for a request's workload are saturated.
+  """
+  return JSONResponse(
+    status_code=429,
+    content={"detail": str(exc), "pool": exc.pool},
+    headers={"Retry-After": str(exc.retry_after)},
+  )
+
+
+# --- Model Registry Endpoints ---
+
+async def start_background_services():
+  asyncio.create_task(_load_capabilities_then_prewarm())
+  if registry.idle_seconds:
+    asyncio.create_task(_evict_idle_models_periodically())
+
+async def stop_background_services():
+  for name, routers in CAPABILITY_ROUTERS.items():
+    if capability_status[name]["status"] != "ready":
+      continue
+    for module_name, _ in routers:
+      module = importlib.import_module(module_name, package=__package__)
+      if hasattr(module, "on_shutdown"):
+        module.on_shutdown()
+  shutdown_pools()
+
+async def _load_capabilities_then_prewarm():
+  if settings.STARTUP_MODE != "eager":
+    await _load_capabilities_in_background()
+  if settings.MODEL_PREWARM:
+    # Models register themselves when their capability is imported, so pre-warm afterwards.
+    await asyncio.get_running_loop().run_in_executor(None, registry.prewarm, settings.MODEL_PREWARM)
 
-app.include_router(speech_transcription_router.router, prefix="/speech", tags=["speech"])
-app.include_router(nlp_ner_router.router, prefix="/nlp", tags=["nlp"])
-app.include_router(nlp_search_router.router, prefix="/nlp", tags=["nlp"])
-app.include_router(training_jobs_router.router, prefix="/training", tags=["training"]) # Include the Training router
+async def _evict_idle_models_periodically():
+  loop = asyncio.get_running_loop()
+  while True:
+    await asyncio.sleep(max(registry.idle_seconds / 4, 5))
+    await loop.run_in_executor(None, registry.evict_idle)
+
+@app.get("/models")
+async def get_models():
+  """
+  Lists registered models with load time, memory footprint and hit counts.
+  """
+  return registry.stats()
+
+@app.post("/models/{name}/load")
+async def load_model(name: str):
+  """
+  Loads (pre-warms) a registered model without running inference.
+  """
+  if not registry.is_registered(name):
+    raise HTTPException(status_code=404, detail=f"Model '{name}' is not registered.")
+  await asyncio.get_running_loop().run_in_executor(None, registry.get, name)
+  return registry.stats()
+
+@app.post("/models/{name}/evict")
+async def evict_model(name: str):
+  """
+  Unloads a model to free memory. Models that are in use are left loaded.
+  """
+  if not registry.is_registered(name):
+    raise HTTPException(status_code=404, detail=f"Model '{name}' is not registered.")
+  return {"name": name, "evicted": registry.evict(name)}
+
+
+# --- Metrics Endpoint ---
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+  """
+  Request, queue, model and cache metrics in the Prometheus text exposition format.
+  """
+  return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+
+# --- Execution Pool Endpoints ---
+
+@app.get("/execution")
+async def get_execution_pools():
+  """
+  Workers, queue depth and Retry-After estimate per execution pool (speech, nlp).
+  """
+  return {name: pool.stats() for name, pool in POOLS.items()}
+
+
+# --- Result Cache Endpoints ---
+
+@app.get("/cache")
+async def get_cache_stats():
+  """
+  Result cache size and hit/miss counts per kind (transcription, diarization, ner, summary).
+  """
+  return await asyncio.get_running_loop().run_in_executor(None, result_cache.stats)
+
+@app.delete("/cache")
+async def clear_cache(kind: Optional[str] = None):
+  """
+  Drops cached results, optionally only one kind.
+  """
+  removed = await asyncio.get_running_loop().run_in_executor(None, result_cache.clear, kind)
+  return {"removed": removed}
+
+
+# --- Inference Profile Endpoints ---
+
+class InferenceCompareRequest(BaseModel):
+  precisions: List[str] = list(inference_backend.PRECISIONS)
+  families: List[str] = ["asr", "ner", "embedding"]
+  repeats: int = 3
+
+@app.get("/inference/profile", response_model=InferenceProfile)
+async def get_inference_profile():
+  """
+  The active compute profile (precision and thread counts) for the speech, NER and embedding models.
+  """
+  return inference_backend.get_profile()
+
+@app.put("/inference/profile")
+async def set_inference_profile(profile: InferenceProfile):
+  """
+  Switches the compute profile. Loaded models are evicted and reload with it on next use.
+  """
+  if profile.intra_op_threads < 1 or profile.inter_op_threads < 1:
+    raise HTTPException(status_code=400, detail="Thread counts must be at least 1.")
+  evicted = await asyncio.get_running_loop().run_in_executor(None, inference_backend.set_profile, profile)
+  return {"profile": profile, "evicted": evicted}
+
+@app.post("/inference/compare")
+async def compare_inference_profiles(request: InferenceCompareRequest = Body(InferenceCompareRequest())):
+  """
+  Runs the fixed test set under each precision and reports latency and accuracy against fp32.
+  Loads extra model copies, so expect it to take a while and use memory. It runs
+  as batch work in the NLP pool, one comparison at a time, within the model RAM budget.
+  """
+  unknown = [p for p in request.precisions if p not in inference_backend.PRECISIONS]
+  unknown += [f for f in request.families if f not in ("asr", "ner", "embedding")]
+  if unknown or request.repeats < 1:
+    raise HTTPException(status_code=400, detail=f"Unknown precisions/families: {unknown}" if unknown else "repeats must be at least 1.")
+  return await nlp_pool.run(inference_backend.compare_profiles, request.precisions, request.families,
+                            request.repeats, priority=Priority.BATCH)
 
 
 # Pydantic model for request body if needed (FastAPI handles this with type hints)
-from pydantic import BaseModel
 class TranscriptionRequest(BaseModel):
     recording_id: Optional[int] = None
     dummy_data: Optional[str] = None
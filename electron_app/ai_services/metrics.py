@@ -0,0 +1,349 @@
+import asyncio
+import contextvars
+import functools
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from fastapi.routing import APIRoute
+
+from . import settings
+
+# --- Metrics ---
+# Process-wide counters, gauges and histograms rendered in the Prometheus text
+# format by GET /metrics, without depending on prometheus_client. Request
+# metrics come from MetricsMiddleware; modules that own state (model registry,
+# result cache, batchers, job queues) register collectors that report gauges
+# from that state when /metrics is scraped, so nothing is sampled in between.
+#
+# Each request also carries a trace: stage() blocks in handlers (and in worker
+# execution pool threads, which run with the request's context) add their durations to it. The
+# middleware adds request parsing ("parse", before the handler runs), "handler"
+# and response "serialization" (after it returns), feeds every stage into a
+# histogram and, when asked to, returns them in a Server-Timing header.
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+Sample = Tuple[Dict[str, str], float]
+# (name, type, help, samples) as returned by collectors.
+Family = Tuple[str, str, str, List[Sample]]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_sample(name: str, labels: Dict[str, str], value: float) -> str:
+    if labels:
+        name += "{" + ",".join(f'{key}="{_escape(str(val))}"' for key, val in labels.items()) + "}"
+    if math.isinf(value):
+        text = "+Inf" if value > 0 else "-Inf"
+    elif float(value).is_integer():
+        text = str(int(value))
+    else:
+        text = repr(float(value))
+    return f"{name} {text}"
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(labels)
+        self._values: Dict[Tuple[str, ...], Any] = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Sequence[Any]) -> Tuple[str, ...]:
+        if len(labels) != len(self.label_names):
+            raise ValueError(f"{self.name} expects labels {self.label_names}, got {tuple(labels)}")
+        return tuple(str(label) for label in labels)
+
+    def _labels(self, key: Tuple[str, ...]) -> Dict[str, str]:
+        return dict(zip(self.label_names, key))
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, *labels: Any, amount: float = 1.0):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def samples(self) -> List[Tuple[str, Dict[str, str], float]]:
+        with self._lock:
+            return [(self.name, self._labels(key), value) for key, value in self._values.items()]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, *labels: Any, amount: float = 1.0):
+        self.inc(*labels, amount=-amount)
+
+    def set(self, *labels: Any, value: float):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, *labels: Any):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][index] += 1
+                    break
+            state[1] += value
+            state[2] += 1
+
+    def samples(self) -> List[Tuple[str, Dict[str, str], float]]:
+        samples = []
+        with self._lock:
+            for key, (counts, total, count) in self._values.items():
+                labels = self._labels(key)
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets, counts):
+                    cumulative += bucket_count
+                    samples.append((f"{self.name}_bucket", dict(labels, le=repr(float(bound))), cumulative))
+                samples.append((f"{self.name}_bucket", dict(labels, le="+Inf"), count))
+                samples.append((f"{self.name}_sum", labels, total))
+                samples.append((f"{self.name}_count", labels, count))
+        return samples
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._collectors: List[Callable[[], List[Family]]] = []
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, cls, name: str, help_text: str, labels: Sequence[str], **kwargs) -> Any:
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, help_text, labels, **kwargs)
+            return metric
+
+    def counter(self, name: str, help_text: str, labels: Sequence[str] = ()) -> Counter:
+        return self._get_or_create(Counter, name, help_text, labels)
+
+    def gauge(self, name: str, help_text: str, labels: Sequence[str] = ()) -> Gauge:
+        return self._get_or_create(Gauge, name, help_text, labels)
+
+    def histogram(self, name: str, help_text: str, labels: Sequence[str] = (),
+                  buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self._get_or_create(Histogram, name, help_text, labels, buckets=buckets)
+
+    def register_collector(self, collector: Callable[[], List[Family]]):
+        """
+        Registers a function called on every scrape. It returns metric families
+        as (name, "gauge" | "counter", help, [(labels, value), ...]); families
+        with the same name from different collectors are merged.
+        """
+        with self._lock:
+            self._collectors.append(collector)
+
+    def render(self) -> str:
+        families: Dict[str, List[Any]] = {}
+        with self._lock:
+            metrics = list(self._metrics.values())
+            collectors = list(self._collectors)
+        for metric in metrics:
+            families[metric.name] = [metric.kind, metric.help, metric.samples()]
+        for collector in collectors:
+            try:
+                collected = collector()
+            except Exception as error:
+                print(f"AI Service (Metrics): Collector {getattr(collector, '__name__', collector)} failed: {error!r}")
+                continue
+            for name, kind, help_text, samples in collected:
+                family = families.setdefault(name, [kind, help_text, []])
+                family[2].extend((name, labels, value) for labels, value in samples)
+        lines = []
+        for name, (kind, help_text, samples) in families.items():
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            lines.extend(_format_sample(sample_name, labels, value) for sample_name, labels, value in samples)
+        return "\n".join(lines) + "\n"
+
+
+metrics = MetricsRegistry()
+
+http_requests = metrics.counter(
+    "ai_http_requests_total", "HTTP requests by method, route and status code.", ("method", "route", "status"))
+http_request_duration = metrics.histogram(
+    "ai_http_request_duration_seconds", "HTTP request latency until the response is complete.", ("method", "route"))
+http_in_flight = metrics.gauge("ai_http_requests_in_flight", "HTTP requests being handled.", ("method",))
+stage_duration = metrics.histogram(
+    "ai_request_stage_duration_seconds", "Time spent per request stage.", ("route", "stage"))
+model_inference = metrics.histogram(
+    "ai_model_inference_seconds", "Time a model was held for inference, per registry model.", ("model",))
+
+# --- Request Traces ---
+
+_trace: contextvars.ContextVar[Optional[Dict[str, float]]] = contextvars.ContextVar("ai_request_trace", default=None)
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    """
+    Adds the time spent in the block to the current request's `name` stage
+    (stages entered repeatedly, e.g. once per audio chunk, accumulate).
+    """
+    trace = _trace.get()
+    if trace is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        trace[name] = trace.get(name, 0.0) + time.perf_counter() - started
+
+
+def record_stages(timings: Dict[str, float]):
+    """
+    Adds already measured stage durations (in seconds) to the current request.
+    """
+    trace = _trace.get()
+    if trace is not None:
+        for name, seconds in timings.items():
+            trace[name] = trace.get(name, 0.0) + seconds
+
+
+def _timed_endpoint(endpoint: Callable) -> Callable:
+    if getattr(endpoint, "_traced", False):
+        return endpoint
+
+    def mark(key: str):
+        trace = _trace.get()
+        if trace is not None:
+            trace[key] = time.perf_counter()
+
+    if asyncio.iscoroutinefunction(endpoint):
+        @functools.wraps(endpoint)
+        async def traced(*args, **kwargs):
+            mark("_handler_start")
+            try:
+                return await endpoint(*args, **kwargs)
+            finally:
+                mark("_handler_end")
+    else:
+        @functools.wraps(endpoint)
+        def traced(*args, **kwargs):
+            mark("_handler_start")
+            try:
+                return endpoint(*args, **kwargs)
+            finally:
+                mark("_handler_end")
+    traced._traced = True
+    return traced
+
+
+class TracedRoute(APIRoute):
+    """
+    Route class that marks when the endpoint starts and returns, so the
+    middleware can tell request parsing and response serialization apart from
+    the handler. Use as APIRouter(route_class=TracedRoute).
+    """
+
+    def __init__(self, path: str, endpoint: Callable, **kwargs: Any):
+        super().__init__(path, _timed_endpoint(endpoint), **kwargs)
+
+
+def _stages(trace: Dict[str, float], started: float, responded: float) -> Dict[str, float]:
+    stages = {name: seconds for name, seconds in trace.items() if not name.startswith("_")}
+    handler_start, handler_end = trace.get("_handler_start"), trace.get("_handler_end")
+    if handler_start is not None and handler_end is not None:
+        stages["parse"] = handler_start - started
+        stages["handler"] = handler_end - handler_start
+        stages["serialization"] = responded - handler_end
+    stages["total"] = responded - started
+    return stages
+
+
+def _server_timing(stages: Dict[str, float]) -> str:
+    return ", ".join(f"{name};dur={seconds * 1000:.2f}" for name, seconds in stages.items())
+
+
+def _route_label(scope: Dict[str, Any]) -> str:
+    """
+    Route template of a handled request ("/nlp/ner", "/training/status/{job_id}"),
+    keeping label cardinality bounded; "unmatched" for unknown paths.
+    """
+    route = scope.get("route")
+    template = getattr(route, "path", None)
+    if not template:
+        return "unmatched"
+    # Routes from included routers may not carry the router prefix: recover it
+    # from the request path, which ends with the template filled in.
+    rendered = template
+    for name, value in scope.get("path_params", {}).items():
+        rendered = rendered.replace("{" + name + "}", str(value)).replace("{" + name + ":path}", str(value))
+    path = scope.get("path", "")
+    if path != rendered and path.endswith(rendered):
+        return path[:len(path) - len(rendered)] + template
+    return template
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware recording request counts, latency, in-flight requests and
+    per-stage timings. With SERVER_TIMING set to "always", or to "request" and
+    the request carrying "X-Server-Timing: 1", the stages are also returned in
+    a Server-Timing header (milliseconds).
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] == "/metrics":
+            await self.app(scope, receive, send)
+            return
+        method = scope["method"]
+        started = time.perf_counter()
+        trace: Dict[str, float] = {}
+        token = _trace.set(trace)
+        mode = settings.SERVER_TIMING
+        want_header = mode == "always" or (mode == "request" and (b"x-server-timing", b"1") in scope["headers"])
+        status = 500
+        stages: Dict[str, float] = {}
+
+        async def send_with_timing(message):
+            nonlocal status, stages
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                stages = _stages(trace, started, time.perf_counter())
+                if want_header:
+                    header = (b"server-timing", _server_timing(stages).encode("latin-1"))
+                    message = dict(message, headers=list(message.get("headers", [])) + [header])
+            await send(message)
+
+        http_in_flight.inc(method)
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            http_in_flight.dec(method)
+            _trace.reset(token)
+            route = _route_label(scope)
+            http_requests.inc(method, route, status)
+            http_request_duration.observe(time.perf_counter() - started, method, route)
+            for name, seconds in stages.items():
+                if name != "total":
+                    stage_duration.observe(seconds, route, name)
@@ -0,0 +1,308 @@
+import gc
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from . import settings
+from .metrics import metrics, model_inference
+
+# --- Model Registry ---
+# One process-wide registry owns every heavy model (WhisperX, pyannote,
+# transformers, sentence-transformers). Models are registered with a loader
+# and loaded on first use; the speech, nlp and training routers all share the
+# same instances. Loaded models are evicted least-recently-used first when the
+# RAM budget is exceeded, and after sitting idle for too long.
+
+
+def _rss_bytes() -> int:
+    """
+    Current resident set size of this process, or 0 if it cannot be read.
+    """
+    try:
+        with open("/proc/self/statm") as handle:
+            return int(handle.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        import psutil
+        return int(psutil.Process().memory_info().rss)
+    except ImportError:
+        return 0
+
+
+def _parameter_bytes(model: Any) -> int:
+    """
+    Best-effort size of a torch model's parameters and buffers.
+    """
+    module = getattr(model, "model", model)
+    if not hasattr(module, "parameters"):
+        return 0
+    try:
+        tensors = list(module.parameters()) + list(getattr(module, "buffers", lambda: [])())
+        return int(sum(t.numel() * t.element_size() for t in tensors))
+    except Exception:
+        return 0
+
+
+class ModelEntry:
+    def __init__(self, name: str, capability: str, loader: Callable[[], Any],
+                 unloader: Optional[Callable[[Any], None]] = None):
+        self.name = name
+        self.capability = capability
+        self.loader = loader
+        self.unloader = unloader
+        self.model: Any = None
+        self.lock = threading.Lock()
+        self.load_seconds: Optional[float] = None
+        self.memory_bytes = 0
+        self.last_memory_bytes = 0  # size measured at the latest load, kept after eviction
+        self.hits = 0
+        self.loads = 0
+        self.evictions = 0
+        self.in_use = 0
+        self.last_used = 0.0
+        # Models replaced while callers still held them: id -> [model, holders].
+        self.retired: Dict[int, List[Any]] = {}
+
+    @property
+    def loaded(self) -> bool:
+        return self.model is not None
+
+    def stats(self) -> Dict:
+        return {
+            "name": self.name,
+            "capability": self.capability,
+            "loaded": self.loaded,
+            "load_seconds": self.load_seconds,
+            "memory_mb": round(self.memory_bytes / (1024 * 1024), 1),
+            "hits": self.hits,
+            "loads": self.loads,
+            "evictions": self.evictions,
+            "in_use": self.in_use,
+            "retiring": len(self.retired),
+            "idle_seconds": round(time.time() - self.last_used, 1) if self.loaded else None,
+        }
+
+
+class ModelRegistry:
+    def __init__(self, ram_budget_mb: float = 0, idle_seconds: float = 0):
+        self.ram_budget_bytes = int(ram_budget_mb * 1024 * 1024)
+        self.idle_seconds = idle_seconds
+        self._entries: Dict[str, ModelEntry] = {}
+        self._lock = threading.RLock()
+        # Models loaded outside the registry (see temporary()) still count against the budget.
+        self._temporary_bytes = 0
+
+    def register(self, name: str, loader: Callable[[], Any], capability: str = "general",
+                 unloader: Optional[Callable[[Any], None]] = None):
+        """
+        Registers a loader under `name`. Re-registering an unloaded name replaces its loader.
+        """
+        with self._lock:
+            entry = self._entries.get(name)
+            if entry is not None and entry.loaded:
+                return
+            self._entries[name] = ModelEntry(name, capability, loader, unloader)
+
+    def is_registered(self, name: str) -> bool:
+        return name in self._entries
+
+    def get(self, name: str) -> Any:
+        """
+        Returns the model, loading it on first use. Prefer use() for long calls,
+        since it also protects the model from eviction while it runs.
+        """
+        with self.use(name, timed=False) as model:
+            return model
+
+    @contextmanager
+    def use(self, name: str, timed: bool = True) -> Iterator[Any]:
+        """
+        Holds the model (loading it if needed) for the duration of the block;
+        the time it is held is recorded as inference time unless timed is off.
+        """
+        entry = self._entries.get(name)
+        if entry is None:
+            raise KeyError(f"Model '{name}' is not registered.")
+        with entry.lock:
+            loaded_now = entry.model is None
+            if loaded_now:
+                self._load(entry)
+            else:
+                entry.hits += 1
+            entry.in_use += 1
+            entry.last_used = time.time()
+            model = entry.model
+        if loaded_now:
+            # Outside the entry lock, so two threads loading different models cannot deadlock.
+            self._enforce_budget(keep=name)
+        started = time.perf_counter()
+        try:
+            yield model
+        finally:
+            if timed:
+                model_inference.observe(time.perf_counter() - started, name)
+            with entry.lock:
+                retired = entry.retired.get(id(model))
+                if retired is None:
+                    entry.in_use -= 1
+                    entry.last_used = time.time()
+                else:
+                    retired[1] -= 1
+                    if retired[1]:
+                        retired = None
+                    else:
+                        del entry.retired[id(model)]
+            if retired is not None:
+                # The last caller of a replaced model unloads it.
+                retired.clear()
+                self._unload(entry, model)
+
+    def _load(self, entry: ModelEntry):
+        print(f"AI Service (Models): Loading model '{entry.name}'")
+        rss_before = _rss_bytes()
+        started = time.perf_counter()
+        entry.model = entry.loader()
+        entry.load_seconds = round(time.perf_counter() - started, 3)
+        entry.memory_bytes = max(_rss_bytes() - rss_before, _parameter_bytes(entry.model), 0)
+        entry.last_memory_bytes = entry.memory_bytes
+        entry.loads += 1
+        print(f"AI Service (Models): Loaded '{entry.name}' in {entry.load_seconds}s "
+              f"(~{entry.memory_bytes / (1024 * 1024):.0f} MB)")
+
+    def prewarm(self, names: List[str]):
+        for name in names:
+            if name in self._entries:
+                self.get(name)
+            else:
+                print(f"AI Service (Models): Cannot pre-warm unknown model '{name}'")
+
+    def evict(self, name: str, retire_busy: bool = False) -> bool:
+        """
+        Unloads the model. A model in use is left alone, unless retire_busy:
+        then the next use() loads a fresh instance while current callers finish
+        with the old one, which is unloaded when the last of them releases it.
+        """
+        entry = self._entries.get(name)
+        if entry is None:
+            return False
+        with entry.lock:
+            if not entry.loaded or (entry.in_use and not retire_busy):
+                return False
+            model, entry.model = entry.model, None
+            entry.evictions += 1
+            entry.memory_bytes = 0
+            if entry.in_use:
+                entry.retired[id(model)] = [model, entry.in_use]
+                entry.in_use = 0
+                print(f"AI Service (Models): Retired model '{name}'; it unloads when its callers finish")
+                return True
+        self._unload(entry, model)
+        return True
+
+    def _unload(self, entry: ModelEntry, model: Any):
+        if entry.unloader is not None:
+            entry.unloader(model)
+        del model
+        gc.collect()
+        try:
+            import torch
+            if torch.cuda.is_available():
+                torch.cuda.empty_cache()
+        except ImportError:
+            pass
+        print(f"AI Service (Models): Evicted model '{entry.name}'")
+
+    def evict_idle(self) -> List[str]:
+        if not self.idle_seconds:
+            return []
+        cutoff = time.time() - self.idle_seconds
+        idle = [e.name for e in list(self._entries.values())
+                if e.loaded and not e.in_use and e.last_used < cutoff]
+        return [name for name in idle if self.evict(name)]
+
+    @contextmanager
+    def temporary(self, name: str, loader: Callable[[], Any]) -> Iterator[Any]:
+        """
+        Loads a model outside the registry (e.g. another variant of `name` for
+        a comparison) and counts it against the RAM budget while it is held.
+        Unused registry models are evicted to make room; raises MemoryError when
+        it cannot fit, judging by the size `name` had when it was last loaded.
+        """
+        entry = self._entries.get(name)
+        estimate = entry.last_memory_bytes if entry is not None else 0
+        with self._lock:
+            if self.ram_budget_bytes:
+                self._enforce_budget(keep=None, extra=estimate)
+                used = self._temporary_bytes + sum(e.memory_bytes for e in self._entries.values() if e.loaded)
+                if used + estimate > self.ram_budget_bytes:
+                    raise MemoryError(f"A temporary '{name}' model (~{estimate / (1024 * 1024):.0f} MB) "
+                                      f"does not fit the model RAM budget.")
+            self._temporary_bytes += estimate
+        reserved = estimate
+        try:
+            rss_before = _rss_bytes()
+            model = loader()
+            size = max(_rss_bytes() - rss_before, _parameter_bytes(model), 0)
+            with self._lock:
+                self._temporary_bytes += size - reserved
+                reserved = size
+            self._enforce_budget(keep=None)
+            yield model
+        finally:
+            with self._lock:
+                self._temporary_bytes -= reserved
+            model = None
+            gc.collect()
+
+    def _enforce_budget(self, keep: Optional[str], extra: int = 0):
+        if not self.ram_budget_bytes:
+            return
+        loaded = sorted((e for e in self._entries.values() if e.loaded and e.name != keep),
+                        key=lambda e: e.last_used)
+        total = self._temporary_bytes + extra + sum(e.memory_bytes for e in self._entries.values() if e.loaded)
+        for entry in loaded:
+            if total <= self.ram_budget_bytes:
+                break
+            size = entry.memory_bytes
+            if self.evict(entry.name):
+                total -= size
+
+    def stats(self) -> Dict:
+        entries = [entry.stats() for entry in self._entries.values()]
+        return {
+            "ram_budget_mb": round(self.ram_budget_bytes / (1024 * 1024), 1),
+            "idle_eviction_seconds": self.idle_seconds,
+            "loaded_memory_mb": round(sum(e["memory_mb"] for e in entries if e["loaded"]), 1),
+            "temporary_memory_mb": round(self._temporary_bytes / (1024 * 1024), 1),
+            "models": entries,
+        }
+
+
+registry = ModelRegistry(
+    ram_budget_mb=settings.MODEL_RAM_BUDGET_MB,
+    idle_seconds=settings.MODEL_IDLE_SECONDS,
+)
+
+
+def _collect_metrics():
+    entries = list(registry._entries.values())
+    return [
+        ("ai_process_resident_memory_bytes", "gauge", "Resident set size of the AI service process.",
+         [({}, _rss_bytes())]),
+        ("ai_model_loaded", "gauge", "Whether a registry model is loaded (1) or not (0).",
+         [({"model": e.name, "capability": e.capability}, int(e.loaded)) for e in entries]),
+        ("ai_model_memory_bytes", "gauge", "Estimated memory held by a loaded model.",
+         [({"model": e.name}, e.memory_bytes) for e in entries]),
+        ("ai_model_load_seconds", "gauge", "Duration of the model's most recent load.",
+         [({"model": e.name}, e.load_seconds) for e in entries if e.load_seconds is not None]),
+        ("ai_model_in_use", "gauge", "Callers currently holding a model.",
+         [({"model": e.name}, e.in_use) for e in entries]),
+        ("ai_model_loads_total", "counter", "Model loads.", [({"model": e.name}, e.loads) for e in entries]),
+        ("ai_model_evictions_total", "counter", "Model evictions.", [({"model": e.name}, e.evictions) for e in entries]),
+    ]
+
+
+metrics.register_collector(_collect_metrics)
@@ -0,0 +1,116 @@
+import asyncio
+import contextvars
+import time
+import weakref
+from typing import Any, Callable, Generic, List, Optional, Tuple, TypeVar
+
+from ..execution import PoolSaturated, Priority, WorkloadPool
+from ..metrics import metrics
+
+# --- Micro-batching Scheduler ---
+# Concurrent single-item requests are queued and coalesced into one model call:
+# the first item opens a batch, which closes when it reaches max_batch_size or
+# max_wait_ms has passed. Batches run in the batcher's execution pool at its
+# priority, one at a time, while the next batch keeps filling up on the event
+# loop; max_queue bounds the items waiting.
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+_batchers: "weakref.WeakSet[MicroBatcher]" = weakref.WeakSet()
+
+
+class MicroBatcher(Generic[T, R]):
+    def __init__(self, batch_fn: Callable[[List[T]], List[R]], pool: WorkloadPool, max_batch_size: int = 16,
+                 max_wait_ms: float = 10.0, name: str = "batcher",
+                 priority: Priority = Priority.NORMAL, max_queue: int = 0):
+        self.batch_fn = batch_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        self.name = name
+        self.pool = pool
+        self.priority = priority
+        self.max_queue = max_queue
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self.batches_run = 0
+        self.items_run = 0
+        _batchers.add(self)
+
+    @property
+    def queue_depth(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    @property
+    def average_batch_size(self) -> float:
+        return self.items_run / self.batches_run if self.batches_run else 0.0
+
+    async def submit(self, item: T) -> R:
+        """
+        Queues one item and waits for its result from the batch it lands in.
+        """
+        if self.max_queue and self.queue_depth >= self.max_queue:
+            raise PoolSaturated(self.name, retry_after=1)
+        if self._worker is None or self._worker.done():
+            self._queue = asyncio.Queue()
+            # In a fresh context: the worker outlives the request that started it.
+            loop = asyncio.get_running_loop()
+            self._worker = contextvars.Context().run(loop.create_task, self._run())
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((item, future))
+        return await future
+
+    async def _collect(self) -> List[Tuple[T, asyncio.Future]]:
+        batch = [await self._queue.get()]
+        deadline = time.monotonic() + self.max_wait_ms / 1000.0
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        while True:
+            batch = await self._collect()
+            items = [item for item, _ in batch]
+            try:
+                results: List[Any] = await self.pool.run(self.batch_fn, items, priority=self.priority)
+            except Exception as error:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(error)
+                continue
+            self.batches_run += 1
+            self.items_run += len(items)
+            for (_, future), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+
+    def stats(self) -> dict:
+        return {
+            "name": self.name,
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait_ms,
+            "queue_depth": self.queue_depth,
+            "batches_run": self.batches_run,
+            "average_batch_size": round(self.average_batch_size, 2),
+        }
+
+
+def _collect_metrics():
+    batchers = list(_batchers)
+    return [
+        ("ai_queue_depth", "gauge", "Items waiting in a queue.",
+         [({"queue": batcher.name}, batcher.queue_depth) for batcher in batchers]),
+        ("ai_batcher_batches_total", "counter", "Model batches run by a micro-batcher.",
+         [({"batcher": batcher.name}, batcher.batches_run) for batcher in batchers]),
+        ("ai_batcher_items_total", "counter", "Items run by a micro-batcher.",
+         [({"batcher": batcher.name}, batcher.items_run) for batcher in batchers]),
+    ]
+
+
+metrics.register_collector(_collect_metrics)
@@ -0,0 +1,118 @@
+import hashlib
+import re
+import threading
+from typing import List, Optional, Sequence
+
+import numpy as np
+
+from .. import settings
+from ..inference_backend import get_profile, load_sentence_transformer
+from ..model_registry import registry
+
+# --- Text Embedders ---
+# Every embedder returns L2-normalised float32 rows, so cosine similarity is a
+# plain dot product for the vector index.
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def _normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    matrix = np.asarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0.0] = 1.0
+    return matrix / norms
+
+
+class HashingEmbedder:
+    """
+    Dependency-free feature-hashing embedder (word unigrams and bigrams).
+    Only useful for development: it captures lexical overlap, not meaning.
+    """
+
+    name = "hashing"
+
+    def __init__(self, dim: int = 384):
+        self.dim = dim
+
+    def _bucket(self, token: str) -> int:
+        digest = hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest()
+        return int.from_bytes(digest, "little")
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        matrix = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            tokens = _TOKEN_RE.findall(text.lower())
+            features = tokens + [a + " " + b for a, b in zip(tokens, tokens[1:])]
+            for feature in features:
+                bucket = self._bucket(feature)
+                sign = 1.0 if bucket & (1 << 63) else -1.0
+                matrix[row, bucket % self.dim] += sign
+        return _normalize_rows(matrix)
+
+
+class SentenceTransformerEmbedder:
+    """
+    Wraps a sentence-transformers model held in the shared model registry
+    under "embedding". The model is loaded on first use.
+    """
+
+    registry_key = "embedding"
+
+    def __init__(self, model_name: str, batch_size: int = 64):
+        self.name = model_name
+        self.batch_size = batch_size
+        self._dim: Optional[int] = None
+        registry.register(self.registry_key, self._load, capability="nlp")
+
+    def _load(self):
+        return load_sentence_transformer(self.name, get_profile())
+
+    @property
+    def dim(self) -> int:
+        if self._dim is None:
+            self._dim = int(registry.get(self.registry_key).get_sentence_embedding_dimension())
+        return self._dim
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        if not texts:
+            return np.zeros((0, self.dim), dtype=np.float32)
+        with registry.use(self.registry_key) as model:
+            vectors = model.encode(
+                list(texts),
+                batch_size=self.batch_size,
+                convert_to_numpy=True,
+                normalize_embeddings=True,
+                show_progress_bar=False,
+            )
+        return np.asarray(vectors, dtype=np.float32)
+
+
+_embedder = None
+_embedder_lock = threading.Lock()
+
+
+def get_embedder(model_name: Optional[str] = None):
+    """
+    Returns the process-wide embedder for the configured model.
+    Falls back to the hashing embedder if sentence-transformers is unavailable.
+    """
+    global _embedder
+    if _embedder is None:
+        with _embedder_lock:
+            if _embedder is None:
+                name = model_name or settings.EMBEDDING_MODEL
+                if name == HashingEmbedder.name:
+                    _embedder = HashingEmbedder()
+                else:
+                    try:
+                        import sentence_transformers  # noqa: F401
+                        _embedder = SentenceTransformerEmbedder(name)
+                    except ImportError:
+                        print("AI Service (NLP Embeddings): sentence-transformers not installed, "
+                              "falling back to the hashing embedder.")
+                        _embedder = HashingEmbedder()
+    return _embedder
+
+
+def embed_texts(texts: List[str]) -> np.ndarray:
+    return get_embedder().embed(texts)
@@ -0,0 +1,335 @@
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Literal, Optional, Tuple
+
+from fastapi import APIRouter, Body, HTTPException
+from pydantic import BaseModel
+
+from .. import settings
+from ..execution import Priority, nlp_pool
+from ..metrics import TracedRoute, metrics
+from .search import delete_documents, index_documents
+from .vector_index import get_vector_index
+
+# --- Incremental Ingestion ---
+# The backend sends whole records (a recording's transcript, a patient's notes,
+# a protocol) whenever they change. Each record is indexed as segments whose
+# ids are "<record_id>:<hash of the segment text>". A ledger next to the vector
+# index remembers every record's version and segments. Ingesting a record
+# diffs its segments against the ledger:
+#   - unchanged segments are left alone;
+#   - segments whose only change is their title get a metadata update;
+#   - segments with new text are embedded, in large batches across all the
+#     records of the request;
+#   - segments that disappeared are deleted.
+# Keeping the index current therefore costs work proportional to the edit.
+#
+# Before ingestion existed, the backend indexed transcripts by position as
+# "<record_id>-seg-<n>". Those documents are deleted when their record is
+# first ingested (or deleted), so upgraded installs never show them twice.
+
+_SENTENCE_END = re.compile(r"(?<=[.!?…])\s+")
+LEGACY_SEGMENT_INFIX = "-seg-"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS records (
+    record_id TEXT PRIMARY KEY,
+    version INTEGER NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS segments (
+    doc_id TEXT PRIMARY KEY,
+    record_id TEXT NOT NULL,
+    type TEXT NOT NULL,
+    title TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS segments_record ON segments (record_id);
+"""
+
+ingested_segments = metrics.counter(
+    "ai_search_ingested_segments_total",
+    "Segments seen by incremental ingestion, by outcome (embedded, retitled, removed, unchanged).", ("outcome",))
+
+# --- Pydantic Models ---
+
+class IngestSegment(BaseModel):
+    text: str
+    title: Optional[str] = None # Defaults to the record's title
+
+class IngestRecord(BaseModel):
+    record_id: str # Stable id, e.g. "recording-12", "patient-3", "protocol-2"
+    type: str # e.g. "recording_segment", "patient", "protocol"
+    title: str
+    version: Optional[int] = None # e.g. the source row's update time; older versions are ignored
+    text: Optional[str] = None # Split into segments by line (and sentence, for long lines)
+    segments: Optional[List[IngestSegment]] = None # Or segments as they are, e.g. transcript segments
+
+class IngestRequest(BaseModel):
+    records: List[IngestRecord]
+
+class IngestRecordResult(BaseModel):
+    record_id: str
+    version: int
+    status: Literal["indexed", "unchanged", "stale"]
+    added: int = 0
+    retitled: int = 0
+    removed: int = 0
+    unchanged: int = 0
+
+class IngestResponse(BaseModel):
+    records: List[IngestRecordResult]
+    embedded: int # Segments embedded across all records
+    total_documents: int
+
+class IngestDeleteRequest(BaseModel):
+    record_ids: List[str]
+
+class IngestDeleteResponse(BaseModel):
+    deleted_records: int
+    deleted_segments: int
+    total_documents: int
+
+# --- FastAPI Router ---
+router = APIRouter(route_class=TracedRoute)
+
+# --- Ledger ---
+
+class IngestionLedger:
+    """
+    Versions and segments (doc_id, type, title) of every ingested record.
+    """
+
+    def __init__(self, path: str):
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.executescript(_SCHEMA)
+
+    def get(self, record_id: str) -> Optional[Tuple[int, Dict[str, Tuple[str, str]]]]:
+        row = self._db.execute("SELECT version FROM records WHERE record_id = ?", (record_id,)).fetchone()
+        if row is None:
+            return None
+        segments = {doc_id: (doc_type, title) for doc_id, doc_type, title in self._db.execute(
+            "SELECT doc_id, type, title FROM segments WHERE record_id = ?", (record_id,))}
+        return row[0], segments
+
+    def save(self, versions: Dict[str, int], segments: List[Tuple[str, str, str, str]], removed: List[str]):
+        """
+        Stores record versions, new or retitled (doc_id, record_id, type, title)
+        segments, and forgets removed segment ids.
+        """
+        now = time.time()
+        with self._db:
+            self._db.executemany("INSERT OR REPLACE INTO records (record_id, version, updated_at) VALUES (?, ?, ?)",
+                                 [(record_id, version, now) for record_id, version in versions.items()])
+            self._db.executemany("INSERT OR REPLACE INTO segments (doc_id, record_id, type, title) "
+                                 "VALUES (?, ?, ?, ?)", segments)
+            self._db.executemany("DELETE FROM segments WHERE doc_id = ?", [(doc_id,) for doc_id in removed])
+
+    def delete(self, record_ids: List[str]) -> Tuple[int, List[str]]:
+        """
+        Forgets records and returns how many were known and their segment ids.
+        """
+        placeholders = ",".join("?" * len(record_ids))
+        with self._db:
+            doc_ids = [doc_id for (doc_id,) in self._db.execute(
+                f"SELECT doc_id FROM segments WHERE record_id IN ({placeholders})", record_ids)]
+            self._db.execute(f"DELETE FROM segments WHERE record_id IN ({placeholders})", record_ids)
+            deleted = self._db.execute(f"DELETE FROM records WHERE record_id IN ({placeholders})", record_ids).rowcount
+        return deleted, doc_ids
+
+    def describe(self, record_id: str) -> Optional[Dict]:
+        with _ingest_lock:
+            return self._describe(record_id)
+
+    def _describe(self, record_id: str) -> Optional[Dict]:
+        row = self._db.execute("SELECT version, updated_at FROM records WHERE record_id = ?", (record_id,)).fetchone()
+        if row is None:
+            return None
+        count = self._db.execute("SELECT COUNT(*) FROM segments WHERE record_id = ?", (record_id,)).fetchone()[0]
+        return {"record_id": record_id, "version": row[0], "updated_at": row[1], "segments": count}
+
+_ledger: Optional[IngestionLedger] = None
+# Serializes ingestion, so concurrent requests for one record cannot interleave their diffs.
+_ingest_lock = threading.Lock()
+
+def get_ledger() -> IngestionLedger:
+    """
+    Opens the ledger of the current vector index. It lives in the index
+    directory, so each embedding model's index has its own.
+    """
+    global _ledger
+    with _ingest_lock:
+        if _ledger is None:
+            _ledger = IngestionLedger(os.path.join(get_vector_index().path, "records.sqlite"))
+    return _ledger
+
+# --- Diffing ---
+
+def split_segments(text: str, max_words: int) -> List[str]:
+    """
+    One segment per non-empty line; lines longer than max_words are split at
+    sentence ends. Splitting never looks past a line, so editing one line
+    leaves the segments of the others unchanged.
+    """
+    segments = []
+    for line in text.splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        if len(line.split()) <= max_words:
+            segments.append(line)
+            continue
+        current: List[str] = []
+        words = 0
+        for sentence in _SENTENCE_END.split(line):
+            length = len(sentence.split())
+            if current and words + length > max_words:
+                segments.append(" ".join(current))
+                current, words = [], 0
+            current.append(sentence)
+            words += length
+        if current:
+            segments.append(" ".join(current))
+    return segments
+
+def record_documents(record: Dict) -> List[Dict]:
+    """
+    Index documents (id, type, title, text) for the segments of a record.
+    Ids are derived from the text, so they survive reordering and edits elsewhere.
+    """
+    if record.get("segments"):
+        segments = [(segment["text"].strip(), segment.get("title")) for segment in record["segments"]]
+    else:
+        segments = [(text, None) for text in split_segments(record.get("text") or "", settings.SEARCH_SEGMENT_MAX_WORDS)]
+    docs = []
+    occurrences: Dict[str, int] = {}
+    for text, title in segments:
+        if not text:
+            continue
+        digest = hashlib.blake2b(" ".join(text.split()).encode("utf-8"), digest_size=8).hexdigest()
+        # Repeated texts ("Yes.") are told apart by occurrence.
+        occurrence = occurrences.get(digest, 0)
+        occurrences[digest] = occurrence + 1
+        doc_id = f"{record['record_id']}:{digest}" + (f".{occurrence}" if occurrence else "")
+        docs.append({"id": doc_id, "type": record["type"], "title": title or record["title"], "text": text})
+    return docs
+
+def ingest_records(records: List[Dict]) -> Dict:
+    """
+    Brings the index up to date with the given records (see above) and returns
+    per-record results and the number of segments embedded.
+    """
+    ledger = get_ledger()
+    vector_index = get_vector_index()
+    # The last copy of a record in one request wins.
+    records = list({record["record_id"]: record for record in records}.values())
+    results: List[Dict] = []
+    to_embed: List[Dict] = []
+    to_retitle: List[Dict] = []
+    to_remove: List[str] = []
+    versions: Dict[str, int] = {}
+    ledger_segments: List[Tuple[str, str, str, str]] = []
+    with _ingest_lock:
+        for record in records:
+            record_id, requested_version = record["record_id"], record.get("version")
+            state = ledger.get(record_id)
+            previous_version, previous = state if state else (0, {})
+            if state and requested_version is not None and requested_version <= previous_version:
+                results.append({"record_id": record_id, "version": previous_version, "status": "stale"})
+                continue
+            docs = record_documents(record)
+            added = [doc for doc in docs if doc["id"] not in previous]
+            retitled = [doc for doc in docs if doc["id"] in previous
+                        and previous[doc["id"]] != (doc["type"], doc["title"])]
+            current = {doc["id"] for doc in docs}
+            removed = [doc_id for doc_id in previous if doc_id not in current]
+            if state is None:
+                removed += vector_index.ids_with_prefix(record_id + LEGACY_SEGMENT_INFIX)
+            changed = bool(added or retitled or removed) or state is None
+            if requested_version is not None:
+                version = requested_version
+            else:
+                version = previous_version + 1 if changed else previous_version
+            versions[record_id] = version
+            to_embed.extend(added)
+            to_retitle.extend(retitled)
+            to_remove.extend(removed)
+            ledger_segments.extend((doc["id"], record_id, doc["type"], doc["title"]) for doc in added + retitled)
+            results.append({
+                "record_id": record_id, "version": version, "status": "indexed" if changed else "unchanged",
+                "added": len(added), "retitled": len(retitled), "removed": len(removed),
+                "unchanged": len(docs) - len(added) - len(retitled),
+            })
+
+        batch_size = max(1, settings.SEARCH_INGEST_BATCH_SIZE)
+        for start in range(0, len(to_embed), batch_size):
+            index_documents(to_embed[start:start + batch_size])
+        vector_index.update_metadata(to_retitle)
+        delete_documents(to_remove)
+        ledger.save(versions, ledger_segments, to_remove)
+        total = vector_index.live_count
+
+    ingested_segments.inc("embedded", amount=len(to_embed))
+    ingested_segments.inc("retitled", amount=len(to_retitle))
+    ingested_segments.inc("removed", amount=len(to_remove))
+    ingested_segments.inc("unchanged", amount=sum(result.get("unchanged", 0) for result in results))
+    return {"records": results, "embedded": len(to_embed), "total_documents": total}
+
+def delete_records(record_ids: List[str]) -> Tuple[int, int, int]:
+    """
+    Removes records and all their segments. Returns the records and segments
+    deleted and the number of documents still indexed.
+    """
+    ledger = get_ledger()
+    with _ingest_lock:
+        deleted_records, doc_ids = ledger.delete(record_ids)
+        vector_index = get_vector_index()
+        for record_id in record_ids:
+            doc_ids += vector_index.ids_with_prefix(record_id + LEGACY_SEGMENT_INFIX)
+        deleted_segments, total = delete_documents(doc_ids)
+    ingested_segments.inc("removed", amount=deleted_segments)
+    return deleted_records, deleted_segments, total
+
+# --- Ingestion Endpoints ---
+
+@router.post("/ingest", response_model=IngestResponse)
+async def ingest(
+    request: IngestRequest = Body(...)
+):
+    """
+    Indexes changed records incrementally: only new or edited segments are
+    embedded, removed ones are deleted, and each record's version is kept.
+    Sending an unchanged record is cheap; sending an older version is a no-op.
+    """
+    result = await nlp_pool.run(ingest_records, [record.model_dump() for record in request.records],
+                                priority=Priority.BATCH)
+    print(f"AI Service (NLP Search): Ingested {len(request.records)} records, embedded {result['embedded']} segments")
+    return IngestResponse(records=result["records"], embedded=result["embedded"],
+                          total_documents=result["total_documents"])
+
+@router.post("/ingest/delete", response_model=IngestDeleteResponse)
+async def ingest_delete(
+    request: IngestDeleteRequest = Body(...)
+):
+    """
+    Removes records and all their segments from the search index.
+    """
+    deleted_records, deleted_segments, total = await nlp_pool.run(delete_records, request.record_ids,
+                                                                  priority=Priority.BATCH)
+    print(f"AI Service (NLP Search): Deleted {deleted_records} records ({deleted_segments} segments)")
+    return IngestDeleteResponse(deleted_records=deleted_records, deleted_segments=deleted_segments,
+                                total_documents=total)
+
+@router.get("/ingest/records/{record_id}")
+async def get_ingested_record(record_id: str):
+    """
+    Returns the indexed version and segment count of a record.
+    """
+    # The ledger is opened in the pool too: on first use that touches SQLite and the index.
+    record = await nlp_pool.run(lambda: get_ledger().describe(record_id), priority=Priority.INTERACTIVE)
+    if record is None:
+        raise HTTPException(status_code=404, detail=f"Record '{record_id}' has not been ingested.")
+    return record
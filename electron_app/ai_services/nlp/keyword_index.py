@@ -0,0 +1,162 @@
+import re
+import threading
+import unicodedata
+from array import array
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# --- Tokenization ---
+# Hebrew and English share one pipeline: NFKC, drop niqqud/cantillation marks,
+# lowercase, then split on word characters while keeping hyphenated terms such
+# as "PDD-NOS" intact (their parts are indexed as well).
+
+_NIQQUD_RE = re.compile("[\u0591-\u05C7]")
+_TOKEN_RE = re.compile("\\w+(?:[-'\u05F3\u05F4]\\w+)*", re.UNICODE)
+_HEBREW_PREFIXES = "\u05D5\u05D1\u05D4\u05DB\u05DC\u05DE\u05E9"  # ו ב ה כ ל מ ש
+_HEBREW_RE = re.compile("[\u05D0-\u05EA]")
+
+
+def tokenize(text: str) -> List[str]:
+    text = _NIQQUD_RE.sub("", unicodedata.normalize("NFKC", text)).lower()
+    tokens = []
+    for token in _TOKEN_RE.findall(text):
+        tokens.append(token)
+        if "-" in token or "'" in token:
+            tokens.extend(part for part in re.split(r"[-']", token) if part)
+        # Light Hebrew prefix stripping: "בתקשורת" also matches "תקשורת".
+        if len(token) > 3 and token[0] in _HEBREW_PREFIXES and _HEBREW_RE.match(token):
+            tokens.append(token[1:])
+    return tokens
+
+
+def _to_array(values: np.ndarray) -> array:
+    result = array("I")
+    result.frombytes(np.ascontiguousarray(values, dtype=np.uint32).tobytes())
+    return result
+
+
+class KeywordIndex:
+    """
+    In-memory inverted index with BM25 scoring.
+    Postings are append-only typed arrays (doc number, term frequency); deleted
+    or replaced documents are tombstoned and skipped at query time.
+    """
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self._postings: Dict[str, Tuple[array, array]] = {}
+        self._doc_numbers: Dict[str, int] = {}
+        self._doc_ids: List[Optional[str]] = []
+        self._doc_lengths = array("I")
+        self._live_mask = bytearray()
+        self._live_docs = 0
+        self._total_length = 0
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return self._live_docs
+
+    def upsert(self, docs: Iterable[Tuple[str, str]]):
+        """
+        Indexes (doc_id, text) pairs, replacing earlier versions of the same ids.
+        """
+        with self._lock:
+            for doc_id, text in docs:
+                self._remove(doc_id)
+                tokens = tokenize(text)
+                number = len(self._doc_ids)
+                self._doc_ids.append(doc_id)
+                self._doc_numbers[doc_id] = number
+                self._doc_lengths.append(len(tokens))
+                self._live_mask.append(1)
+                self._live_docs += 1
+                self._total_length += len(tokens)
+                counts: Dict[str, int] = {}
+                for token in tokens:
+                    counts[token] = counts.get(token, 0) + 1
+                for token, count in counts.items():
+                    postings = self._postings.get(token)
+                    if postings is None:
+                        postings = self._postings[token] = (array("I"), array("I"))
+                    postings[0].append(number)
+                    postings[1].append(count)
+            if len(self._doc_ids) - self._live_docs > max(10000, self._live_docs):
+                self.compact()
+
+    def delete(self, doc_ids: Sequence[str]) -> int:
+        with self._lock:
+            return sum(1 for doc_id in doc_ids if self._remove(doc_id))
+
+    def _remove(self, doc_id: str) -> bool:
+        number = self._doc_numbers.pop(doc_id, None)
+        if number is None:
+            return False
+        self._doc_ids[number] = None
+        self._live_mask[number] = 0
+        self._live_docs -= 1
+        self._total_length -= self._doc_lengths[number]
+        return True
+
+    def search(self, query: str, top_k: int = 10) -> List[Tuple[str, float]]:
+        """
+        Returns up to top_k (doc_id, bm25_score) pairs, best first.
+        """
+        terms = set(tokenize(query))
+        with self._lock:
+            if not terms or not self._live_docs:
+                return []
+            doc_lengths = np.frombuffer(self._doc_lengths, dtype=np.uint32)
+            average_length = self._total_length / self._live_docs
+            scores = np.zeros(len(doc_lengths), dtype=np.float32)
+            for term in terms:
+                postings = self._postings.get(term)
+                if postings is None:
+                    continue
+                numbers = np.frombuffer(postings[0], dtype=np.uint32)
+                frequencies = np.frombuffer(postings[1], dtype=np.uint32).astype(np.float32)
+                # Posting counts include tombstones, which slightly underestimates idf.
+                idf = np.log1p((self._live_docs - len(numbers) + 0.5) / (len(numbers) + 0.5))
+                norm = self.k1 * (1.0 - self.b + self.b * doc_lengths[numbers] / average_length)
+                scores[numbers] += idf * frequencies * (self.k1 + 1.0) / (frequencies + norm)
+            scores *= np.frombuffer(self._live_mask, dtype=np.uint8)
+            candidates = np.flatnonzero(scores)
+            if candidates.size > top_k:
+                candidates = candidates[np.argpartition(-scores[candidates], top_k - 1)[:top_k]]
+            candidates = candidates[np.argsort(-scores[candidates])]
+            return [(self._doc_ids[number], float(scores[number])) for number in candidates]
+
+    def compact(self):
+        """
+        Drops tombstoned postings and renumbers documents.
+        """
+        with self._lock:
+            remap = np.full(len(self._doc_ids), -1, dtype=np.int64)
+            live = [number for number, doc_id in enumerate(self._doc_ids) if doc_id is not None]
+            remap[live] = np.arange(len(live))
+            for term, (numbers, frequencies) in list(self._postings.items()):
+                old = np.frombuffer(numbers, dtype=np.uint32)
+                keep = remap[old] >= 0
+                if not keep.any():
+                    del self._postings[term]
+                    continue
+                self._postings[term] = (
+                    _to_array(remap[old[keep]]),
+                    _to_array(np.frombuffer(frequencies, dtype=np.uint32)[keep]),
+                )
+            self._doc_ids = [self._doc_ids[number] for number in live]
+            self._doc_lengths = array("I", [self._doc_lengths[number] for number in live])
+            self._live_mask = bytearray(b"\x01" * len(live))
+            self._doc_numbers = {doc_id: number for number, doc_id in enumerate(self._doc_ids)}
+
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[str]], k: int = 60) -> List[Tuple[str, float]]:
+    """
+    Fuses several ranked id lists. Each list contributes 1 / (k + rank).
+    """
+    fused: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, start=1):
+            fused[doc_id] = fused.get(doc_id, 0.0) + 1.0 / (k + rank)
+    return sorted(fused.items(), key=lambda item: item[1], reverse=True)
@@ -1,6 +1,17 @@
 from fastapi import APIRouter, Body
 from pydantic import BaseModel
-from typing import List, Optional
+from fastapi.responses import StreamingResponse
+from typing import AsyncIterator, Iterator, List, Optional
+import json
+
+from .. import settings
+from ..execution import PoolSaturated, Priority, nlp_pool
+from ..inference_backend import get_profile, load_ner_pipeline
+from ..metrics import TracedRoute, stage
+from ..model_registry import registry
+from ..result_cache import content_key, package_version, result_cache
+from .batching import MicroBatcher
+from .ner_windowing import extract_entity_batches
 
 # --- Pydantic Models ---
 
@@ -18,8 +29,14 @@ class NERResponse(BaseModel):
     entities: List[NEREntity]
     recording_id: Optional[int] = None
 
+class NERBatchRequest(BaseModel):
+    items: List[NERRequest]
+
+class NERBatchResponse(BaseModel):
+    results: List[NERResponse] # Same order as the request items
+
 # --- FastAPI Router ---
-router = APIRouter()
+router = APIRouter(route_class=TracedRoute)
 
 # --- Dummy Data for Simulation ---
 # Sample text: "The patient underwent an ADOS assessment. Key treatment goal: שיפור יכולות תקשורת."
@@ -44,39 +61,192 @@ dummy_ner_entities_map = {
 }
 
 
+# --- NER Backend ---
+# With AI_NER_MODEL set, a transformers token-classification pipeline from the
+# shared model registry runs over whole batches (the pipeline pads them).
+# Without it, the placeholder entities above are returned.
+
+NER_MODEL_KEY = "ner"
+
+def _load_ner_pipeline():
+    return load_ner_pipeline(settings.NER_MODEL, get_profile())
+
+if settings.NER_MODEL:
+    registry.register(NER_MODEL_KEY, _load_ner_pipeline, capability="nlp")
+
+def _placeholder_entities(text: str) -> List[NEREntity]:
+    # Select dummy entities based on input text, or use default
+    selected_entities = dummy_ner_entities_map.get(text, dummy_ner_entities_map["default"])
+
+    # Keep only entities that fit inside the provided text
+    final_entities = [
+        entity for entity in selected_entities
+        if entity.start_char < len(text) and entity.end_char <= len(text)
+    ]
+
+    # If no specific match and default entities also don't fit, add a generic one
+    if not final_entities and text not in dummy_ner_entities_map and len(text) > 5:
+        final_entities.append(NEREntity(text=text[:5], label="GENERIC_ENTITY", start_char=0, end_char=5))
+    return final_entities
+
+def ner_model_id() -> str:
+    """
+    Identifies the NER backend for result caching.
+    """
+    if not settings.NER_MODEL:
+        return "placeholder"
+    return f"transformers-{package_version('transformers')}/{settings.NER_MODEL}/{get_profile().precision}"
+
+def extract_entities_batch(texts: List[str]) -> List[List[NEREntity]]:
+    """
+    Runs NER over a batch of texts. Cached texts are answered from the result
+    cache; the rest go to the model in a single call.
+    """
+    model_id = ner_model_id()
+    keys = [content_key("ner", model_id, text) for text in texts]
+    cached = result_cache.get_many("ner", keys)
+    missing = {key: text for text, key in zip(texts, keys) if key not in cached}
+    if missing:
+        computed = _run_ner_model(list(missing.values()))
+        fresh = {key: [entity.model_dump() for entity in entities] for key, entities in zip(missing, computed)}
+        result_cache.put_many("ner", fresh)
+        cached.update(fresh)
+    return [[NEREntity(**entity) for entity in cached[key]] for key in keys]
+
+def _run_ner_model(texts: List[str]) -> List[List[NEREntity]]:
+    if not settings.NER_MODEL:
+        return [_placeholder_entities(text) for text in texts]
+    with registry.use(NER_MODEL_KEY) as ner_pipeline:
+        outputs = ner_pipeline(texts, batch_size=len(texts))
+    if texts and outputs and isinstance(outputs[0], dict):
+        outputs = [outputs] # A single text yields a flat list
+    return [
+        [
+            NEREntity(text=text[e["start"]:e["end"]], label=e["entity_group"],
+                      start_char=int(e["start"]), end_char=int(e["end"]))
+            for e in entities
+        ]
+        for text, entities in zip(texts, outputs)
+    ]
+
+def _window_batch_fn(texts: List[str]) -> List[List[dict]]:
+    return [[entity.model_dump() for entity in entities] for entities in extract_entities_batch(texts)]
+
+def iter_entity_batches_long(text: str) -> Iterator[List[NEREntity]]:
+    """
+    Entities for a transcript of any length using overlapping windows, one
+    list per model batch of windows.
+    """
+    for entities in extract_entity_batches(
+        text,
+        _window_batch_fn,
+        window_tokens=settings.NER_WINDOW_TOKENS,
+        overlap_tokens=settings.NER_WINDOW_OVERLAP_TOKENS,
+        windows_per_batch=settings.NER_MAX_BATCH_SIZE,
+    ):
+        yield [NEREntity(**entity) for entity in entities]
+
+def iter_entities_long(text: str) -> Iterator[NEREntity]:
+    """
+    Streams entities for a transcript of any length using overlapping windows.
+    """
+    for entities in iter_entity_batches_long(text):
+        yield from entities
+
+async def stream_entities_long(text: str, priority: Priority = Priority.BATCH) -> AsyncIterator[List[NEREntity]]:
+    """
+    iter_entity_batches_long() with every model batch run in the NLP pool, so
+    long streams queue behind interactive work and are subject to its limits.
+    """
+    batches = iter_entity_batches_long(text)
+    while True:
+        entities = await nlp_pool.run(next, batches, None, priority=priority)
+        if entities is None:
+            return
+        yield entities
+
+# Coalesces concurrent /ner calls into padded model batches.
+ner_batcher = MicroBatcher(
+    extract_entities_batch,
+    max_batch_size=settings.NER_MAX_BATCH_SIZE,
+    max_wait_ms=settings.NER_MAX_WAIT_MS,
+    name="ner",
+    pool=nlp_pool,
+    priority=Priority.INTERACTIVE,
+    max_queue=settings.NLP_POOL_MAX_QUEUE,
+)
+
+
 @router.post("/ner", response_model=NERResponse)
 async def extract_entities_placeholder(
     request: NERRequest = Body(...)
 ):
     """
-    Placeholder for Named Entity Recognition (NER).
-    Accepts text and returns a list of dummy NER entities.
+    Named Entity Recognition (NER) for a single text.
+    Concurrent requests are micro-batched into shared model calls; texts longer
+    than NER_LONG_TEXT_CHARS are processed in overlapping windows instead.
     """
     print(f"AI Service (NLP): Received NER request for recording_id: {request.recording_id}")
     print(f"Text for NER: '{request.text[:100]}...'")
+    with stage("inference"):
+        if len(request.text) > settings.NER_LONG_TEXT_CHARS:
+            entities = await nlp_pool.run(lambda: list(iter_entities_long(request.text)))
+        else:
+            entities = await ner_batcher.submit(request.text)
+    return NERResponse(entities=entities, recording_id=request.recording_id)
 
-    # Select dummy entities based on input text, or use default
-    selected_entities = dummy_ner_entities_map.get(request.text, dummy_ner_entities_map["default"])
-
-    # Adjust start/end_char if the provided text is shorter than what entities expect
-    # This is a very basic adjustment for placeholder
-    final_entities = []
-    for entity_data in selected_entities:
-        if entity_data.start_char < len(request.text) and entity_data.end_char <= len(request.text):
-            # Ensure the entity text actually matches the substring if we were doing real validation
-            # extracted_text = request.text[entity_data.start_char:entity_data.end_char]
-            # if extracted_text == entity_data.text:
-            final_entities.append(entity_data)
-        elif entity_data.start_char < len(request.text) and entity_data.end_char > len(request.text):
-            # If entity goes beyond text length, try to adjust or skip
-            # For simplicity, we just skip if it's out of bounds from the start
-            pass
-
-    # If no specific match and default entities also don't fit, return empty or a generic one
-    if not final_entities and request.text not in dummy_ner_entities_map:
-        # Example: if text is too short for default entities
-        if len(request.text) > 5: # Add a generic entity if text is not empty
-             final_entities.append(NEREntity(text=request.text[:5], label="GENERIC_ENTITY", start_char=0, end_char=5))
-
-
-    return NERResponse(entities=final_entities, recording_id=request.recording_id)
+@router.post("/ner_stream")
+async def extract_entities_stream(
+    request: NERRequest = Body(...)
+):
+    """
+    Windowed NER for long transcripts, streamed as NDJSON (one NEREntity per
+    line, ordered by start_char) as soon as each batch of windows is done.
+    Batches run in the NLP pool at batch priority; if it is saturated before
+    the first batch the answer is 429, later a final {"error": ...} line.
+    """
+    print(f"AI Service (NLP): Received streaming NER request for recording_id: {request.recording_id}")
+    batches = stream_entities_long(request.text)
+    first = await anext(batches, [])  # Saturation here is still a 429
+
+    async def lines():
+        try:
+            entities = first
+            while True:
+                for entity in entities:
+                    yield entity.model_dump_json() + "\n"
+                entities = await anext(batches, None)
+                if entities is None:
+                    return
+        except PoolSaturated as exc:
+            # The response has started, so saturation is reported in-stream instead of as a 429.
+            yield json.dumps({"error": str(exc), "pool": exc.pool, "retry_after": exc.retry_after}) + "\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+@router.post("/ner_batch", response_model=NERBatchResponse)
+async def extract_entities_batch_endpoint(
+    request: NERBatchRequest = Body(...)
+):
+    """
+    NER for many texts (e.g. all segments of a recording) in one request.
+    Texts are processed in model batches of up to NER_MAX_BATCH_SIZE.
+    """
+    print(f"AI Service (NLP): Received batch NER request with {len(request.items)} texts")
+    texts = [item.text for item in request.items]
+    entities: List[List[NEREntity]] = []
+    with stage("inference"):
+        for start in range(0, len(texts), settings.NER_MAX_BATCH_SIZE):
+            chunk = texts[start:start + settings.NER_MAX_BATCH_SIZE]
+            entities.extend(await nlp_pool.run(extract_entities_batch, chunk, priority=Priority.BATCH))
+    return NERBatchResponse(results=[
+        NERResponse(entities=item_entities, recording_id=item.recording_id)
+        for item, item_entities in zip(request.items, entities)
+    ])
+
+@router.get("/ner/stats")
+async def get_ner_stats():
+    """
+    Micro-batching statistics for the /ner endpoint.
+    """
+    return ner_batcher.stats()
@@ -0,0 +1,115 @@
+import re
+from collections import deque
+from typing import Callable, Deque, Dict, Iterator, List, Optional, Tuple
+
+# --- Long-text NER ---
+# Transcripts longer than a model's context are cut into overlapping windows of
+# whitespace tokens. Windows are sent to the model in batches, entity offsets
+# are shifted back into the original string, and each window only keeps the
+# entities that start in the part of the text it "owns" (the middle of each
+# overlap is the boundary), so duplicates from the overlaps are dropped.
+# Everything is a generator: at most one batch of windows is held at a time,
+# so memory stays flat regardless of transcript length.
+
+_TOKEN_RE = re.compile(r"\S+")
+
+# (start_char, end_char, owned_start, owned_end)
+Window = Tuple[int, int, int, int]
+# dicts with text, label, start_char, end_char (offsets relative to the input text)
+EntityDict = Dict
+
+
+def iter_windows(text: str, window_tokens: int, overlap_tokens: int) -> Iterator[Window]:
+    """
+    Yields overlapping character windows covering `text`.
+    """
+    if overlap_tokens >= window_tokens:
+        raise ValueError("overlap_tokens must be smaller than window_tokens.")
+    stride = window_tokens - overlap_tokens
+    spans: Deque[Tuple[int, int]] = deque()
+    tokens = _TOKEN_RE.finditer(text)
+    owned_start = 0
+    exhausted = False
+    while not exhausted:
+        while len(spans) < window_tokens:
+            match = next(tokens, None)
+            if match is None:
+                exhausted = True
+                break
+            spans.append(match.span())
+        if not spans:
+            return
+        if exhausted:
+            yield spans[0][0], spans[-1][1], owned_start, len(text)
+            return
+        # The next window starts `stride` tokens later; split ownership halfway into the overlap.
+        boundary = spans[stride + overlap_tokens // 2][0] if overlap_tokens else spans[stride][0]
+        yield spans[0][0], spans[-1][1], owned_start, boundary
+        owned_start = boundary
+        for _ in range(stride):
+            spans.popleft()
+
+
+def _merge(previous: EntityDict, entity: EntityDict, text: str) -> Optional[EntityDict]:
+    """
+    Merges two overlapping entities with the same label, or returns None.
+    """
+    if entity["label"] != previous["label"] or entity["start_char"] >= previous["end_char"]:
+        return None
+    start = previous["start_char"]
+    end = max(previous["end_char"], entity["end_char"])
+    return {"text": text[start:end], "label": previous["label"], "start_char": start, "end_char": end}
+
+
+def extract_entity_batches(
+    text: str,
+    batch_fn: Callable[[List[str]], List[List[EntityDict]]],
+    window_tokens: int = 200,
+    overlap_tokens: int = 32,
+    windows_per_batch: int = 8,
+) -> Iterator[List[EntityDict]]:
+    """
+    Streams entities for an arbitrarily long text, in order of start offset,
+    as one list per model call (so a caller can schedule each call itself).
+    `batch_fn` runs the model on a list of window texts and returns entity dicts
+    with offsets relative to each window.
+    """
+    windows = iter_windows(text, window_tokens, overlap_tokens)
+    pending: Optional[EntityDict] = None
+    while True:
+        batch = [window for _, window in zip(range(windows_per_batch), windows)]
+        if not batch:
+            break
+        results = batch_fn([text[start:end] for start, end, _, _ in batch])
+        done: List[EntityDict] = []
+        for (start, _, owned_start, owned_end), entities in zip(batch, results):
+            for entity in sorted(entities, key=lambda e: e["start_char"]):
+                absolute_start = start + entity["start_char"]
+                if not owned_start <= absolute_start < owned_end:
+                    continue
+                absolute_end = start + entity["end_char"]
+                current = {
+                    "text": text[absolute_start:absolute_end],
+                    "label": entity["label"],
+                    "start_char": absolute_start,
+                    "end_char": absolute_end,
+                }
+                if pending is not None:
+                    merged = _merge(pending, current, text)
+                    if merged is not None:
+                        pending = merged
+                        continue
+                    done.append(pending)
+                pending = current
+        yield done
+    if pending is not None:
+        yield [pending]
+
+
+def extract_entities_windowed(text: str, batch_fn: Callable[[List[str]], List[List[EntityDict]]],
+                              **options) -> Iterator[EntityDict]:
+    """
+    extract_entity_batches(), one entity at a time.
+    """
+    for entities in extract_entity_batches(text, batch_fn, **options):
+        yield from entities
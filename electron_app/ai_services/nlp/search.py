@@ -1,6 +1,15 @@
 from fastapi import APIRouter, Body, Query
-from pydantic import BaseModel
-from typing import List, Optional
+from pydantic import BaseModel, Field
+from concurrent.futures import Future
+from typing import Callable, Dict, List, Literal, Optional, Tuple
+import threading
+import time
+
+from ..execution import PoolSaturated, Priority, nlp_pool
+from ..metrics import TracedRoute, stage
+from .embeddings import embed_texts
+from .keyword_index import KeywordIndex, reciprocal_rank_fusion
+from .vector_index import get_vector_index
 
 # --- Pydantic Models ---
 
@@ -8,87 +17,230 @@ class SearchResultItem(BaseModel):
     id: str
     type: str  # e.g., "patient", "document", "recording_segment"
     title: str # Display title for the result
-    score: float # Relevance score
-    # Optional: snippet: Optional[str] = None # A small snippet of text if applicable
+    score: float # Relevance score (fused rank score in hybrid mode)
+    snippet: Optional[str] = None # A small snippet of the indexed text
+
+SearchMode = Literal["hybrid", "vector", "keyword"]
 
 class SearchRequest(BaseModel): # If using POST for search query
     query: str
-    top_k: Optional[int] = 5
+    top_k: Optional[int] = Field(5, ge=1)
+    mode: SearchMode = "hybrid"
 
 class SearchResponse(BaseModel):
     results: List[SearchResultItem]
     query_received: str # For confirmation
 
+class IndexDocument(BaseModel):
+    id: str # Stable id, e.g. "recording-12-seg-3" or "protocol-2"
+    type: str # e.g., "patient", "document", "recording_segment", "protocol"
+    title: str
+    text: str # The content that gets embedded
+
+class IndexUpsertRequest(BaseModel):
+    documents: List[IndexDocument]
+
+class IndexDeleteRequest(BaseModel):
+    ids: List[str]
+
+class IndexUpdateResponse(BaseModel):
+    upserted: int
+    deleted: int
+    total_documents: int
+
 # --- FastAPI Router ---
-router = APIRouter()
-
-# --- Dummy Data for Simulation ---
-dummy_search_results_db = {
-    "ados": [
-        SearchResultItem(id="doc-456", type="document", title="ADOS Report Summary for Patient X", score=0.88),
-        SearchResultItem(id="patient-123", type="patient", title="Patient John Doe (mentioned ADOS)", score=0.75),
-        SearchResultItem(id="recording-seg-001", type="recording_segment", title="Segment: '...ADOS assessment was conducted...'", score=0.92),
-    ],
-    "communication": [
-        SearchResultItem(id="goal-001", type="treatment_goal", title="Goal: Improve communication skills for Jane Doe", score=0.95),
-        SearchResultItem(id="patient-789", type="patient", title="Patient Jane Doe (focus on communication)", score=0.82),
-        SearchResultItem(id="protocol-002", type="protocol", title="Protocol: Social Communication Enhancement", score=0.70),
-    ],
-    "default": [
-        SearchResultItem(id="patient-generic", type="patient", title="Generic Patient Record", score=0.65),
-        SearchResultItem(id="doc-generic", type="document", title="Standard Procedure Document", score=0.55),
+router = APIRouter(route_class=TracedRoute)
+
+# --- Search Stores ---
+# The vector index is the source of truth for documents; the BM25 keyword index
+# lives in memory. It is rebuilt from the vector index in the background when
+# the router is mounted (see on_startup), and until it is ready searches use
+# the vector index alone instead of waiting for it. Index writes wait for the
+# rebuild so they are applied to the finished keyword index.
+
+_keyword_index: Optional[KeywordIndex] = None
+_keyword_index_lock = threading.Lock()
+_keyword_build: Optional[Future] = None
+_keyword_build_lock = threading.Lock()
+
+# Number of candidates each retriever contributes before rank fusion.
+_FUSION_CANDIDATES = 50
+
+def _build_keyword_index():
+    global _keyword_index
+    started = time.perf_counter()
+    with _keyword_index_lock:
+        if _keyword_index is not None:
+            return
+        keyword_index = KeywordIndex()
+        for batch in get_vector_index().iter_texts():
+            keyword_index.upsert(batch)
+        _keyword_index = keyword_index
+    print(f"AI Service (NLP Search): Built keyword index over {len(keyword_index)} documents "
+          f"in {time.perf_counter() - started:.1f}s")
+
+def build_keyword_index_in_background():
+    """
+    Starts rebuilding the keyword index in the NLP pool unless it is ready or
+    already being built. A failed build is retried on the next call.
+    """
+    global _keyword_build
+    with _keyword_build_lock:
+        if _keyword_index is not None or (_keyword_build is not None and not _keyword_build.done()):
+            return
+        if _keyword_build is not None and _keyword_build.exception() is not None:
+            print(f"AI Service (NLP Search): Keyword index build failed: {_keyword_build.exception()!r}; retrying")
+        try:
+            _keyword_build = nlp_pool.submit(_build_keyword_index, priority=Priority.BATCH)
+        except PoolSaturated:
+            _keyword_build = None
+
+def get_keyword_index() -> Optional[KeywordIndex]:
+    """
+    The keyword index, or None while it is being built (which this starts).
+    """
+    if _keyword_index is None:
+        build_keyword_index_in_background()
+    return _keyword_index
+
+def _update_keyword_index(update: Callable[[KeywordIndex], None]):
+    # Waits for a running rebuild, which may not have seen this write.
+    with _keyword_index_lock:
+        if _keyword_index is not None:
+            update(_keyword_index)
+
+def on_startup():
+    """
+    Called once the search router is mounted: builds the keyword index.
+    """
+    build_keyword_index_in_background()
+
+def index_documents(docs: List[dict]) -> Tuple[int, int]:
+    """
+    Embeds docs (dicts with id, type, title, text) and writes them to both stores.
+    Returns the number upserted and the number of documents now indexed.
+    """
+    vector_index = get_vector_index()
+    # A repeated id is indexed once, with its last version.
+    docs = list({doc["id"]: doc for doc in docs}.values())
+    if not docs:
+        return 0, vector_index.live_count
+    upserted = vector_index.upsert(docs, embed_texts([doc["text"] for doc in docs]))
+    _update_keyword_index(lambda keyword_index: keyword_index.upsert((doc["id"], doc["text"]) for doc in docs))
+    return upserted, vector_index.live_count
+
+def delete_documents(doc_ids: List[str]) -> Tuple[int, int]:
+    """
+    Deletes documents from both stores. Returns the number deleted and the
+    number of documents still indexed.
+    """
+    vector_index = get_vector_index()
+    deleted = vector_index.delete(doc_ids)
+    _update_keyword_index(lambda keyword_index: keyword_index.delete(doc_ids))
+    return deleted, vector_index.live_count
+
+def index_stats() -> Dict:
+    stats = get_vector_index().stats()
+    keyword_index = get_keyword_index()
+    stats["keyword_documents"] = len(keyword_index) if keyword_index is not None else None
+    return stats
+
+def _run_search(query: str, top_k: int, mode: str = "hybrid") -> List[SearchResultItem]:
+    vector_index = get_vector_index()
+    keyword_index = get_keyword_index()
+    if keyword_index is None:
+        mode = "vector"  # Until the keyword index is built
+    candidates = max(top_k, _FUSION_CANDIDATES) if mode == "hybrid" else top_k
+    rankings = []
+    scores = {}
+    docs = {}
+    if mode in ("hybrid", "vector"):
+        with stage("embedding"):
+            query_vector = embed_texts([query])[0]
+        with stage("vector_search"):
+            vector_hits = vector_index.search(query_vector, top_k=candidates)
+        rankings.append([doc["id"] for doc, _ in vector_hits])
+        for doc, score in vector_hits:
+            docs[doc["id"]] = doc
+            scores[doc["id"]] = score
+    if mode in ("hybrid", "keyword"):
+        with stage("keyword_search"):
+            keyword_hits = keyword_index.search(query, top_k=candidates)
+        rankings.append([doc_id for doc_id, _ in keyword_hits])
+        scores.update((doc_id, score) for doc_id, score in keyword_hits if doc_id not in scores)
+    if mode == "hybrid":
+        ranked = reciprocal_rank_fusion(rankings)[:top_k]
+    else:
+        ranked = [(doc_id, scores[doc_id]) for doc_id in rankings[0][:top_k]]
+    missing = [doc_id for doc_id, _ in ranked if doc_id not in docs]
+    docs.update(vector_index.get_documents(missing))
+    return [
+        SearchResultItem(id=doc_id, type=docs[doc_id]["type"], title=docs[doc_id]["title"],
+                         score=score, snippet=docs[doc_id]["text"][:200])
+        for doc_id, score in ranked if doc_id in docs
     ]
-}
 
 @router.post("/semantic_search", response_model=SearchResponse)
 async def semantic_search_placeholder(
     request: SearchRequest = Body(...)
 ):
     """
-    Placeholder for semantic search.
-    Accepts a search query and returns a list of dummy search results.
+    Hybrid search over the indexed content.
+    Vector similarity and BM25 keyword rankings are fused with reciprocal rank
+    fusion; set mode to "vector" or "keyword" to use a single retriever.
+    While the keyword index is being rebuilt after a restart, results come
+    from vector similarity alone.
     """
-    query_lower = request.query.lower()
     print(f"AI Service (NLP Search): Received semantic search request for query: '{request.query}'")
-
-    results = []
-    found = False
-    for keyword, res_list in dummy_search_results_db.items():
-        if keyword in query_lower:
-            results.extend(res_list)
-            found = True
-
-    if not found:
-        results.extend(dummy_search_results_db["default"])
-
-    # Sort by score for better presentation (descending)
-    results.sort(key=lambda x: x.score, reverse=True)
-
-    return SearchResponse(results=results[:request.top_k], query_received=request.query)
+    results = await nlp_pool.run(_run_search, request.query, request.top_k or 5, request.mode,
+                                 priority=Priority.INTERACTIVE)
+    return SearchResponse(results=results, query_received=request.query)
 
 # Alternative: GET endpoint if query is simple enough (less common for "semantic" search usually)
 @router.get("/semantic_search_get", response_model=SearchResponse)
 async def semantic_search_get_placeholder(
     query: str = Query(..., min_length=1),
-    top_k: Optional[int] = Query(5)
+    top_k: Optional[int] = Query(5, ge=1),
+    mode: SearchMode = Query("hybrid")
 ):
     """
-    Placeholder for semantic search using GET.
-    Accepts a search query and returns a list of dummy search results.
+    Semantic search using GET. Same behaviour as the POST endpoint.
     """
-    query_lower = query.lower()
     print(f"AI Service (NLP Search): Received GET semantic search request for query: '{query}'")
+    results = await nlp_pool.run(_run_search, query, top_k or 5, mode, priority=Priority.INTERACTIVE)
+    return SearchResponse(results=results, query_received=query)
 
-    results = []
-    found = False
-    for keyword, res_list in dummy_search_results_db.items():
-        if keyword in query_lower:
-            results.extend(res_list)
-            found = True
+# --- Index Maintenance Endpoints ---
 
-    if not found:
-        results.extend(dummy_search_results_db["default"])
-
-    results.sort(key=lambda x: x.score, reverse=True)
+@router.post("/index/upsert", response_model=IndexUpdateResponse)
+async def upsert_index_documents(
+    request: IndexUpsertRequest = Body(...)
+):
+    """
+    Embeds and inserts (or replaces) documents in the search index.
+    Documents are matched by id, so re-sending an edited item replaces it.
+    """
+    # Indexing is background work (the backend fires it after saving): it yields to searches.
+    upserted, total = await nlp_pool.run(index_documents, [doc.model_dump() for doc in request.documents],
+                                         priority=Priority.BATCH)
+    print(f"AI Service (NLP Search): Upserted {upserted} documents into the search index")
+    return IndexUpdateResponse(upserted=upserted, deleted=0, total_documents=total)
+
+@router.post("/index/delete", response_model=IndexUpdateResponse)
+async def delete_index_documents(
+    request: IndexDeleteRequest = Body(...)
+):
+    """
+    Removes documents from the search index by id. Unknown ids are ignored.
+    """
+    deleted, total = await nlp_pool.run(delete_documents, request.ids, priority=Priority.BATCH)
+    print(f"AI Service (NLP Search): Deleted {deleted} documents from the search index")
+    return IndexUpdateResponse(upserted=0, deleted=deleted, total_documents=total)
 
-    return SearchResponse(results=results[:top_k], query_received=query)
+@router.get("/index/stats")
+async def get_index_stats():
+    """
+    Returns size and configuration details of the search index.
+    """
+    # Opening the index (and loading the embedder) on first use must not stall the event loop.
+    return await nlp_pool.run(index_stats, priority=Priority.INTERACTIVE)
@@ -0,0 +1,403 @@
+import json
+import os
+import re
+import sqlite3
+import threading
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .. import settings
+from .embeddings import get_embedder
+
+# --- Persistent Vector Index ---
+# Layout of an index directory:
+#   vectors.f32   float32 matrix (capacity x dim), memory-mapped, append-only
+#   lists.i32     IVF list id per row (UNASSIGNED before training, DELETED for tombstones)
+#   centroids.npy IVF coarse quantizer, absent while the index is still exact
+#   docs.sqlite   document metadata and the doc_id -> row mapping
+# Upserts append a new row and tombstone the old one; compaction reclaims space.
+
+UNASSIGNED = -1
+DELETED = -2
+
+_SCAN_BLOCK_ROWS = 65536
+_KMEANS_ITERATIONS = 10
+_REQUIRED_KEYS = ("id", "type", "title", "text")
+
+
+class VectorIndex:
+    """
+    Cosine-similarity index over L2-normalised embeddings with an IVF coarse
+    quantizer. Searches are exact until the index holds `ivf_min_vectors`.
+    """
+
+    def __init__(self, path: str, dim: int, nprobe: int = 8, ivf_min_vectors: int = 20000):
+        self.path = path
+        self.dim = dim
+        self.nprobe = nprobe
+        self.ivf_min_vectors = ivf_min_vectors
+        self._lock = threading.RLock()
+        os.makedirs(path, exist_ok=True)
+
+        self._db = sqlite3.connect(os.path.join(path, "docs.sqlite"), check_same_thread=False)
+        self._db.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS documents (
+                doc_id TEXT PRIMARY KEY,
+                row INTEGER NOT NULL UNIQUE,
+                type TEXT NOT NULL,
+                title TEXT NOT NULL,
+                text TEXT NOT NULL,
+                metadata TEXT
+            );
+            CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+            """
+        )
+        meta = dict(self._db.execute("SELECT key, value FROM meta").fetchall())
+        stored_dim = int(meta.get("dim", dim))
+        if stored_dim != dim:
+            raise ValueError(f"Index at {path} has dim {stored_dim}, embedder produces {dim}.")
+        self._count = int(meta.get("count", 0))
+        self._capacity = int(meta.get("capacity", 0))
+        self._trained_at = int(meta.get("trained_at", 0))
+        self._vectors = None
+        self._lists = None
+        self._open_maps(max(self._capacity, 1024))
+
+        centroids_path = os.path.join(path, "centroids.npy")
+        self._centroids = np.load(centroids_path) if os.path.exists(centroids_path) else None
+
+    # --- Storage helpers ---
+
+    def _open_maps(self, capacity: int):
+        vectors_path = os.path.join(self.path, "vectors.f32")
+        lists_path = os.path.join(self.path, "lists.i32")
+        for file_path, row_bytes in ((vectors_path, 4 * self.dim), (lists_path, 4)):
+            if not os.path.exists(file_path) or os.path.getsize(file_path) < capacity * row_bytes:
+                with open(file_path, "ab") as handle:
+                    handle.truncate(capacity * row_bytes)
+        if self._vectors is not None:
+            self._vectors.flush()
+            self._lists.flush()
+        self._vectors = np.memmap(vectors_path, dtype=np.float32, mode="r+", shape=(capacity, self.dim))
+        self._lists = np.memmap(lists_path, dtype=np.int32, mode="r+", shape=(capacity,))
+        if capacity > self._capacity:
+            self._lists[self._capacity:] = DELETED
+        self._capacity = capacity
+
+    def _ensure_capacity(self, needed: int):
+        if needed <= self._capacity:
+            return
+        capacity = self._capacity
+        while capacity < needed:
+            capacity *= 2
+        self._open_maps(capacity)
+
+    def _save_meta(self):
+        values = {"dim": self.dim, "count": self._count,
+                  "capacity": self._capacity, "trained_at": self._trained_at}
+        self._db.executemany(
+            "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)",
+            [(key, str(value)) for key, value in values.items()],
+        )
+
+    def _flush(self):
+        self._vectors.flush()
+        self._lists.flush()
+        self._save_meta()
+        self._db.commit()
+
+    # --- Public API ---
+
+    @property
+    def live_count(self) -> int:
+        return int(self._db.execute("SELECT COUNT(*) FROM documents").fetchone()[0])
+
+    def upsert(self, docs: Sequence[Dict], vectors: np.ndarray) -> int:
+        """
+        Inserts or replaces documents. Each doc needs id, type, title and text;
+        `vectors` holds one normalised embedding per doc.
+        """
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if vectors.shape != (len(docs), self.dim):
+            raise ValueError(f"Expected vectors of shape ({len(docs)}, {self.dim}), got {vectors.shape}.")
+        for doc in docs:
+            missing = [key for key in _REQUIRED_KEYS if doc.get(key) is None]
+            if missing:
+                raise ValueError(f"Document {doc.get('id')!r} is missing {', '.join(missing)}.")
+        # A repeated id replaces the earlier entry of the same batch.
+        last = {doc["id"]: index for index, doc in enumerate(docs)}
+        if len(last) < len(docs):
+            keep = sorted(last.values())
+            docs, vectors = [docs[index] for index in keep], vectors[keep]
+        if not docs:
+            return 0
+        with self._lock:
+            start = self._count
+            self._ensure_capacity(start + len(docs))
+            # The rows only become live (and the old ones dead) once the
+            # documents table holds the batch, so a failed insert changes nothing.
+            try:
+                old_rows = self._delete_rows([doc["id"] for doc in docs])
+                self._db.executemany(
+                    "INSERT INTO documents (doc_id, row, type, title, text, metadata) VALUES (?, ?, ?, ?, ?, ?)",
+                    [
+                        (doc["id"], start + offset, doc["type"], doc["title"], doc["text"],
+                         json.dumps(doc.get("metadata")) if doc.get("metadata") else None)
+                        for offset, doc in enumerate(docs)
+                    ],
+                )
+            except Exception:
+                self._db.rollback()
+                raise
+            if old_rows:
+                self._lists[np.asarray(old_rows, dtype=np.int64)] = DELETED
+            self._vectors[start:start + len(docs)] = vectors
+            self._lists[start:start + len(docs)] = self._assign(vectors)
+            self._count += len(docs)
+            self._maybe_train()
+            self._maybe_compact()
+            self._flush()
+        return len(docs)
+
+    def update_metadata(self, docs: Sequence[Dict]) -> int:
+        """
+        Changes the type and title of stored documents, keeping their vectors.
+        """
+        if not docs:
+            return 0
+        with self._lock:
+            updated = self._db.executemany(
+                "UPDATE documents SET type = ?, title = ? WHERE doc_id = ?",
+                [(doc["type"], doc["title"], doc["id"]) for doc in docs]).rowcount
+            self._db.commit()
+        return updated
+
+    def delete(self, doc_ids: Sequence[str]) -> int:
+        with self._lock:
+            deleted = self._tombstone(doc_ids)
+            self._maybe_compact()
+            self._flush()
+        return deleted
+
+    def search(self, query_vector: np.ndarray, top_k: int = 5,
+               doc_type: Optional[str] = None) -> List[Tuple[Dict, float]]:
+        """
+        Returns up to top_k (document, score) pairs, best first.
+        """
+        query = np.asarray(query_vector, dtype=np.float32).reshape(-1)
+        with self._lock:
+            rows, scores = self._candidate_scores(query)
+            if rows.size == 0:
+                return []
+            # Over-fetch when filtering by type, since filtering happens after ranking.
+            fetch = min(rows.size, top_k * 4 if doc_type else top_k)
+            best = np.argpartition(-scores, fetch - 1)[:fetch]
+            best = best[np.argsort(-scores[best])]
+            docs = self._docs_for_rows([int(rows[i]) for i in best])
+        results = []
+        for index in best:
+            doc = docs.get(int(rows[index]))
+            if doc is None or (doc_type and doc["type"] != doc_type):
+                continue
+            results.append((doc, float(scores[index])))
+            if len(results) == top_k:
+                break
+        return results
+
+    def get_documents(self, doc_ids: Sequence[str]) -> Dict[str, Dict]:
+        """
+        Returns stored documents keyed by id. Unknown ids are omitted.
+        """
+        if not doc_ids:
+            return {}
+        placeholders = ",".join("?" * len(doc_ids))
+        with self._lock:
+            cursor = self._db.execute(
+                f"SELECT doc_id, type, title, text, metadata FROM documents WHERE doc_id IN ({placeholders})",
+                list(doc_ids))
+            return {
+                doc_id: {"id": doc_id, "type": doc_type, "title": title, "text": text,
+                         "metadata": json.loads(metadata) if metadata else None}
+                for doc_id, doc_type, title, text, metadata in cursor
+            }
+
+    def ids_with_prefix(self, prefix: str) -> List[str]:
+        """
+        Ids of the stored documents whose id starts with `prefix`.
+        """
+        with self._lock:
+            # A range on the primary key, so SQLite uses its index (LIKE would not).
+            return [doc_id for (doc_id,) in self._db.execute(
+                "SELECT doc_id FROM documents WHERE doc_id >= ? AND doc_id < ?", (prefix, prefix + "\U0010ffff"))]
+
+    def iter_texts(self, batch_size: int = 10000) -> Iterator[List[Tuple[str, str]]]:
+        """
+        Yields (doc_id, text) batches for every live document, in row order.
+        """
+        last_row = -1
+        while True:
+            with self._lock:
+                batch = self._db.execute(
+                    "SELECT row, doc_id, text FROM documents WHERE row > ? ORDER BY row LIMIT ?",
+                    (last_row, batch_size)).fetchall()
+            if not batch:
+                return
+            last_row = batch[-1][0]
+            yield [(doc_id, text) for _, doc_id, text in batch]
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "path": self.path,
+                "dim": self.dim,
+                "live_vectors": self.live_count,
+                "stored_rows": self._count,
+                "ivf_lists": 0 if self._centroids is None else int(self._centroids.shape[0]),
+                "nprobe": self.nprobe,
+            }
+
+    # --- Internals ---
+
+    def _delete_rows(self, doc_ids: Sequence[str]) -> List[int]:
+        """
+        Deletes the documents' metadata (uncommitted) and returns their rows.
+        """
+        if not doc_ids:
+            return []
+        placeholders = ",".join("?" * len(doc_ids))
+        rows = [row for (row,) in self._db.execute(
+            f"SELECT row FROM documents WHERE doc_id IN ({placeholders})", list(doc_ids))]
+        if rows:
+            self._db.execute(f"DELETE FROM documents WHERE doc_id IN ({placeholders})", list(doc_ids))
+        return rows
+
+    def _tombstone(self, doc_ids: Sequence[str]) -> int:
+        rows = self._delete_rows(doc_ids)
+        if rows:
+            self._lists[np.asarray(rows, dtype=np.int64)] = DELETED
+        return len(rows)
+
+    def _assign(self, vectors: np.ndarray) -> np.ndarray:
+        if self._centroids is None:
+            return np.full(len(vectors), UNASSIGNED, dtype=np.int32)
+        return np.argmax(vectors @ self._centroids.T, axis=1).astype(np.int32)
+
+    def _candidate_scores(self, query: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        lists = self._lists[:self._count]
+        if self._centroids is None:
+            rows = np.flatnonzero(lists != DELETED)
+        else:
+            nprobe = min(self.nprobe, self._centroids.shape[0])
+            probe = np.argpartition(-(self._centroids @ query), nprobe - 1)[:nprobe]
+            rows = np.flatnonzero(np.isin(lists, probe))
+        scores = np.empty(rows.size, dtype=np.float32)
+        for start in range(0, rows.size, _SCAN_BLOCK_ROWS):
+            block = rows[start:start + _SCAN_BLOCK_ROWS]
+            scores[start:start + block.size] = self._vectors[block] @ query
+        return rows, scores
+
+    def _docs_for_rows(self, rows: List[int]) -> Dict[int, Dict]:
+        if not rows:
+            return {}
+        placeholders = ",".join("?" * len(rows))
+        cursor = self._db.execute(
+            f"SELECT row, doc_id, type, title, text, metadata FROM documents WHERE row IN ({placeholders})", rows)
+        return {
+            row: {"id": doc_id, "type": doc_type, "title": title, "text": text,
+                  "metadata": json.loads(metadata) if metadata else None}
+            for row, doc_id, doc_type, title, text, metadata in cursor
+        }
+
+    def _maybe_train(self):
+        live = self.live_count
+        if live < self.ivf_min_vectors or (self._trained_at and live < 2 * self._trained_at):
+            return
+        self.train()
+
+    def train(self):
+        """
+        (Re)builds the IVF coarse quantizer with spherical k-means over a sample
+        of live vectors, then reassigns every live row.
+        """
+        with self._lock:
+            live_rows = np.flatnonzero(self._lists[:self._count] != DELETED)
+            if live_rows.size == 0:
+                return
+            nlist = max(1, int(np.sqrt(live_rows.size)))
+            rng = np.random.default_rng(0)
+            sample_size = min(live_rows.size, 32 * nlist)
+            sample = np.sort(rng.choice(live_rows, size=sample_size, replace=False))
+            data = np.asarray(self._vectors[sample])
+            centroids = data[rng.choice(sample_size, size=nlist, replace=False)].copy()
+            for _ in range(_KMEANS_ITERATIONS):
+                assignment = np.argmax(data @ centroids.T, axis=1)
+                sums = np.zeros_like(centroids)
+                np.add.at(sums, assignment, data)
+                empty = np.bincount(assignment, minlength=nlist) == 0
+                sums[empty] = centroids[empty]
+                norms = np.linalg.norm(sums, axis=1, keepdims=True)
+                norms[norms == 0.0] = 1.0
+                centroids = sums / norms
+            self._centroids = centroids.astype(np.float32)
+            np.save(os.path.join(self.path, "centroids.npy"), self._centroids)
+            for start in range(0, live_rows.size, _SCAN_BLOCK_ROWS):
+                block = live_rows[start:start + _SCAN_BLOCK_ROWS]
+                self._lists[block] = self._assign(np.asarray(self._vectors[block]))
+            self._trained_at = int(live_rows.size)
+            print(f"AI Service (NLP Index): Trained IVF quantizer with {nlist} lists over {live_rows.size} vectors")
+
+    def _maybe_compact(self):
+        live = self.live_count
+        dead = self._count - live
+        if dead > 10000 and dead > live:
+            self.compact()
+
+    def compact(self):
+        """
+        Rewrites the vector files without tombstoned rows.
+        """
+        with self._lock:
+            live_rows = np.flatnonzero(self._lists[:self._count] != DELETED)
+            new_rows = np.arange(live_rows.size, dtype=np.int64)
+            remap = dict(zip(live_rows.tolist(), new_rows.tolist()))
+            for start in range(0, live_rows.size, _SCAN_BLOCK_ROWS):
+                block = live_rows[start:start + _SCAN_BLOCK_ROWS]
+                target = new_rows[start:start + block.size]
+                self._vectors[target] = self._vectors[block]
+                self._lists[target] = self._lists[block]
+            self._lists[live_rows.size:self._count] = DELETED
+            # Shift rows out of the way first so the UNIQUE constraint holds mid-update.
+            self._db.execute("UPDATE documents SET row = -row - 1")
+            self._db.executemany("UPDATE documents SET row = ? WHERE row = ?",
+                                 [(new, -old - 1) for old, new in remap.items()])
+            self._count = int(live_rows.size)
+            self._flush()
+
+
+# --- Process-wide index ---
+
+_index: Optional[VectorIndex] = None
+_index_lock = threading.Lock()
+
+
+def get_vector_index() -> VectorIndex:
+    """
+    Returns the shared index for the configured embedding model, opening it on
+    first use. Each embedding model gets its own directory so switching models
+    never mixes incompatible vectors.
+    """
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                embedder = get_embedder()
+                model_dir = re.sub(r"[^A-Za-z0-9_.-]+", "_", embedder.name)
+                _index = VectorIndex(
+                    os.path.join(settings.SEARCH_INDEX_DIR, model_dir),
+                    dim=embedder.dim,
+                    nprobe=settings.SEARCH_IVF_NPROBE,
+                    ivf_min_vectors=settings.SEARCH_IVF_MIN_VECTORS,
+                )
+    return _index
@@ -0,0 +1,149 @@
+from fastapi import APIRouter, Body, Request
+from pydantic import BaseModel
+from typing import Any, Dict, List, Optional
+import asyncio
+import os
+import time
+
+from . import settings, summarization
+from .encoding import encode, response_format, to_json
+from .execution import WorkloadPool, nlp_pool, speech_pool
+from .metrics import TracedRoute, record_stages
+from .nlp.ner import NEREntity, extract_entities_batch, iter_entities_long
+from .speech.audio_io import AudioSource, open_audio
+from .speech.alignment import assign_speakers
+from .speech.segment_table import SegmentTable
+from .speech.transcription import (
+    AlignedSegment,
+    DiarizationSegment,
+    diarize_audio,
+    transcribe_audio,
+)
+
+# --- Pydantic Models ---
+
+class PipelineRequest(BaseModel):
+    recording_id: Optional[int] = None
+    audio_data_ref: Optional[str] = None # Path to the recording's audio file
+    num_speakers: Optional[int] = None # Optional diarization hint
+    summarize: bool = True
+    persist: bool = False # Also write the combined result to the AI service's data directory
+
+class PipelineResponse(BaseModel):
+    recording_id: Optional[int] = None
+    text: str
+    segments: List[AlignedSegment] # Transcript segments with speakers assigned
+    diarization: List[DiarizationSegment]
+    entities: List[NEREntity]
+    summary: Optional[str] = None
+    timings: Dict[str, float] # Seconds per stage
+    result_path: Optional[str] = None
+
+# --- FastAPI Router ---
+router = APIRouter(route_class=TracedRoute)
+
+def open_and_segment(audio_ref: Optional[str]) -> Optional[AudioSource]:
+    """
+    Opens the recording and runs VAD once, before the stages that share it start.
+    """
+    source = open_audio(audio_ref)
+    if source is not None:
+        source.speech_regions()
+    return source
+
+def extract_entities(text: str) -> List[NEREntity]:
+    if len(text) > settings.NER_LONG_TEXT_CHARS:
+        return list(iter_entities_long(text))
+    return extract_entities_batch([text])[0]
+
+def align(transcription: SegmentTable, turns: SegmentTable) -> List[Dict]:
+    return assign_speakers(transcription.to_dicts(), turns.to_dicts())
+
+def persist_result(payload: Dict[str, Any]) -> str:
+    """
+    Writes the pipeline result as JSON to the data directory and returns its path.
+    """
+    name = f"recording_{payload['recording_id']}.json" if payload["recording_id"] is not None \
+        else f"recording_{int(time.time() * 1000)}.json"
+    payload["result_path"] = settings.data_path("pipeline_results", name)
+    temporary_path = payload["result_path"] + ".tmp"
+    with open(temporary_path, "wb") as handle:
+        handle.write(to_json(payload))
+    os.replace(temporary_path, payload["result_path"])
+    return payload["result_path"]
+
+@router.post("/process", response_model=PipelineResponse)
+async def process_recording(
+    http_request: Request,
+    request: PipelineRequest = Body(...)
+):
+    """
+    End-to-end processing of one recording in a single call.
+    The audio is memory-mapped and segmented by VAD once; transcription and
+    diarization run concurrently on it, speakers are aligned to segments here,
+    then NER and summarization run concurrently on the transcript.
+    Audio stages run in the speech pool and text stages in the NLP pool.
+    Segments are kept as SegmentTables and encoded per the Accept header.
+    """
+    print(f"AI Service (Pipeline): Processing recording_id: {request.recording_id}")
+    timings: Dict[str, float] = {}
+
+    async def summarize(text: str, segments: List[Dict]) -> str:
+        # Map-reduce over speaker turns; its chunk summaries run in the NLP pool.
+        started = time.perf_counter()
+        try:
+            return (await summarization.summarize(text, segments))["summary"]
+        finally:
+            timings["summarization"] = round(time.perf_counter() - started, 4)
+
+    def timed(pool: WorkloadPool, stage: str, fn, *args):
+        def run():
+            started = time.perf_counter()
+            try:
+                return fn(*args)
+            finally:
+                timings[stage] = round(time.perf_counter() - started, 4)
+        return pool.run(run)
+
+    source = await timed(speech_pool, "decode", open_and_segment, request.audio_data_ref)
+    try:
+        # Both stages read the mapped audio: wait for both (one may have been
+        # rejected by a full pool) before closing it.
+        transcription, turns = await asyncio.gather(
+            timed(speech_pool, "transcription", transcribe_audio, source),
+            timed(speech_pool, "diarization", diarize_audio, source, request.num_speakers),
+            return_exceptions=True,
+        )
+        for result in (transcription, turns):
+            if isinstance(result, BaseException):
+                raise result
+    finally:
+        if source is not None:
+            source.close()
+
+    segments = await timed(speech_pool, "alignment", align, transcription, turns)
+
+    text = transcription.joined_text().strip()
+    stages = [timed(nlp_pool, "ner", extract_entities, text)]
+    if request.summarize:
+        stages.append(summarize(text, segments))
+    results = await asyncio.gather(*stages)
+    entities = results[0]
+    summary = results[1] if request.summarize else None
+    # Stages run in worker threads (some concurrently), so they are reported as measured here.
+    record_stages(timings)
+
+    # PipelineResponse fields; the model documents the JSON form.
+    payload = {
+        "recording_id": request.recording_id,
+        "text": text,
+        "segments": SegmentTable.from_dicts(segments, with_overlaps=True),
+        "diarization": turns,
+        "entities": entities,
+        "summary": summary,
+        "timings": timings,
+        "result_path": None,
+    }
+    if request.persist:
+        await speech_pool.run(persist_result, payload)
+    return await speech_pool.run(encode, payload, response_format(http_request))
@@ -0,0 +1,260 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import weakref
+from importlib import metadata
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from . import settings
+from .metrics import metrics
+
+# --- Result Cache ---
+# Inference results (transcripts, speaker turns, entities, summaries) are stored
+# on disk under a content address: a hash of the input (decoded audio samples or
+# text), the kind of work and the ID/version of the model that produced it.
+# Re-processing the same recording, or the same text, with the same model is a
+# single SQLite lookup. Changing the model changes the address, so stale results
+# are never returned; they simply age out. The cache is bounded in bytes and
+# evicts least-recently-used entries first.
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    key TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    value BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    last_access REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS results_last_access ON results (last_access);
+"""
+
+# Hashing an hour of decoded audio takes a noticeable fraction of a second, and
+# the pipeline looks up transcription and diarization for the same array, so
+# digests are remembered for as long as the array is alive.
+_array_digests: Dict[int, str] = {}
+_array_digests_lock = threading.Lock()
+
+
+def _array_digest(array: np.ndarray) -> str:
+    with _array_digests_lock:
+        digest = _array_digests.get(id(array))
+    if digest is not None:
+        return digest
+    hasher = hashlib.blake2b(digest_size=32)
+    hasher.update(f"{array.dtype.str}{array.shape}".encode())
+    hasher.update(memoryview(np.ascontiguousarray(array)).cast("B"))
+    digest = hasher.hexdigest()
+    with _array_digests_lock:
+        _array_digests[id(array)] = digest
+    weakref.finalize(array, _array_digests.pop, id(array), None)
+    return digest
+
+
+def package_version(name: str) -> str:
+    """
+    Installed version of a package, for use in model IDs ("" if not installed).
+    """
+    try:
+        return metadata.version(name)
+    except metadata.PackageNotFoundError:
+        return ""
+
+
+def content_key(kind: str, model_id: str, *parts: Any) -> str:
+    """
+    Content address for one unit of work. Parts may be text, bytes, numpy
+    arrays, numbers or None.
+    """
+    hasher = hashlib.blake2b(digest_size=32)
+    for part in (kind, model_id) + parts:
+        if isinstance(part, np.ndarray):
+            encoded = b"a" + _array_digest(part).encode()
+        elif isinstance(part, (bytes, bytearray, memoryview)):
+            encoded = b"b" + bytes(part)
+        else:
+            encoded = b"j" + json.dumps(part, ensure_ascii=False).encode("utf-8")
+        hasher.update(len(encoded).to_bytes(8, "little"))
+        hasher.update(encoded)
+    return hasher.hexdigest()
+
+
+class ResultCache:
+    def __init__(self, db_path: str, max_bytes: int):
+        self.db_path = db_path
+        self.max_bytes = max_bytes
+        self._db: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self._total_bytes = 0
+        self._counters: Dict[str, Dict[str, int]] = {}
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    def _connection(self) -> sqlite3.Connection:
+        # Opened on first use so importing the service never touches the disk.
+        if self._db is None:
+            os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+            db = sqlite3.connect(self.db_path, timeout=30, check_same_thread=False)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            db.executescript(_SCHEMA)
+            self._total_bytes = db.execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()[0]
+            self._db = db
+        return self._db
+
+    def _count(self, kind: str, counter: str, amount: int = 1):
+        counters = self._counters.setdefault(kind, {"hits": 0, "misses": 0, "stores": 0, "evictions": 0})
+        counters[counter] += amount
+
+    # --- Lookups ---
+
+    def get_many(self, kind: str, keys: Sequence[str]) -> Dict[str, Any]:
+        """
+        Returns the cached values found for `keys`, and records hits and misses.
+        """
+        if not self.enabled or not keys:
+            return {}
+        unique = list(dict.fromkeys(keys))
+        with self._lock:
+            db = self._connection()
+            found: Dict[str, Any] = {}
+            for start in range(0, len(unique), 500):
+                chunk = unique[start:start + 500]
+                placeholders = ",".join("?" * len(chunk))
+                for key, value in db.execute(
+                        f"SELECT key, value FROM results WHERE key IN ({placeholders})", chunk):
+                    found[key] = json.loads(value)
+            if found:
+                with db:
+                    db.executemany("UPDATE results SET last_access = ? WHERE key = ?",
+                                   [(time.time(), key) for key in found])
+            self._count(kind, "hits", sum(1 for key in keys if key in found))
+            self._count(kind, "misses", sum(1 for key in keys if key not in found))
+        return found
+
+    def get(self, kind: str, key: str) -> Optional[Any]:
+        return self.get_many(kind, [key]).get(key)
+
+    def put_many(self, kind: str, items: Dict[str, Any]):
+        if not self.enabled or not items:
+            return
+        now = time.time()
+        rows = []
+        for key, value in items.items():
+            encoded = json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+            rows.append((key, kind, encoded, len(encoded), now, now))
+        with self._lock:
+            db = self._connection()
+            with db:
+                for row in rows:
+                    previous = db.execute("SELECT size FROM results WHERE key = ?", (row[0],)).fetchone()
+                    db.execute("INSERT OR REPLACE INTO results (key, kind, value, size, created_at, last_access) "
+                               "VALUES (?, ?, ?, ?, ?, ?)", row)
+                    self._total_bytes += row[3] - (previous[0] if previous else 0)
+            self._count(kind, "stores", len(rows))
+            self._evict()
+
+    def put(self, kind: str, key: str, value: Any):
+        self.put_many(kind, {key: value})
+
+    def cached(self, kind: str, key: str, compute: Callable[[], Any]) -> Any:
+        """
+        Returns the cached value for `key`, or computes and stores it.
+        A computed value of None is returned but not stored.
+        """
+        value = self.get(kind, key)
+        if value is not None:
+            return value
+        value = compute()
+        if value is not None:
+            self.put(kind, key, value)
+        return value
+
+    # --- Maintenance ---
+
+    def _evict(self):
+        """
+        Drops least-recently-used entries until the cache is 10% under budget.
+        """
+        if self._total_bytes <= self.max_bytes:
+            return
+        target = int(self.max_bytes * 0.9)
+        db = self._db
+        with db:
+            while self._total_bytes > target:
+                victims = db.execute("SELECT key, kind, size FROM results ORDER BY last_access LIMIT 256").fetchall()
+                if not victims:
+                    self._total_bytes = 0
+                    break
+                removed = []
+                for key, kind, size in victims:
+                    if self._total_bytes <= target:
+                        break
+                    removed.append((key,))
+                    self._total_bytes -= size
+                    self._count(kind, "evictions")
+                db.executemany("DELETE FROM results WHERE key = ?", removed)
+
+    def clear(self, kind: Optional[str] = None) -> int:
+        with self._lock:
+            db = self._connection()
+            with db:
+                if kind:
+                    removed = db.execute("DELETE FROM results WHERE kind = ?", (kind,)).rowcount
+                else:
+                    removed = db.execute("DELETE FROM results").rowcount
+            self._total_bytes = db.execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()[0]
+        return removed
+
+    def stats(self) -> Dict:
+        with self._lock:
+            entries: List[Dict] = []
+            if self.enabled:
+                entries = [
+                    {"kind": kind, "entries": count, "bytes": size}
+                    for kind, count, size in self._connection().execute(
+                        "SELECT kind, COUNT(*), SUM(size) FROM results GROUP BY kind ORDER BY kind")
+                ]
+            kinds = {entry["kind"]: dict(entry) for entry in entries}
+            for kind, counters in self._counters.items():
+                kinds.setdefault(kind, {"kind": kind, "entries": 0, "bytes": 0}).update(counters)
+            for entry in kinds.values():
+                lookups = entry.get("hits", 0) + entry.get("misses", 0)
+                entry["hit_rate"] = round(entry.get("hits", 0) / lookups, 3) if lookups else None
+            return {
+                "enabled": self.enabled,
+                "path": self.db_path,
+                "max_bytes": self.max_bytes,
+                "total_bytes": self._total_bytes,
+                "kinds": sorted(kinds.values(), key=lambda entry: entry["kind"]),
+            }
+
+
+result_cache = ResultCache(
+    os.path.join(settings.DATA_DIR, "cache", "results.sqlite"),
+    max_bytes=int(settings.RESULT_CACHE_MAX_MB * 1024 * 1024),
+)
+
+
+def _collect_metrics():
+    with result_cache._lock:
+        counters = {kind: dict(values) for kind, values in result_cache._counters.items()}
+        total_bytes = result_cache._total_bytes
+    return [
+        ("ai_result_cache_bytes", "gauge", "Bytes stored in the result cache.", [({}, total_bytes)]),
+        ("ai_result_cache_lookups_total", "counter", "Result cache lookups by kind and outcome.",
+         [({"kind": kind, "result": result}, values[counter])
+          for kind, values in counters.items() for result, counter in (("hit", "hits"), ("miss", "misses"))]),
+        ("ai_result_cache_evictions_total", "counter", "Entries evicted from the result cache.",
+         [({"kind": kind}, values["evictions"]) for kind, values in counters.items()]),
+    ]
+
+
+metrics.register_collector(_collect_metrics)
@@ -0,0 +1,156 @@
+import os
+
+# --- Service Settings ---
+# All settings can be overridden through environment variables so the Electron
+# main process can configure the AI service without editing code.
+
+# Root directory for everything the AI service persists (indexes, caches, journals).
+DATA_DIR = os.environ.get(
+    "AI_SERVICES_DATA_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "data"),
+)
+
+
+def data_path(*parts: str) -> str:
+    """
+    Returns a path inside DATA_DIR, creating the parent directory if needed.
+    """
+    path = os.path.join(DATA_DIR, *parts)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    return path
+
+
+# --- Search Settings ---
+SEARCH_INDEX_DIR = os.environ.get("AI_SEARCH_INDEX_DIR", os.path.join(DATA_DIR, "search_index"))
+# Sentence-transformers model used for semantic search. "hashing" selects the
+# dependency-free feature-hashing embedder (useful for development and tests).
+EMBEDDING_MODEL = os.environ.get(
+    "AI_EMBEDDING_MODEL", "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2"
+)
+# Number of IVF lists probed per query. Higher is more accurate but slower.
+SEARCH_IVF_NPROBE = int(os.environ.get("AI_SEARCH_IVF_NPROBE", "8"))
+# The index stays exact (brute force) until it holds this many live vectors.
+SEARCH_IVF_MIN_VECTORS = int(os.environ.get("AI_SEARCH_IVF_MIN_VECTORS", "20000"))
+# Incremental ingestion: record text is split into segments of at most this
+# many words, and new segments are embedded this many at a time.
+SEARCH_SEGMENT_MAX_WORDS = int(os.environ.get("AI_SEARCH_SEGMENT_MAX_WORDS", "200"))
+SEARCH_INGEST_BATCH_SIZE = int(os.environ.get("AI_SEARCH_INGEST_BATCH_SIZE", "256"))
+
+# --- Speech Settings ---
+ASR_MODEL = os.environ.get("AI_ASR_MODEL", "small")
+ASR_DEVICE = os.environ.get("AI_ASR_DEVICE", "cpu")
+# Overrides the CTranslate2 compute type the inference profile picks (e.g. "int8_float32").
+ASR_COMPUTE_TYPE = os.environ.get("AI_ASR_COMPUTE_TYPE") or None
+ASR_LANGUAGE = os.environ.get("AI_ASR_LANGUAGE") or None  # None lets Whisper detect the language
+ASR_BATCH_SIZE = int(os.environ.get("AI_ASR_BATCH_SIZE", "8"))
+# Recorded audio is memory-mapped and processed in blocks of this many seconds;
+# ASR receives speech-only chunks of at most ASR_CHUNK_SECONDS (Whisper's window).
+AUDIO_BLOCK_SECONDS = float(os.environ.get("AI_AUDIO_BLOCK_SECONDS", "60"))
+ASR_CHUNK_SECONDS = float(os.environ.get("AI_ASR_CHUNK_SECONDS", "30"))
+# Offline VAD: pauses shorter than VAD_MIN_SILENCE_SECONDS are kept, speech
+# shorter than VAD_MIN_SPEECH_SECONDS is dropped, regions are padded by VAD_PAD_SECONDS.
+VAD_MIN_SPEECH_SECONDS = float(os.environ.get("AI_VAD_MIN_SPEECH_SECONDS", "0.25"))
+VAD_MIN_SILENCE_SECONDS = float(os.environ.get("AI_VAD_MIN_SILENCE_SECONDS", "0.5"))
+VAD_PAD_SECONDS = float(os.environ.get("AI_VAD_PAD_SECONDS", "0.2"))
+# Streaming transcription: longest utterance held in memory per session, and
+# how often partial hypotheses are re-decoded while someone is speaking.
+STREAM_MAX_UTTERANCE_SECONDS = float(os.environ.get("AI_STREAM_MAX_UTTERANCE_SECONDS", "15"))
+STREAM_PARTIAL_INTERVAL_SECONDS = float(os.environ.get("AI_STREAM_PARTIAL_INTERVAL_SECONDS", "0.5"))
+STREAM_END_SILENCE_SECONDS = float(os.environ.get("AI_STREAM_END_SILENCE_SECONDS", "0.6"))
+
+# --- Inference Backend Settings ---
+# CPU compute profile for the speech, NER and embedding models: "fp32",
+# "int8" (dynamic quantization) or "onnx" (ONNX Runtime). Can be changed at
+# runtime through PUT /inference/profile.
+INFERENCE_PRECISION = os.environ.get("AI_INFERENCE_PRECISION", "int8")
+# Threads used inside one operator, and operators run in parallel. Batch
+# workers cap OMP_NUM_THREADS, which becomes the default here.
+INFERENCE_INTRA_OP_THREADS = int(
+    os.environ.get("AI_INFERENCE_INTRA_OP_THREADS") or os.environ.get("OMP_NUM_THREADS") or os.cpu_count() or 1
+)
+INFERENCE_INTER_OP_THREADS = int(os.environ.get("AI_INFERENCE_INTER_OP_THREADS", "1"))
+# Directory of <name>.wav (+ optional <name>.txt reference) files used by
+# POST /inference/compare for speech; text models use a built-in sentence set.
+INFERENCE_TESTSET_DIR = os.environ.get("AI_INFERENCE_TESTSET_DIR", "")
+
+# --- Model Registry Settings ---
+# Loaded models are evicted least-recently-used first once their combined
+# footprint exceeds this budget (0 disables the budget).
+MODEL_RAM_BUDGET_MB = float(os.environ.get("AI_MODEL_RAM_BUDGET_MB", "0"))
+# Models unused for this long are unloaded (0 keeps them loaded).
+MODEL_IDLE_SECONDS = float(os.environ.get("AI_MODEL_IDLE_SECONDS", "0"))
+# Comma-separated registry names to load at startup, e.g. "asr,embedding".
+MODEL_PREWARM = [name.strip() for name in os.environ.get("AI_MODEL_PREWARM", "").split(",") if name.strip()]
+DIARIZATION_MODEL = os.environ.get("AI_DIARIZATION_MODEL", "pyannote/speaker-diarization-3.1")
+HF_TOKEN = os.environ.get("HF_TOKEN") or None
+
+# --- Startup Settings ---
+# "background" imports the speech/nlp/training routers after the server is up;
+# "eager" imports them before the app starts serving.
+STARTUP_MODE = os.environ.get("AI_STARTUP_MODE", "background")
+
+# --- NER Settings ---
+# Hugging Face token-classification model (name or local path). Empty selects
+# the placeholder entities.
+NER_MODEL = os.environ.get("AI_NER_MODEL", "")
+NER_MAX_BATCH_SIZE = int(os.environ.get("AI_NER_MAX_BATCH_SIZE", "16"))
+NER_MAX_WAIT_MS = float(os.environ.get("AI_NER_MAX_WAIT_MS", "10"))
+# Texts longer than this are split into overlapping windows of whitespace
+# tokens (keep NER_WINDOW_TOKENS well under the model's subword context).
+NER_LONG_TEXT_CHARS = int(os.environ.get("AI_NER_LONG_TEXT_CHARS", "2000"))
+NER_WINDOW_TOKENS = int(os.environ.get("AI_NER_WINDOW_TOKENS", "200"))
+NER_WINDOW_OVERLAP_TOKENS = int(os.environ.get("AI_NER_WINDOW_OVERLAP_TOKENS", "32"))
+
+# --- Summarization Settings ---
+# Long transcripts are summarized map-reduce style: chunks of about
+# SUMMARY_CHUNK_WORDS words (whole speaker turns) are summarized to at most
+# SUMMARY_CHUNK_SUMMARY_WORDS each, those summaries are combined the same way
+# until one chunk is left, and that is summarized to SUMMARY_MAX_WORDS.
+SUMMARY_CHUNK_WORDS = int(os.environ.get("AI_SUMMARY_CHUNK_WORDS", "400"))
+SUMMARY_CHUNK_SUMMARY_WORDS = int(os.environ.get("AI_SUMMARY_CHUNK_SUMMARY_WORDS", "80"))
+SUMMARY_MAX_WORDS = int(os.environ.get("AI_SUMMARY_MAX_WORDS", "150"))
+
+# --- Training Settings ---
+# Worker processes for training jobs, and math-library threads per job, so
+# concurrent jobs do not oversubscribe the CPU.
+TRAINING_MAX_WORKERS = int(os.environ.get("AI_TRAINING_MAX_WORKERS", "1"))
+TRAINING_THREADS_PER_JOB = int(
+    os.environ.get("AI_TRAINING_THREADS_PER_JOB", str(max(1, (os.cpu_count() or 2) // 2)))
+)
+TRAINING_TOTAL_STEPS = int(os.environ.get("AI_TRAINING_TOTAL_STEPS", "20"))
+TRAINING_STEP_SECONDS = float(os.environ.get("AI_TRAINING_STEP_SECONDS", "1.0"))
+
+# --- Result Cache Settings ---
+# Disk budget for cached inference results (transcripts, speaker turns,
+# entities, summaries). 0 disables the cache.
+RESULT_CACHE_MAX_MB = float(os.environ.get("AI_RESULT_CACHE_MAX_MB", "512"))
+
+# --- Batch Transcription Settings ---
+# Offline transcription of audio archives: worker processes and math-library
+# threads per worker. Workers x threads should not exceed the CPU count.
+BATCH_THREADS_PER_WORKER = int(os.environ.get("AI_BATCH_THREADS_PER_WORKER", "2"))
+BATCH_MAX_WORKERS = int(
+    os.environ.get("AI_BATCH_MAX_WORKERS", str(max(1, (os.cpu_count() or 1) // BATCH_THREADS_PER_WORKER)))
+)
+
+# --- Execution Settings ---
+# Worker threads and queue bounds of the per-workload execution pools. Speech
+# workers each run a whole model (which uses its own intra-op threads), so keep
+# them few; requests beyond the queue bound get 429 with Retry-After.
+SPEECH_POOL_WORKERS = int(os.environ.get("AI_SPEECH_POOL_WORKERS", "2"))
+SPEECH_POOL_MAX_QUEUE = int(os.environ.get("AI_SPEECH_POOL_MAX_QUEUE", "32"))
+NLP_POOL_WORKERS = int(os.environ.get("AI_NLP_POOL_WORKERS", "4"))
+NLP_POOL_MAX_QUEUE = int(os.environ.get("AI_NLP_POOL_MAX_QUEUE", "128"))
+# Admission limits for process-pool work started through the API.
+TRAINING_MAX_QUEUED_JOBS = int(os.environ.get("AI_TRAINING_MAX_QUEUED_JOBS", "16"))
+BATCH_MAX_RUNNING_JOBS = int(os.environ.get("AI_BATCH_MAX_RUNNING_JOBS", "1"))
+# Nice value for training and API-started batch transcription worker
+# processes, so the OS schedules interactive requests first (0 disables).
+BACKGROUND_WORKER_NICE = int(os.environ.get("AI_BACKGROUND_WORKER_NICE", "10"))
+
+# --- Observability Settings ---
+# Request/model metrics served at GET /metrics in the Prometheus text format.
+METRICS_ENABLED = os.environ.get("AI_METRICS_ENABLED", "1").lower() not in ("0", "false", "no")
+# Per-request stage timings in a Server-Timing response header: "always",
+# "request" (only when the request sends "X-Server-Timing: 1") or "off".
+SERVER_TIMING = os.environ.get("AI_SERVER_TIMING", "request")
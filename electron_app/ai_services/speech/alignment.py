@@ -0,0 +1,263 @@
+import re
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# --- Speaker Alignment ---
+# Assigns diarization speakers to transcript segments (or words) by maximum
+# time overlap. Each speaker's turns are merged into sorted disjoint intervals
+# with a running total of covered time, so the time a speaker talks inside any
+# [start, end) is two searchsorted lookups: covered(end) - covered(start).
+# That makes alignment O((segments + turns) log turns) per speaker instead of
+# comparing every segment with every turn. Turns may overlap (people talking
+# at once); other speakers heard during a segment are reported alongside the
+# main one, and segments are split where the main speaker changes.
+
+_TOKEN_RE = re.compile(r"\S+")
+
+# Speakers heard for at least this long during a segment are listed as overlapping.
+OVERLAP_MIN_SECONDS = 0.2
+
+
+class SpeakerCoverage:
+    """
+    Per-speaker covered time as merged intervals plus cumulative durations.
+    """
+
+    def __init__(self, turns: Sequence[Dict]):
+        self.speakers: List[str] = sorted({turn["speaker"] for turn in turns})
+        speaker_index = {speaker: index for index, speaker in enumerate(self.speakers)}
+        labels = np.array([speaker_index[turn["speaker"]] for turn in turns], dtype=np.int64)
+        starts = np.array([turn["start_time"] for turn in turns], dtype=np.float64)
+        ends = np.array([turn["end_time"] for turn in turns], dtype=np.float64)
+        self._intervals: List[Tuple[np.ndarray, np.ndarray, np.ndarray]] = []
+        for index in range(len(self.speakers)):
+            mask = labels == index
+            self._intervals.append(_merge_intervals(starts[mask], ends[mask]))
+        # All turns merged, for finding the nearest speech to a gap.
+        order = np.argsort(starts, kind="stable")
+        self._turn_starts, self._turn_ends, self._turn_labels = starts[order], ends[order], labels[order]
+
+    def covered(self, speaker: int, times: np.ndarray) -> np.ndarray:
+        """
+        Seconds of `speaker` speech between time 0 and each of `times`.
+        """
+        starts, ends, cumulative = self._intervals[speaker]
+        if starts.size == 0:
+            return np.zeros_like(times)
+        index = np.searchsorted(starts, times, side="right") - 1
+        safe = np.maximum(index, 0)
+        partial = np.clip(times - starts[safe], 0.0, ends[safe] - starts[safe])
+        return np.where(index >= 0, cumulative[safe] + partial, 0.0)
+
+    def overlap_matrix(self, starts: np.ndarray, ends: np.ndarray) -> np.ndarray:
+        """
+        (intervals, speakers) matrix of seconds each speaker talks in each interval.
+        """
+        matrix = np.empty((starts.size, len(self.speakers)))
+        for speaker in range(len(self.speakers)):
+            matrix[:, speaker] = self.covered(speaker, ends) - self.covered(speaker, starts)
+        return matrix
+
+    def nearest_speaker(self, times: np.ndarray) -> np.ndarray:
+        """
+        Index of the speaker whose turn is closest to each time.
+        """
+        index = np.searchsorted(self._turn_starts, times, side="right")
+        before = np.clip(index - 1, 0, self._turn_starts.size - 1)
+        after = np.clip(index, 0, self._turn_starts.size - 1)
+        distance_before = np.maximum(times - self._turn_ends[before], 0.0)
+        distance_after = np.maximum(self._turn_starts[after] - times, 0.0)
+        nearest = np.where(distance_before <= distance_after, before, after)
+        return self._turn_labels[nearest]
+
+
+def _merge_intervals(starts: np.ndarray, ends: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    if starts.size == 0:
+        return starts, ends, np.zeros(1)
+    order = np.argsort(starts, kind="stable")
+    starts, ends = starts[order], ends[order]
+    running_end = np.maximum.accumulate(ends)
+    new_block = starts[1:] > running_end[:-1]
+    merged_starts = starts[np.concatenate(([True], new_block))]
+    merged_ends = running_end[np.concatenate((new_block, [True]))]
+    cumulative = np.concatenate(([0.0], np.cumsum(merged_ends - merged_starts)))
+    return merged_starts, merged_ends, cumulative
+
+
+def _word_timings(segments: Sequence[Dict]) -> Tuple[List[str], np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Words of all segments as (texts, starts, ends, owning segment index). Word
+    timings come from the recognizer when segments carry "words"; otherwise
+    each segment's tokens are spread over its duration in proportion to length.
+    """
+    texts: List[str] = []
+    owners: List[int] = []
+    lengths: List[int] = []
+    known_starts: List[float] = []
+    known_ends: List[float] = []
+    for index, segment in enumerate(segments):
+        words = segment.get("words")
+        if words:
+            for word in words:
+                texts.append(word["word"])
+                lengths.append(0)
+                known_starts.append(float(word["start_time"]))
+                known_ends.append(float(word["end_time"]))
+        else:
+            tokens = _TOKEN_RE.findall(segment["text"])
+            texts.extend(tokens)
+            lengths.extend(len(token) + 1 for token in tokens)
+            known_starts.extend([np.nan] * len(tokens))
+            known_ends.extend([np.nan] * len(tokens))
+        owners.extend([index] * (len(words) if words else len(tokens)))
+    owner_array = np.array(owners, dtype=np.int64)
+    starts, ends = np.array(known_starts), np.array(known_ends)
+    estimated = np.isnan(starts)
+    if estimated.any():
+        weights = np.array(lengths, dtype=np.float64)[estimated]
+        owner = owner_array[estimated]
+        segment_starts = np.array([float(segment["start_time"]) for segment in segments])
+        segment_ends = np.array([float(segment["end_time"]) for segment in segments])
+        totals = np.bincount(owner, weights=weights, minlength=len(segments))
+        # Cumulative length within each segment: global running sum minus the segment's base.
+        running = np.cumsum(weights)
+        first = np.flatnonzero(np.concatenate(([True], owner[1:] != owner[:-1])))
+        base = np.repeat(running[first] - weights[first], np.diff(np.concatenate((first, [owner.size]))))
+        scale = (segment_ends[owner] - segment_starts[owner]) / totals[owner]
+        starts[estimated] = segment_starts[owner] + (running - weights - base) * scale
+        ends[estimated] = segment_starts[owner] + (running - base) * scale
+    return texts, starts, ends, owner_array
+
+
+def assign_speakers(
+    segments: Sequence[Dict],
+    turns: Sequence[Dict],
+    split_on_speaker_change: bool = True,
+    fill_nearest: bool = True,
+    min_run_seconds: float = 0.5,
+) -> List[Dict]:
+    """
+    Returns segments (text, start_time, end_time, speaker, overlapping_speakers)
+    with speakers from `turns`. With split_on_speaker_change, a segment whose
+    words are spoken by different speakers is split into one segment per
+    speaker run (runs shorter than min_run_seconds join their neighbour).
+    Segments no turn overlaps get the nearest turn's speaker, or keep their
+    own speaker when fill_nearest is off.
+    """
+    if not segments:
+        return []
+    if not turns:
+        return [dict(_base(segment), speaker=segment.get("speaker"), overlapping_speakers=[]) for segment in segments]
+    coverage = SpeakerCoverage(turns)
+
+    if split_on_speaker_change:
+        pieces = _split_segments(segments, coverage, fill_nearest, min_run_seconds)
+    else:
+        pieces = [(_base(segment), None) for segment in segments]
+
+    starts = np.array([piece["start_time"] for piece, _ in pieces])
+    ends = np.array([piece["end_time"] for piece, _ in pieces])
+    matrix = coverage.overlap_matrix(starts, ends)
+    main = _main_speakers(matrix, starts, ends, coverage, fill_nearest)
+    heard = (matrix >= OVERLAP_MIN_SECONDS).tolist()
+    aligned = []
+    for (piece, run_speaker), speaker, heard_row in zip(pieces, main.tolist(), heard):
+        index = run_speaker if run_speaker is not None else speaker
+        piece["speaker"] = coverage.speakers[index] if index >= 0 else piece.get("speaker")
+        piece["overlapping_speakers"] = [
+            name for other, name in enumerate(coverage.speakers) if heard_row[other] and other != index
+        ]
+        aligned.append(piece)
+    return aligned
+
+
+def _base(segment: Dict) -> Dict:
+    return {
+        "text": segment["text"],
+        "start_time": float(segment["start_time"]),
+        "end_time": float(segment["end_time"]),
+        "speaker": segment.get("speaker"),
+    }
+
+
+def _main_speakers(matrix: np.ndarray, starts: np.ndarray, ends: np.ndarray,
+                   coverage: SpeakerCoverage, fill_nearest: bool) -> np.ndarray:
+    """
+    Speaker index with the most overlap per row; -1 (or the nearest turn) without overlap.
+    """
+    best = np.argmax(matrix, axis=1)
+    silent = matrix[np.arange(matrix.shape[0]), best] <= 0.0
+    if silent.any():
+        if fill_nearest:
+            best[silent] = coverage.nearest_speaker((starts[silent] + ends[silent]) / 2.0)
+        else:
+            best[silent] = -1
+    return best
+
+
+def _split_segments(segments: Sequence[Dict], coverage: SpeakerCoverage, fill_nearest: bool,
+                    min_run_seconds: float) -> List[Tuple[Dict, Optional[int]]]:
+    """
+    Splits segments at word-level speaker changes. Returns (segment, speaker
+    index) pairs; the index is None for segments that were not split.
+    """
+    words, word_starts, word_ends, owner_array = _word_timings(segments)
+    if not words:
+        return [(_base(segment), None) for segment in segments]
+    word_speakers = _main_speakers(coverage.overlap_matrix(word_starts, word_ends),
+                                   word_starts, word_ends, coverage, fill_nearest)
+    # A run is a stretch of words in one segment with one speaker.
+    boundaries = np.flatnonzero((word_speakers[1:] != word_speakers[:-1]) | (owner_array[1:] != owner_array[:-1])) + 1
+    run_starts = np.concatenate(([0], boundaries))
+    run_ends = np.concatenate((boundaries, [len(words)]))
+
+    run_owners = owner_array[run_starts]
+    runs_by_segment: Dict[int, List[List[int]]] = {}
+    for segment_index in np.flatnonzero(np.bincount(run_owners, minlength=len(segments)) > 1).tolist():
+        runs_by_segment[segment_index] = []
+    for first, last, owner in zip(run_starts.tolist(), run_ends.tolist(), run_owners.tolist()):
+        if owner in runs_by_segment:
+            runs_by_segment[owner].append([first, last, int(word_speakers[first])])
+
+    pieces: List[Tuple[Dict, Optional[int]]] = []
+    for index, segment in enumerate(segments):
+        runs = runs_by_segment.get(index)
+        if runs:
+            runs = _absorb_short_runs(runs, word_starts, word_ends, min_run_seconds)
+        if not runs or len(runs) == 1:
+            # One speaker throughout: the segment-level overlap decides.
+            pieces.append((_base(segment), None))
+            continue
+        for position, (first, last, speaker) in enumerate(runs):
+            pieces.append(({
+                "text": " ".join(words[first:last]),
+                "start_time": float(segment["start_time"]) if position == 0 else round(float(word_starts[first]), 3),
+                "end_time": float(segment["end_time"]) if position == len(runs) - 1 else round(float(word_ends[last - 1]), 3),
+                "speaker": segment.get("speaker"),
+            }, speaker))
+    return pieces
+
+
+def _absorb_short_runs(runs: List[List[int]], word_starts: np.ndarray, word_ends: np.ndarray,
+                       min_run_seconds: float) -> List[List[int]]:
+    """
+    Merges runs shorter than min_run_seconds into the previous run (or the next
+    one for the first run), then joins neighbours that share a speaker.
+    """
+    def duration(run: List[int]) -> float:
+        return float(word_ends[run[1] - 1] - word_starts[run[0]])
+
+    merged: List[List[int]] = []
+    for run in runs:
+        if merged:
+            previous = merged[-1]
+            if previous[2] == run[2] or duration(run) < min_run_seconds:
+                previous[1] = run[1]
+                continue
+            if len(merged) == 1 and duration(previous) < min_run_seconds:
+                # The first run is too short to stand alone; it takes this run's speaker.
+                previous[1], previous[2] = run[1], run[2]
+                continue
+        merged.append(list(run))
+    return merged
@@ -0,0 +1,82 @@
+import functools
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from .. import settings
+from ..inference_backend import asr_compute_type, get_profile, load_asr_model
+from ..model_registry import registry
+from ..result_cache import package_version
+
+# --- Speech Recognition Backend ---
+# All speech code hands 16 kHz mono float32 audio to transcribe_array(). The
+# WhisperX model lives in the shared model registry under "asr"; without
+# whisperx installed a placeholder recognizer reports detected speech spans so
+# the rest of the pipeline can still be exercised.
+
+SAMPLE_RATE = 16000
+ASR_MODEL_KEY = "asr"
+
+
+def _load_asr_model():
+    return load_asr_model(get_profile())
+
+
+registry.register(ASR_MODEL_KEY, _load_asr_model, capability="speech")
+
+
+@functools.lru_cache(maxsize=None)
+def whisperx_available() -> bool:
+    try:
+        import whisperx  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def asr_model_id() -> str:
+    """
+    Identifies the recognizer for result caching; changes whenever its output could.
+    """
+    if not whisperx_available():
+        return "placeholder"
+    return (f"whisperx-{package_version('whisperx')}/{settings.ASR_MODEL}/"
+            f"{asr_compute_type(get_profile())}/{settings.ASR_LANGUAGE or 'auto'}")
+
+
+def transcribe_array(audio: np.ndarray, offset: float = 0.0) -> List[Dict]:
+    """
+    Transcribes 16 kHz mono float32 audio.
+    Returns segment dicts (text, start_time, end_time) shifted by `offset` seconds.
+    """
+    audio = np.asarray(audio, dtype=np.float32)
+    if audio.size == 0:
+        return []
+    if not whisperx_available():
+        duration = audio.size / SAMPLE_RATE
+        return [{"text": "[speech]", "start_time": round(offset, 3), "end_time": round(offset + duration, 3)}]
+    with registry.use(ASR_MODEL_KEY) as model:
+        result = model.transcribe(audio, batch_size=settings.ASR_BATCH_SIZE)
+    return [
+        {
+            "text": segment["text"],
+            "start_time": round(offset + float(segment["start"]), 3),
+            "end_time": round(offset + float(segment["end"]), 3),
+        }
+        for segment in result.get("segments", [])
+    ]
+
+
+def pcm16_to_float32(pcm: bytes) -> np.ndarray:
+    """
+    Converts little-endian signed 16-bit PCM bytes to float32 in [-1, 1).
+    """
+    return np.frombuffer(pcm, dtype="<i2").astype(np.float32) / 32768.0
+
+
+def _resample(audio: np.ndarray, sample_rate: int) -> np.ndarray:
+    if sample_rate == SAMPLE_RATE:
+        return audio
+    duration = audio.size / sample_rate
+    target = np.linspace(0.0, duration, int(duration * SAMPLE_RATE), endpoint=False)
+    return np.interp(target, np.arange(audio.size) / sample_rate, audio).astype(np.float32)
@@ -0,0 +1,367 @@
+import hashlib
+import os
+import shutil
+import struct
+import subprocess
+import tempfile
+from typing import Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from .. import settings
+from .asr import SAMPLE_RATE, _resample
+
+# --- Audio Ingestion ---
+# Recordings are never decoded whole. WAV/PCM files are memory-mapped and read
+# in fixed-size blocks of zero-copy views; only the block being worked on is
+# converted to float32. A vectorized energy VAD finds the speech regions once
+# per file, and transcription receives speech-only chunks of at most
+# ASR_CHUNK_SECONDS, so peak memory depends on the chunk size, not on the
+# length of the session. Other formats are transcoded to a temporary WAV with
+# ffmpeg first.
+
+FRAME_SECONDS = 0.03
+# Same thresholds as the streaming VAD: speech is at least VAD_MARGIN_DB above
+# the background level and never quieter than VAD_MIN_DB.
+VAD_MARGIN_DB = 10.0
+VAD_MIN_DB = -50.0
+# The offline background level is a low percentile of all frames, which is
+# speech itself when a recording has no pauses; never demand more than this.
+VAD_MAX_THRESHOLD_DB = -35.0
+# Pauses up to this long stay inside one ASR chunk (Whisper uses the context).
+MAX_GAP_IN_CHUNK_SECONDS = 2.0
+
+_WAVE_FORMAT_PCM = 1
+_WAVE_FORMAT_IEEE_FLOAT = 3
+_WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+# (format, bits) -> (dtype, scale, bias): float = (sample - bias) * scale
+_SAMPLE_FORMATS = {
+    (_WAVE_FORMAT_PCM, 8): ("u1", 1.0 / 128.0, 128.0),
+    (_WAVE_FORMAT_PCM, 16): ("<i2", 1.0 / 32768.0, 0.0),
+    (_WAVE_FORMAT_PCM, 32): ("<i4", 1.0 / 2147483648.0, 0.0),
+    (_WAVE_FORMAT_IEEE_FLOAT, 32): ("<f4", 1.0, 0.0),
+    (_WAVE_FORMAT_IEEE_FLOAT, 64): ("<f8", 1.0, 0.0),
+}
+RAW_PCM_EXTENSIONS = (".pcm", ".raw")
+
+
+def _parse_wav_header(path: str) -> Tuple[int, int, int, int, int, int]:
+    """
+    Returns (format, channels, sample_rate, bits, data_offset, data_bytes) of a RIFF/WAVE file.
+    """
+    with open(path, "rb") as handle:
+        riff = handle.read(12)
+        if len(riff) < 12 or riff[:4] not in (b"RIFF", b"RF64") or riff[8:12] != b"WAVE":
+            raise ValueError(f"'{path}' is not a WAV file.")
+        fmt = None
+        while True:
+            header = handle.read(8)
+            if len(header) < 8:
+                raise ValueError(f"'{path}' has no audio data.")
+            chunk_id, size = header[:4], struct.unpack("<I", header[4:])[0]
+            if chunk_id == b"fmt ":
+                body = handle.read(size + (size & 1))
+                format_tag, channels, sample_rate = struct.unpack("<HHI", body[:8])
+                bits = struct.unpack("<H", body[14:16])[0]
+                if format_tag == _WAVE_FORMAT_EXTENSIBLE and len(body) >= 26:
+                    format_tag = struct.unpack("<H", body[24:26])[0]
+                fmt = (format_tag, channels, sample_rate, bits)
+            elif chunk_id == b"data":
+                if fmt is None:
+                    raise ValueError(f"'{path}' has audio data before its format chunk.")
+                offset = handle.tell()
+                # Streamed/RF64 files often carry a placeholder size; trust the file length.
+                data_bytes = min(size, os.path.getsize(path) - offset)
+                return fmt + (offset, data_bytes)
+            else:
+                handle.seek(size + (size & 1), os.SEEK_CUR)
+
+
+def _transcode_to_wav(path: str) -> str:
+    """
+    Decodes any ffmpeg-readable file to a temporary 16 kHz mono 16-bit WAV.
+    """
+    if shutil.which("ffmpeg") is None:
+        raise ValueError(f"Cannot decode '{path}' without ffmpeg; only WAV and raw PCM are supported.")
+    directory = os.path.dirname(settings.data_path("audio_tmp", "x"))
+    handle, target = tempfile.mkstemp(suffix=".wav", dir=directory)
+    os.close(handle)
+    try:
+        subprocess.run(
+            ["ffmpeg", "-nostdin", "-v", "error", "-y", "-i", path,
+             "-ac", "1", "-ar", str(SAMPLE_RATE), "-c:a", "pcm_s16le", target],
+            check=True, capture_output=True,
+        )
+    except subprocess.CalledProcessError as error:
+        os.remove(target)
+        raise ValueError(f"ffmpeg could not decode '{path}': {error.stderr.decode(errors='replace')[-500:]}")
+    return target
+
+
+def _wrap_pcm_as_wav(path: str) -> str:
+    """
+    Copies raw 16 kHz mono 16-bit PCM behind a WAV header into a temporary
+    file, block by block, for libraries that only read audio files.
+    """
+    data_bytes = os.path.getsize(path) & ~1
+    header = (b"RIFF" + struct.pack("<I", 36 + data_bytes) + b"WAVE"
+              + b"fmt " + struct.pack("<IHHIIHH", 16, _WAVE_FORMAT_PCM, 1, SAMPLE_RATE, 2 * SAMPLE_RATE, 2, 16)
+              + b"data" + struct.pack("<I", data_bytes))
+    directory = os.path.dirname(settings.data_path("audio_tmp", "x"))
+    handle, target = tempfile.mkstemp(suffix=".wav", dir=directory)
+    try:
+        with os.fdopen(handle, "wb") as output, open(path, "rb") as source:
+            output.write(header)
+            remaining = data_bytes
+            while remaining:
+                block = source.read(min(remaining, 1 << 20))
+                if not block:
+                    break
+                output.write(block)
+                remaining -= len(block)
+    except BaseException:
+        os.remove(target)
+        raise
+    return target
+
+
+class AudioSource:
+    """
+    A memory-mapped recording. `samples` is a (frames, channels) view of the
+    file's raw samples; nothing is read until it is sliced.
+    """
+
+    def __init__(self, path: str, samples: np.ndarray, sample_rate: int, scale: float, bias: float,
+                 temporary_path: Optional[str] = None):
+        self.path = path
+        self.samples = samples
+        self.sample_rate = sample_rate
+        self.scale = scale
+        self.bias = bias
+        self._temporary_path = temporary_path
+        self._regions: Optional[np.ndarray] = None
+        self._digest: Optional[str] = None
+
+    @property
+    def num_frames(self) -> int:
+        return self.samples.shape[0]
+
+    @property
+    def channels(self) -> int:
+        return self.samples.shape[1]
+
+    @property
+    def duration(self) -> float:
+        return self.num_frames / self.sample_rate
+
+    @property
+    def readable_path(self) -> str:
+        """
+        A WAV file with this audio, for libraries that read files themselves.
+        Raw PCM is given a WAV header in a temporary copy on first use.
+        """
+        if self._temporary_path is None and self.path.lower().endswith(RAW_PCM_EXTENSIONS):
+            self._temporary_path = _wrap_pcm_as_wav(self.path)
+        return self._temporary_path or self.path
+
+    # --- Reading ---
+
+    def blocks(self, block_frames: int, start: int = 0, end: Optional[int] = None) -> Iterator[Tuple[int, np.ndarray]]:
+        """
+        Yields (first_frame, view) over the raw samples without copying.
+        """
+        end = self.num_frames if end is None else min(end, self.num_frames)
+        for first in range(start, end, block_frames):
+            yield first, self.samples[first:min(first + block_frames, end)]
+
+    def to_float(self, raw: np.ndarray) -> np.ndarray:
+        """
+        Converts a block of raw samples to mono float32 in [-1, 1) at the file's rate.
+        """
+        mono = raw[:, 0] if raw.shape[1] == 1 else raw.mean(axis=1, dtype=np.float32)
+        audio = mono.astype(np.float32)
+        if self.bias:
+            audio -= self.bias
+        if self.scale != 1.0:
+            audio *= self.scale
+        return audio
+
+    def read(self, start_seconds: float, end_seconds: float) -> np.ndarray:
+        """
+        16 kHz mono float32 audio for one time range.
+        """
+        start = max(0, int(start_seconds * self.sample_rate))
+        end = min(self.num_frames, int(np.ceil(end_seconds * self.sample_rate)))
+        return _resample(self.to_float(self.samples[start:end]), self.sample_rate)
+
+    def digest(self) -> str:
+        """
+        Content hash of the audio data, computed block by block.
+        """
+        if self._digest is None:
+            hasher = hashlib.blake2b(digest_size=32)
+            hasher.update(f"{self.samples.dtype.str}{self.channels}/{self.sample_rate}".encode())
+            block_frames = max(1, (8 * 1024 * 1024) // max(1, self.samples.strides[0]))
+            for _, raw in self.blocks(block_frames):
+                hasher.update(memoryview(np.ascontiguousarray(raw)).cast("B"))
+            self._digest = hasher.hexdigest()
+        return self._digest
+
+    # --- Voice Activity ---
+
+    def frame_energies_db(self, frame_seconds: float = FRAME_SECONDS) -> np.ndarray:
+        """
+        Energy of every frame in dB, computed in vectorized blocks.
+        """
+        frame = max(1, int(frame_seconds * self.sample_rate))
+        count = self.num_frames // frame
+        energies = np.empty(count, dtype=np.float32)
+        frames_per_block = max(1, int(settings.AUDIO_BLOCK_SECONDS / frame_seconds))
+        for first, raw in self.blocks(frames_per_block * frame, end=count * frame):
+            audio = self.to_float(raw).reshape(-1, frame)
+            power = np.einsum("ij,ij->i", audio, audio) / frame
+            index = first // frame
+            energies[index:index + power.size] = 10.0 * np.log10(power + 1e-10)
+        return energies
+
+    def speech_regions(self) -> np.ndarray:
+        """
+        Speech regions as an (n, 2) array of start/end seconds. Computed once per source.
+        """
+        if self._regions is None:
+            frame_seconds = max(1, int(FRAME_SECONDS * self.sample_rate)) / self.sample_rate
+            self._regions = detect_speech(
+                self.frame_energies_db(),
+                frame_seconds,
+                min_speech_seconds=settings.VAD_MIN_SPEECH_SECONDS,
+                min_silence_seconds=settings.VAD_MIN_SILENCE_SECONDS,
+                pad_seconds=settings.VAD_PAD_SECONDS,
+            )
+        return self._regions
+
+    def speech_chunks(self, max_chunk_seconds: Optional[float] = None) -> Iterator[Tuple[float, np.ndarray]]:
+        """
+        Yields (offset_seconds, 16 kHz float32 audio) for speech-only chunks.
+        Only one chunk is in memory at a time.
+        """
+        for start, end in chunk_regions(self.speech_regions(), max_chunk_seconds or settings.ASR_CHUNK_SECONDS):
+            yield start, self.read(start, end)
+
+    def speech_seconds(self) -> float:
+        regions = self.speech_regions()
+        return float(np.sum(regions[:, 1] - regions[:, 0])) if regions.size else 0.0
+
+    # --- Lifetime ---
+
+    def close(self):
+        self.samples = np.zeros((0, self.channels), dtype=self.samples.dtype) # Drops the mapping
+        if self._temporary_path and os.path.exists(self._temporary_path):
+            try:
+                os.remove(self._temporary_path)
+            except OSError:
+                pass # Still mapped by a view somewhere (Windows); the OS temp cleanup gets it
+        self._temporary_path = None
+
+    def __enter__(self) -> "AudioSource":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def segmentation_id() -> str:
+    """
+    Identifies the VAD/chunking configuration, for result caching.
+    """
+    return (f"vad-{VAD_MARGIN_DB}-{VAD_MIN_DB}-{VAD_MAX_THRESHOLD_DB}-{settings.VAD_MIN_SPEECH_SECONDS}-"
+            f"{settings.VAD_MIN_SILENCE_SECONDS}-{settings.VAD_PAD_SECONDS}/chunk-{settings.ASR_CHUNK_SECONDS}")
+
+
+def open_audio(audio_ref: Optional[str]) -> Optional[AudioSource]:
+    """
+    Opens a recording for streaming reads. Returns None when the reference is
+    not a readable file (e.g. the simulated references the backend sends today).
+    Raw .pcm/.raw files are read as 16 kHz mono 16-bit little-endian PCM.
+    """
+    if not audio_ref or not os.path.isfile(audio_ref):
+        return None
+    if audio_ref.lower().endswith(RAW_PCM_EXTENSIONS):
+        samples = np.memmap(audio_ref, dtype="<i2", mode="r")
+        return AudioSource(audio_ref, samples.reshape(-1, 1), SAMPLE_RATE, 1.0 / 32768.0, 0.0)
+    temporary_path = None
+    path = audio_ref
+    try:
+        header = _parse_wav_header(path)
+    except ValueError:
+        header = None
+    if header is None or (header[0], header[3]) not in _SAMPLE_FORMATS:
+        temporary_path = path = _transcode_to_wav(audio_ref)
+        header = _parse_wav_header(path)
+    format_tag, channels, sample_rate, bits, offset, data_bytes = header
+    dtype, scale, bias = _SAMPLE_FORMATS[(format_tag, bits)]
+    frame_bytes = channels * np.dtype(dtype).itemsize
+    num_frames = data_bytes // frame_bytes
+    if num_frames == 0:
+        samples = np.zeros((0, channels), dtype=dtype)
+    else:
+        samples = np.memmap(path, dtype=dtype, mode="r", offset=offset, shape=(num_frames, channels))
+    return AudioSource(audio_ref, samples, sample_rate, scale, bias, temporary_path=temporary_path)
+
+
+def detect_speech(energies_db: np.ndarray, frame_seconds: float, min_speech_seconds: float = 0.25,
+                  min_silence_seconds: float = 0.5, pad_seconds: float = 0.2) -> np.ndarray:
+    """
+    Speech regions (an (n, 2) array of start/end seconds) from per-frame energies.
+    Pauses shorter than min_silence_seconds are bridged, regions shorter than
+    min_speech_seconds are dropped, and regions are padded on both sides.
+    """
+    if energies_db.size == 0:
+        return np.zeros((0, 2))
+    noise_db = float(np.percentile(energies_db, 10))
+    voiced = energies_db > min(max(noise_db + VAD_MARGIN_DB, VAD_MIN_DB), VAD_MAX_THRESHOLD_DB)
+    edges = np.diff(np.concatenate(([0], voiced.astype(np.int8), [0])))
+    starts, ends = np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)
+    if starts.size == 0:
+        return np.zeros((0, 2))
+    keep = (starts[1:] - ends[:-1]) * frame_seconds >= min_silence_seconds
+    starts = np.concatenate((starts[:1], starts[1:][keep]))
+    ends = np.concatenate((ends[:-1][keep], ends[-1:]))
+    long_enough = (ends - starts) * frame_seconds >= min_speech_seconds
+    starts, ends = starts[long_enough], ends[long_enough]
+    # Half the minimum pause at most, so padded regions never overlap.
+    pad = min(pad_seconds, min_silence_seconds / 2.0)
+    duration = energies_db.size * frame_seconds
+    return np.stack((np.maximum(starts * frame_seconds - pad, 0.0),
+                     np.minimum(ends * frame_seconds + pad, duration)), axis=1)
+
+
+def chunk_regions(regions: np.ndarray, max_chunk_seconds: float) -> List[Tuple[float, float]]:
+    """
+    Packs speech regions into ASR chunks of at most max_chunk_seconds. Short
+    pauses stay inside a chunk; longer regions are split.
+    """
+    chunks: List[Tuple[float, float]] = []
+    for start, end in regions:
+        start, end = float(start), float(end)
+        if chunks and end - chunks[-1][0] <= max_chunk_seconds and start - chunks[-1][1] <= MAX_GAP_IN_CHUNK_SECONDS:
+            chunks[-1] = (chunks[-1][0], end)
+            continue
+        while end - start > max_chunk_seconds:
+            chunks.append((start, start + max_chunk_seconds))
+            start += max_chunk_seconds
+        chunks.append((start, end))
+    return chunks
+
+
+def overlaps_speech(regions: np.ndarray, starts: np.ndarray, ends: np.ndarray) -> np.ndarray:
+    """
+    For each interval, whether it overlaps any speech region (regions must be sorted).
+    """
+    if regions.size == 0:
+        return np.zeros(len(starts), dtype=bool)
+    # First region that ends after each interval starts; it overlaps if it also starts before the interval ends.
+    index = np.searchsorted(regions[:, 1], starts, side="right")
+    inside = index < len(regions)
+    result = np.zeros(len(starts), dtype=bool)
+    result[inside] = regions[index[inside], 0] < ends[inside]
+    return result
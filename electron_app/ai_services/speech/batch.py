@@ -0,0 +1,375 @@
+"""
+Batch (offline) transcription of audio archives.
+
+Files are sharded across a pool of worker processes, each capped to a few
+math-library threads so the pool as a whole uses every core without
+oversubscribing it. Results stream to a JSONL file, one line per file, as soon
+as each file is done; re-running with the same output file skips files that
+already succeeded, so an interrupted backlog resumes where it stopped.
+
+Run from the electron_app directory:
+
+    python -m ai_services.speech.batch /path/to/archive --output transcripts.jsonl
+
+The source is a directory (searched recursively for audio files) or a manifest:
+a text file with one path per line, or a JSONL file whose lines have "path"
+(or "audio_path") and optionally "id". Relative manifest paths are resolved
+against the manifest's directory.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from typing import Callable, Dict, List, Optional, Set
+
+from fastapi import APIRouter, Body, HTTPException
+from pydantic import BaseModel
+
+from .. import settings
+from ..metrics import TracedRoute, metrics
+from ..execution import PoolSaturated
+from ..workers import limit_threads, lower_priority
+
+AUDIO_EXTENSIONS = (".wav", ".mp3", ".m4a", ".flac", ".ogg", ".opus", ".webm", ".aac")
+
+# --- Pydantic Models ---
+
+class BatchTranscriptionRequest(BaseModel):
+    source: str # Directory of audio files, or a .txt/.jsonl manifest
+    output_path: Optional[str] = None # JSONL results; defaults to the data directory
+    workers: Optional[int] = None # Defaults to AI_BATCH_MAX_WORKERS
+    threads_per_worker: Optional[int] = None # Defaults to AI_BATCH_THREADS_PER_WORKER
+    resume: bool = True # Skip files that already succeeded in output_path
+
+class BatchTranscriptionStatus(BaseModel):
+    job_id: str
+    status: str # "running", "completed", "cancelled", "failed"
+    source: str
+    output_path: str
+    workers: int
+    threads_per_worker: int
+    total: int # Files in the source
+    skipped: int # Already transcribed by an earlier run
+    completed: int
+    failed: int
+    audio_seconds: float
+    processing_seconds: float # Summed over workers
+    wall_seconds: float
+    rtf: Optional[float] = None # processing_seconds / audio_seconds (per worker)
+    wall_rtf: Optional[float] = None # wall_seconds / audio_seconds (whole pool)
+    error: Optional[str] = None
+
+# --- Inputs and Outputs ---
+
+def discover_audio(source: str) -> List[Dict[str, str]]:
+    """
+    Lists the files to transcribe as {"id", "path"} items, in a stable order.
+    """
+    if os.path.isdir(source):
+        paths = []
+        for root, _, files in os.walk(source):
+            paths.extend(os.path.join(root, name) for name in files if name.lower().endswith(AUDIO_EXTENSIONS))
+        return [{"id": path, "path": path} for path in sorted(paths)]
+    if not os.path.isfile(source):
+        raise FileNotFoundError(f"Batch source '{source}' does not exist.")
+    base = os.path.dirname(os.path.abspath(source))
+    items = []
+    with open(source, encoding="utf-8") as handle:
+        for line in handle:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            if line.startswith("{"):
+                entry = json.loads(line)
+                path = entry.get("path") or entry.get("audio_path")
+                item_id = str(entry.get("id") or path)
+            else:
+                path = item_id = line
+            items.append({"id": item_id, "path": os.path.join(base, path)})
+    return items
+
+
+def completed_ids(output_path: str) -> Set[str]:
+    """
+    IDs that already have a successful result in an existing JSONL output.
+    """
+    done: Set[str] = set()
+    if not os.path.isfile(output_path):
+        return done
+    with open(output_path, encoding="utf-8") as handle:
+        for line in handle:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue # Line cut off by an interrupted run
+            if record.get("status") == "ok":
+                done.add(record["id"])
+    return done
+
+# --- Worker Process ---
+
+def _init_worker(num_threads: int, niceness: int = 0):
+    limit_threads(num_threads)
+    lower_priority(niceness)
+
+
+def transcribe_file(item: Dict[str, str]) -> Dict:
+    """
+    Worker entry point: transcribes one file and returns its JSONL record.
+    The ASR model is loaded once per worker process and reused.
+    """
+    from .audio_io import open_audio
+    from .transcription import transcribe_audio
+
+    record: Dict = {"id": item["id"], "path": item["path"]}
+    started = time.perf_counter()
+    try:
+        source = open_audio(item["path"])
+        if source is None:
+            raise FileNotFoundError(item["path"])
+        with source:
+            result = transcribe_audio(source)
+            audio_seconds, speech_seconds = source.duration, source.speech_seconds()
+    except Exception as error:
+        record.update(status="error", error=repr(error))
+        return record
+    processing_seconds = time.perf_counter() - started
+    record.update(
+        status="ok",
+        text=result.joined_text().strip(),
+        segments=result.to_dicts(),
+        audio_seconds=round(audio_seconds, 3),
+        speech_seconds=round(speech_seconds, 3),
+        processing_seconds=round(processing_seconds, 3),
+        rtf=round(processing_seconds / audio_seconds, 4) if audio_seconds else None,
+    )
+    return record
+
+# --- Batch Runner ---
+
+class BatchTranscription:
+    def __init__(self, source: str, output_path: str, workers: Optional[int] = None,
+                 threads_per_worker: Optional[int] = None, resume: bool = True, job_id: Optional[str] = None,
+                 niceness: int = 0):
+        self.job_id = job_id or str(uuid.uuid4())
+        self.source = source
+        self.output_path = output_path
+        self.workers = max(1, workers or settings.BATCH_MAX_WORKERS)
+        self.threads_per_worker = max(1, threads_per_worker or settings.BATCH_THREADS_PER_WORKER)
+        self.resume = resume
+        self.niceness = niceness # Worker process nice value (jobs started by the API run in the background)
+        self.status = "running"
+        self.error: Optional[str] = None
+        self.total = self.skipped = self.completed = self.failed = 0
+        self.audio_seconds = self.processing_seconds = 0.0
+        self._started = time.perf_counter()
+        self._finished: Optional[float] = None
+        self._cancel = threading.Event()
+
+    def cancel(self):
+        """
+        Stops handing out files; files already in a worker finish and are written.
+        """
+        self._cancel.set()
+
+    def run(self, on_result: Optional[Callable[[Dict], None]] = None) -> Dict:
+        try:
+            self._run(on_result)
+            self.status = "cancelled" if self._cancel.is_set() else "completed"
+        except Exception as error:
+            self.status, self.error = "failed", repr(error)
+            raise
+        finally:
+            self._finished = time.perf_counter()
+        return self.stats()
+
+    def _run(self, on_result: Optional[Callable[[Dict], None]]):
+        items = discover_audio(self.source)
+        self.total = len(items)
+        done = completed_ids(self.output_path) if self.resume else set()
+        pending = [item for item in items if item["id"] not in done]
+        self.skipped = self.total - len(pending)
+        if not pending:
+            return
+        directory = os.path.dirname(os.path.abspath(self.output_path))
+        os.makedirs(directory, exist_ok=True)
+        mode = "a" if self.resume else "w"
+        with open(self.output_path, mode, encoding="utf-8") as output, ProcessPoolExecutor(
+            max_workers=min(self.workers, len(pending)),
+            # spawn, not fork: workers must not inherit the server's threads and locks.
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(self.threads_per_worker, self.niceness),
+        ) as executor:
+            if mode == "a" and output.tell() and not self._ends_with_newline():
+                output.write("\n") # Terminate a line cut off by an interrupted run
+            queue = iter(pending)
+            in_flight: Set[Future] = set()
+            while True:
+                # Only a couple of files per worker are queued, so cancelling is
+                # quick and huge archives do not sit in the executor's queue.
+                while not self._cancel.is_set() and len(in_flight) < 2 * self.workers:
+                    item = next(queue, None)
+                    if item is None:
+                        break
+                    in_flight.add(executor.submit(transcribe_file, item))
+                if not in_flight:
+                    break
+                finished, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    record = future.result()
+                    output.write(json.dumps(record, ensure_ascii=False) + "\n")
+                    output.flush()
+                    self._record(record)
+                    if on_result is not None:
+                        on_result(record)
+
+    def _ends_with_newline(self) -> bool:
+        with open(self.output_path, "rb") as handle:
+            handle.seek(-1, os.SEEK_END)
+            return handle.read(1) == b"\n"
+
+    def _record(self, record: Dict):
+        if record["status"] != "ok":
+            self.failed += 1
+            return
+        self.completed += 1
+        self.audio_seconds += record["audio_seconds"]
+        self.processing_seconds += record["processing_seconds"]
+
+    def stats(self) -> Dict:
+        wall_seconds = (self._finished or time.perf_counter()) - self._started
+        return {
+            "job_id": self.job_id,
+            "status": self.status,
+            "source": self.source,
+            "output_path": self.output_path,
+            "workers": self.workers,
+            "threads_per_worker": self.threads_per_worker,
+            "total": self.total,
+            "skipped": self.skipped,
+            "completed": self.completed,
+            "failed": self.failed,
+            "audio_seconds": round(self.audio_seconds, 3),
+            "processing_seconds": round(self.processing_seconds, 3),
+            "wall_seconds": round(wall_seconds, 3),
+            "rtf": round(self.processing_seconds / self.audio_seconds, 4) if self.audio_seconds else None,
+            "wall_rtf": round(wall_seconds / self.audio_seconds, 4) if self.audio_seconds else None,
+            "error": self.error,
+        }
+
+# --- FastAPI Router ---
+router = APIRouter(route_class=TracedRoute)
+
+batch_jobs: Dict[str, BatchTranscription] = {}
+
+def on_shutdown():
+    # Workers finish their current file; the rest resumes on the next run.
+    for job in batch_jobs.values():
+        job.cancel()
+
+def _collect_metrics():
+    jobs = list(batch_jobs.values())
+    statuses: Dict[str, int] = {}
+    for job in jobs:
+        statuses[job.status] = statuses.get(job.status, 0) + 1
+    remaining = sum(job.total - job.skipped - job.completed - job.failed for job in jobs if job.status == "running")
+    return [
+        ("ai_batch_transcription_jobs", "gauge", "Batch transcription jobs by status.",
+         [({"status": status}, count) for status, count in statuses.items()]),
+        ("ai_queue_depth", "gauge", "Items waiting in a queue.", [({"queue": "batch_transcription"}, remaining)]),
+    ]
+
+metrics.register_collector(_collect_metrics)
+
+def _run_in_background(job: BatchTranscription):
+    try:
+        summary = job.run()
+        print(f"AI Service (Speech Batch): Job {job.job_id} {summary['status']}: {summary['completed']} "
+              f"transcribed, {summary['failed']} failed, {summary['skipped']} skipped, RTF {summary['rtf']}")
+    except Exception as error:
+        print(f"AI Service (Speech Batch): Job {job.job_id} failed: {error!r}")
+
+@router.post("/batch_transcribe", response_model=BatchTranscriptionStatus)
+async def start_batch_transcription(
+    request: BatchTranscriptionRequest = Body(...)
+):
+    """
+    Starts transcribing a directory or manifest of audio files in a worker pool.
+    Poll /batch_transcribe/{job_id} for progress; results stream to output_path.
+    """
+    if not os.path.exists(request.source):
+        raise HTTPException(status_code=400, detail=f"Batch source '{request.source}' does not exist.")
+    job_id = str(uuid.uuid4())
+    output_path = request.output_path or settings.data_path("batch_transcripts", f"{job_id}.jsonl")
+    running = [job for job in batch_jobs.values()
+               if job.status == "running" and os.path.abspath(job.output_path) == os.path.abspath(output_path)]
+    if running:
+        raise HTTPException(status_code=409, detail=f"Job {running[0].job_id} is already writing to '{output_path}'.")
+    if sum(job.status == "running" for job in batch_jobs.values()) >= settings.BATCH_MAX_RUNNING_JOBS:
+        # Each job has its own worker processes; more jobs at once would oversubscribe the CPU.
+        raise PoolSaturated("batch transcription", retry_after=60)
+    job = BatchTranscription(request.source, output_path, request.workers, request.threads_per_worker,
+                             request.resume, job_id=job_id, niceness=settings.BACKGROUND_WORKER_NICE)
+    batch_jobs[job_id] = job
+    threading.Thread(target=_run_in_background, args=(job,), name=f"batch-{job_id}", daemon=True).start()
+    print(f"AI Service (Speech Batch): Started job {job_id} for '{request.source}' "
+          f"({job.workers} workers x {job.threads_per_worker} threads)")
+    return job.stats()
+
+@router.get("/batch_transcribe", response_model=List[BatchTranscriptionStatus])
+async def list_batch_transcriptions():
+    return [job.stats() for job in batch_jobs.values()]
+
+@router.get("/batch_transcribe/{job_id}", response_model=BatchTranscriptionStatus)
+async def get_batch_transcription(job_id: str):
+    job = batch_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Batch job {job_id} not found.")
+    return job.stats()
+
+@router.post("/batch_transcribe/{job_id}/cancel", response_model=BatchTranscriptionStatus)
+async def cancel_batch_transcription(job_id: str):
+    job = batch_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Batch job {job_id} not found.")
+    job.cancel()
+    return job.stats()
+
+# --- Command Line ---
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("source", help="Directory of audio files, or a .txt/.jsonl manifest.")
+    parser.add_argument("--output", required=True, help="JSONL file to write (appended to when resuming).")
+    parser.add_argument("--workers", type=int, default=None,
+                        help=f"Worker processes (default {settings.BATCH_MAX_WORKERS}).")
+    parser.add_argument("--threads-per-worker", type=int, default=None,
+                        help=f"Math-library threads per worker (default {settings.BATCH_THREADS_PER_WORKER}).")
+    parser.add_argument("--no-resume", action="store_true", help="Start over instead of skipping finished files.")
+    args = parser.parse_args(argv)
+
+    job = BatchTranscription(args.source, args.output, args.workers, args.threads_per_worker,
+                             resume=not args.no_resume)
+
+    def report(record: Dict):
+        done = job.completed + job.failed
+        detail = f"RTF {record['rtf']}" if record["status"] == "ok" else record["error"]
+        print(f"[{done}/{job.total - job.skipped}] {record['status']} {record['id']} ({detail})", file=sys.stderr)
+
+    try:
+        summary = job.run(on_result=report)
+    except KeyboardInterrupt:
+        job.status = "cancelled"
+        summary = job.stats()
+    print(json.dumps(summary, indent=2))
+    return 0 if job.failed == 0 and summary["status"] == "completed" else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
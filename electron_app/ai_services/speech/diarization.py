@@ -0,0 +1,65 @@
+import functools
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from .. import settings
+from ..model_registry import registry
+from ..result_cache import package_version
+from .audio_io import AudioSource, overlaps_speech
+
+# --- Speaker Diarization Backend ---
+# The pyannote pipeline lives in the shared model registry under "diarization".
+# diarize_source() returns None when pyannote.audio is not installed so callers
+# can fall back to their placeholder behaviour.
+
+DIARIZATION_MODEL_KEY = "diarization"
+
+
+def _load_diarization_pipeline():
+    from pyannote.audio import Pipeline
+    print(f"AI Service (Speech Diarization): Loading pipeline '{settings.DIARIZATION_MODEL}'")
+    return Pipeline.from_pretrained(settings.DIARIZATION_MODEL, use_auth_token=settings.HF_TOKEN)
+
+
+registry.register(DIARIZATION_MODEL_KEY, _load_diarization_pipeline, capability="speech")
+
+
+@functools.lru_cache(maxsize=None)
+def pyannote_available() -> bool:
+    try:
+        import pyannote.audio  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def diarization_model_id() -> str:
+    """
+    Identifies the diarization pipeline for result caching.
+    """
+    if not pyannote_available():
+        return "placeholder"
+    return f"pyannote.audio-{package_version('pyannote.audio')}/{settings.DIARIZATION_MODEL}"
+
+
+def diarize_source(source: AudioSource, num_speakers: Optional[int] = None) -> Optional[List[Dict]]:
+    """
+    Diarizes a recording into speaker turns (speaker, start_time, end_time),
+    keeping only turns that overlap detected speech. Returns None without pyannote.
+    pyannote reads WAV files itself in sliding windows (raw PCM gets a WAV
+    header first), so the recording is never loaded whole.
+    """
+    if not pyannote_available():
+        return None
+    with registry.use(DIARIZATION_MODEL_KEY) as pipeline:
+        annotation = pipeline({"audio": source.readable_path}, num_speakers=num_speakers)
+    turns = [(turn.start, turn.end, speaker) for turn, _, speaker in annotation.itertracks(yield_label=True)]
+    if not turns:
+        return []
+    starts, ends = np.array([t[0] for t in turns]), np.array([t[1] for t in turns])
+    keep = overlaps_speech(source.speech_regions(), starts, ends)
+    return [
+        {"speaker": speaker, "start_time": round(start, 3), "end_time": round(end, 3)}
+        for (start, end, speaker), kept in zip(turns, keep) if kept
+    ]
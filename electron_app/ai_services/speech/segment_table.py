@@ -0,0 +1,113 @@
+from typing import Any, Dict, Iterable, List, Optional
+
+import numpy as np
+
+# --- Segment Table ---
+# A one-hour session has tens of thousands of (word-level) segments. As dicts
+# or Pydantic models every segment is a handful of Python objects, validated
+# and serialized field by field. A SegmentTable keeps them as columns instead:
+#   start, end          float64 seconds
+#   speaker             int16 ids into `speakers` (-1 for none)
+#   text                int32 ids into `texts`, an interned text table (short
+#                       segments such as words repeat a lot); absent for
+#                       speaker turns, which have no text
+#   overlap_offsets,    overlapping speakers of aligned segments: the ids of
+#   overlap_speakers    row i are overlap_speakers[offsets[i]:offsets[i + 1]]
+# Responses encode the columns directly (see ai_services/encoding.py); rows
+# are only materialized for JSON clients and for code that still takes dicts.
+
+
+class SegmentTable:
+    def __init__(self, start: np.ndarray, end: np.ndarray, speaker: np.ndarray, speakers: List[str],
+                 text: Optional[np.ndarray] = None, texts: Optional[List[str]] = None,
+                 overlap_offsets: Optional[np.ndarray] = None, overlap_speakers: Optional[np.ndarray] = None):
+        self.start = start
+        self.end = end
+        self.speaker = speaker
+        self.speakers = speakers
+        self.text = text
+        self.texts = texts if texts is not None else []
+        self.overlap_offsets = overlap_offsets
+        self.overlap_speakers = overlap_speakers
+
+    @classmethod
+    def from_dicts(cls, rows: Iterable[Dict[str, Any]], with_text: bool = True,
+                   with_overlaps: bool = False) -> "SegmentTable":
+        """
+        Builds a table from segment dicts (text, start_time, end_time, speaker
+        and, with_overlaps, overlapping_speakers).
+        """
+        rows = list(rows)
+        speaker_ids: Dict[Optional[str], int] = {None: -1}
+        text_ids: Dict[str, int] = {}
+
+        def speaker_id(name: Optional[str]) -> int:
+            return speaker_ids.setdefault(name, len(speaker_ids) - 1)
+
+        start = np.fromiter((row["start_time"] for row in rows), dtype=np.float64, count=len(rows))
+        end = np.fromiter((row["end_time"] for row in rows), dtype=np.float64, count=len(rows))
+        speaker = np.fromiter((speaker_id(row.get("speaker")) for row in rows), dtype=np.int16, count=len(rows))
+        text = None
+        if with_text:
+            text = np.fromiter((text_ids.setdefault(row["text"], len(text_ids)) for row in rows),
+                               dtype=np.int32, count=len(rows))
+        overlap_offsets = overlap_speakers = None
+        if with_overlaps:
+            heard = [[speaker_id(name) for name in row.get("overlapping_speakers") or ()] for row in rows]
+            overlap_offsets = np.zeros(len(rows) + 1, dtype=np.int32)
+            np.cumsum([len(ids) for ids in heard], out=overlap_offsets[1:])
+            overlap_speakers = np.fromiter((id_ for ids in heard for id_ in ids), dtype=np.int16,
+                                           count=int(overlap_offsets[-1]))
+        speakers = [name for name in speaker_ids if name is not None]
+        return cls(start, end, speaker, speakers, text, list(text_ids) if with_text else None,
+                   overlap_offsets, overlap_speakers)
+
+    def __len__(self) -> int:
+        return int(self.start.shape[0])
+
+    @property
+    def nbytes(self) -> int:
+        """
+        Approximate memory footprint, including the string tables.
+        """
+        arrays = (self.start, self.end, self.speaker, self.text, self.overlap_offsets, self.overlap_speakers)
+        strings = sum(len(value.encode("utf-8")) + 49 for value in self.speakers + self.texts)
+        return sum(array.nbytes for array in arrays if array is not None) + strings
+
+    def joined_text(self) -> str:
+        if self.text is None:
+            return ""
+        texts = self.texts
+        return "".join(texts[id_] for id_ in self.text.tolist())
+
+    def to_dicts(self) -> List[Dict[str, Any]]:
+        """
+        Rows in the field order of the Pydantic models they replace:
+        TranscriptionSegmentDetail / AlignedSegment with text, DiarizationSegment without.
+        """
+        names = self.speakers + [None]  # id -1 picks the trailing None
+        starts, ends = self.start.tolist(), self.end.tolist()
+        speakers = [names[id_] for id_ in self.speaker.tolist()]
+        if self.text is None:
+            return [{"speaker": speaker, "start_time": start, "end_time": end}
+                    for speaker, start, end in zip(speakers, starts, ends)]
+        texts = [self.texts[id_] for id_ in self.text.tolist()]
+        rows = [{"text": text, "start_time": start, "end_time": end, "speaker": speaker}
+                for text, start, end, speaker in zip(texts, starts, ends, speakers)]
+        if self.overlap_offsets is not None:
+            offsets, heard = self.overlap_offsets.tolist(), [names[id_] for id_ in self.overlap_speakers.tolist()]
+            for index, row in enumerate(rows):
+                row["overlapping_speakers"] = heard[offsets[index]:offsets[index + 1]]
+        return rows
+
+    def columns(self) -> Dict[str, Any]:
+        """
+        The table as named columns (arrays, and lists for the string tables).
+        """
+        columns: Dict[str, Any] = {"start_time": self.start, "end_time": self.end,
+                                   "speaker": self.speaker, "speakers": self.speakers}
+        if self.text is not None:
+            columns.update(text=self.text, texts=self.texts)
+        if self.overlap_offsets is not None:
+            columns.update(overlap_offsets=self.overlap_offsets, overlap_speakers=self.overlap_speakers)
+        return columns
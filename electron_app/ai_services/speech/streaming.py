@@ -0,0 +1,138 @@
+from typing import Optional, Tuple
+
+import numpy as np
+
+from .asr import SAMPLE_RATE, pcm16_to_float32
+from .audio_io import FRAME_SECONDS, VAD_MARGIN_DB, VAD_MIN_DB
+
+# --- Streaming Transcription Session ---
+# A session receives raw PCM, gates it with an energy VAD and keeps only the
+# current utterance (plus a short pre-roll) in a fixed-size buffer, so memory
+# per session is bounded by max_utterance_seconds. next_action() tells the
+# caller when to decode a partial hypothesis or finalize the utterance.
+
+PREROLL_SECONDS = 0.3
+
+PARTIAL = "partial"
+FINAL = "final"
+
+
+class StreamingSession:
+    def __init__(
+        self,
+        max_utterance_seconds: float = 15.0,
+        partial_interval_seconds: float = 0.5,
+        end_silence_seconds: float = 0.6,
+        sample_rate: int = SAMPLE_RATE,
+    ):
+        self.sample_rate = sample_rate
+        self.frame_samples = int(FRAME_SECONDS * sample_rate)
+        self.base_partial_interval = partial_interval_seconds
+        self.partial_interval = partial_interval_seconds
+        self._end_silence_frames = max(1, int(end_silence_seconds / FRAME_SECONDS))
+        self._preroll_samples = int(PREROLL_SECONDS * sample_rate)
+        self._buffer = np.zeros(int(max_utterance_seconds * sample_rate), dtype=np.float32)
+        self._length = 0
+        self._pending = np.zeros(0, dtype=np.float32)
+        self._odd_byte = b""  # half a sample left over from the last message
+        self._consumed = 0  # samples taken from the stream so far
+        self._in_speech = False
+        self._silence_frames = 0
+        self._since_partial = 0
+        self._noise_db = -60.0
+
+    # --- Input ---
+
+    def push_audio(self, pcm: bytes):
+        """
+        Queues little-endian 16-bit mono PCM. Call next_action() until it returns None.
+        Messages need not be sample-aligned: a trailing odd byte is kept for the next one.
+        """
+        if self._odd_byte:
+            pcm = self._odd_byte + pcm
+        whole = len(pcm) - len(pcm) % 2
+        self._odd_byte = pcm[whole:]
+        if whole:
+            self._pending = np.concatenate([self._pending, pcm16_to_float32(pcm[:whole])])
+
+    def next_action(self) -> Optional[str]:
+        """
+        Consumes queued frames until a decode is due. Returns PARTIAL, FINAL or None.
+        """
+        offset = 0
+        action = None
+        while action is None and offset + self.frame_samples <= self._pending.size:
+            frame = self._pending[offset:offset + self.frame_samples]
+            offset += self.frame_samples
+            action = self._consume_frame(frame)
+        self._pending = self._pending[offset:]
+        return action
+
+    def flush(self) -> Optional[str]:
+        """
+        Ends the stream. Returns FINAL if an utterance is still open.
+        """
+        self._pending = np.zeros(0, dtype=np.float32)
+        self._odd_byte = b""
+        return FINAL if self._in_speech else None
+
+    # --- Decode bookkeeping ---
+
+    def utterance(self) -> Tuple[np.ndarray, float]:
+        """
+        Returns a copy of the buffered utterance audio and its start time in the stream.
+        """
+        start = (self._consumed - self._length) / self.sample_rate
+        return self._buffer[:self._length].copy(), start
+
+    def mark_partial(self, decode_seconds: float):
+        # Never schedule partials faster than we can decode them.
+        self.partial_interval = max(self.base_partial_interval, 2.0 * decode_seconds)
+        self._since_partial = 0
+
+    def finish_utterance(self):
+        self._length = 0
+        self._in_speech = False
+        self._silence_frames = 0
+        self._since_partial = 0
+        self.partial_interval = self.base_partial_interval
+
+    # --- VAD ---
+
+    def _is_speech(self, frame: np.ndarray) -> bool:
+        energy_db = 10.0 * np.log10(float(np.mean(frame * frame)) + 1e-10)
+        speech = energy_db > max(self._noise_db + VAD_MARGIN_DB, VAD_MIN_DB)
+        if not speech:
+            # Track the background level slowly so the threshold adapts to the room.
+            self._noise_db = 0.95 * self._noise_db + 0.05 * energy_db
+        return speech
+
+    def _append(self, frame: np.ndarray):
+        self._buffer[self._length:self._length + frame.size] = frame
+        self._length += frame.size
+        self._consumed += frame.size
+
+    def _consume_frame(self, frame: np.ndarray) -> Optional[str]:
+        speech = self._is_speech(frame)
+        if not self._in_speech:
+            if self._length + frame.size > self._preroll_samples:
+                keep = self._preroll_samples - frame.size
+                self._buffer[:keep] = self._buffer[self._length - keep:self._length]
+                self._length = keep
+            self._append(frame)
+            if speech:
+                self._in_speech = True
+                self._silence_frames = 0
+                self._since_partial = 0
+            return None
+
+        self._append(frame)
+        self._since_partial += frame.size
+        self._silence_frames = 0 if speech else self._silence_frames + 1
+        if self._silence_frames >= self._end_silence_frames:
+            return FINAL
+        if self._length + frame.size > self._buffer.size:
+            return FINAL
+        if self._since_partial >= self.partial_interval * self.sample_rate:
+            return PARTIAL
+        return None
@@ -1,6 +1,21 @@
-from fastapi import APIRouter, Body
+from fastapi import APIRouter, Body, Request, WebSocket, WebSocketDisconnect
 from pydantic import BaseModel
-from typing import List, Optional, Union
+from typing import Any, Dict, List, Optional, Union
+import asyncio
+import json
+import time
+
+from .. import settings
+from ..encoding import encoded, response_format
+from ..execution import PoolSaturated, Priority, speech_pool
+from ..metrics import TracedRoute, metrics, stage
+from ..result_cache import content_key, result_cache
+from .alignment import assign_speakers
+from .asr import SAMPLE_RATE, asr_model_id, transcribe_array
+from .audio_io import AudioSource, open_audio, segmentation_id
+from .diarization import diarization_model_id, diarize_source
+from .segment_table import SegmentTable
+from .streaming import FINAL, StreamingSession
 
 # --- Pydantic Models ---
 
@@ -17,7 +32,11 @@ class RealtimeTranscriptionResponse(BaseModel):
     # request_id: Optional[str] = None # For tracking specific requests if needed
 
 # --- FastAPI Router ---
-router = APIRouter()
+router = APIRouter(route_class=TracedRoute)
+
+stream_sessions = metrics.gauge("ai_stream_sessions", "Open streaming transcription sessions.")
+stream_decode = metrics.histogram(
+    "ai_stream_decode_seconds", "Streaming decode latency per utterance update.", ("kind",))
 
 # --- Dummy Data for Simulation ---
 dummy_interim_results = [
@@ -53,29 +72,98 @@ class DiarizationSegment(BaseModel):
 
 class DiarizationRequest(BaseModel):
     recording_id: Optional[int]
+    audio_data_ref: Optional[str] = None # Path to the recording's audio file
     # Could also accept transcription segments to align them
     # segments: Optional[List[TranscriptionSegmentDetail]] = None
     num_speakers: Optional[int] = None # Optional hint
 
 @router.post("/diarize", response_model=List[DiarizationSegment])
 async def diarize_placeholder(
+    http_request: Request,
     request_data: DiarizationRequest = Body(...)
 ):
     """
-    Placeholder for speaker diarization.
-    Accepts dummy audio data/ID or segments and returns a list of speaker segments.
+    Speaker diarization of the recording at audio_data_ref.
+    Returns a list of speaker segments (dummy segments for simulated references),
+    as JSON or, per the Accept header, msgpack or Arrow columns.
     """
     print(f"AI Service (Speech): Received diarization request for recording_id: {request_data.recording_id}")
+    return await speech_pool.run(encoded, response_format(http_request), with_audio, request_data.audio_data_ref,
+                                 diarize_audio, request_data.num_speakers)
+
+def with_audio(audio_ref: Optional[str], fn, *args):
+    """
+    Opens the recording at audio_ref (None for simulated references), calls
+    fn(source, *args) and closes it again.
+    """
+    with stage("decode"):
+        source = open_audio(audio_ref)
+    try:
+        return fn(source, *args)
+    finally:
+        if source is not None:
+            source.close()
+
+def diarize_audio(source: Optional[AudioSource], num_speakers: Optional[int] = None) -> SegmentTable:
+    """
+    Speaker turns for a recording. Falls back to dummy turns without audio or pyannote.
+    Results are cached by audio content, model and speaker hint.
+    """
+    turns = None
+    model_id = diarization_model_id()
+    if source is not None and model_id != "placeholder":
+        with stage("decode"):
+            key = content_key("diarization", model_id, source.digest(), segmentation_id(), num_speakers)
+        with stage("inference"):
+            turns = result_cache.cached("diarization", key, lambda: diarize_source(source, num_speakers))
+    if turns is not None:
+        return SegmentTable.from_dicts(turns, with_text=False)
+    # Dummy diarization response, aligned with the dummy transcription segments
+    return SegmentTable.from_dicts([
+        {"speaker": "SPEAKER_00", "start_time": 0.0, "end_time": 1.2}, # Corresponds to "Hello world,"
+        {"speaker": "SPEAKER_01", "start_time": 1.3, "end_time": 2.5}, # Corresponds to " this is a test."
+    ], with_text=False)
+
+
+
+# --- Alignment Models & Endpoint ---
+class WordTiming(BaseModel):
+    word: str
+    start_time: float
+    end_time: float
+
+class AlignmentSegment(TranscriptionSegmentDetail):
+    words: Optional[List[WordTiming]] = None # Word timings, if the recognizer produced them
+
+class AlignedSegment(TranscriptionSegmentDetail):
+    overlapping_speakers: List[str] = [] # Other speakers heard during this segment
+
+class AlignmentRequest(BaseModel):
+    segments: List[AlignmentSegment]
+    turns: List[DiarizationSegment]
+    split_on_speaker_change: bool = True # Split segments where the speaker changes mid-segment
+    fill_nearest: bool = True # Segments without overlapping turns take the nearest turn's speaker
+
+@router.post("/align", response_model=List[AlignedSegment])
+async def align_segments(
+    http_request: Request,
+    request: AlignmentRequest = Body(...)
+):
+    """
+    Assigns diarization speakers to transcript segments by maximum overlap,
+    splitting segments at speaker changes and listing overlapping speakers.
+    """
+    print(f"AI Service (Speech): Aligning {len(request.segments)} segments with {len(request.turns)} turns")
+    segments = [segment.model_dump() for segment in request.segments]
+    turns = [turn.model_dump() for turn in request.turns]
+    return await speech_pool.run(encoded, response_format(http_request), align_table, segments, turns,
+                                 request.split_on_speaker_change, request.fill_nearest, priority=Priority.INTERACTIVE)
 
-    # Dummy diarization response
-    # This should ideally align with the segments from transcription for a realistic simulation
-    dummy_diarization_results = [
-        DiarizationSegment(speaker="SPEAKER_00", start_time=0.0, end_time=1.2), # Corresponds to "Hello world,"
-        DiarizationSegment(speaker="SPEAKER_01", start_time=1.3, end_time=2.5), # Corresponds to " this is a test."
-        # Example of a third segment if needed for testing:
-        # DiarizationSegment(speaker="SPEAKER_00", start_time=2.8, end_time=4.0)
-    ]
-    return dummy_diarization_results
+def align_table(segments: List[Dict], turns: List[Dict], split_on_speaker_change: bool = True,
+                fill_nearest: bool = True) -> SegmentTable:
+    with stage("inference"):
+        aligned = assign_speakers(segments, turns, split_on_speaker_change, fill_nearest)
+    return SegmentTable.from_dicts(aligned, with_overlaps=True)
 
 
 # In a real scenario, you'd manage state for ongoing transcriptions
@@ -90,7 +178,7 @@ async def transcribe_realtime_placeholder(
   Placeholder for real-time transcription using WhisperX (simulated).
   Accepts dummy audio data/ID and returns a list of simulated interim/final results.
   For this placeholder, it will return all dummy results at once.
-  A true real-time endpoint might be a WebSocket or use long polling.
+  Live sessions should use the /transcribe_stream WebSocket instead.
   """
   print(f"AI Service (Speech): Received real-time transcription request for recording_id: {recording_id}")
 
@@ -99,36 +187,140 @@ async def transcribe_realtime_placeholder(
   # or the final part if the audio is considered complete.
   return dummy_interim_results
 
+@router.websocket("/transcribe_stream")
+async def transcribe_stream(websocket: WebSocket, recording_id: Optional[int] = None):
+    """
+    Streaming transcription over a WebSocket.
+    The client sends binary messages of 16 kHz mono 16-bit little-endian PCM and
+    a text message {"type": "stop"} when done; other or malformed text messages
+    are answered with an error message and otherwise ignored. The server pushes
+    RealtimeTranscriptionResponse JSON: partials (is_final=false) while someone
+    speaks and a final result when the utterance ends (VAD) or fills the window.
+    """
+    await websocket.accept()
+    print(f"AI Service (Speech): Streaming transcription opened for recording_id: {recording_id}")
+    loop = asyncio.get_running_loop()
+    session = StreamingSession(
+        max_utterance_seconds=settings.STREAM_MAX_UTTERANCE_SECONDS,
+        partial_interval_seconds=settings.STREAM_PARTIAL_INTERVAL_SECONDS,
+        end_silence_seconds=settings.STREAM_END_SILENCE_SECONDS,
+        sample_rate=SAMPLE_RATE,
+    )
+    last_partial_text = None
+
+    async def decode(action: str):
+        nonlocal last_partial_text
+        audio, offset = session.utterance()
+        started = time.perf_counter()
+        # Live captions go ahead of queued file transcriptions in the speech pool.
+        try:
+            segments = await speech_pool.run(transcribe_array, audio, offset, priority=Priority.INTERACTIVE)
+        except PoolSaturated:
+            if action == FINAL:
+                raise
+            session.mark_partial(0.0)  # Skip this partial; the final result still comes
+            return
+        stream_decode.observe(time.perf_counter() - started, "final" if action == FINAL else "partial")
+        text = "".join(segment["text"] for segment in segments).strip()
+        if action == FINAL:
+            session.finish_utterance()
+            last_partial_text = None
+        else:
+            session.mark_partial(time.perf_counter() - started)
+            if text == last_partial_text:
+                return  # Nothing new to show
+            last_partial_text = text
+        response = RealtimeTranscriptionResponse(
+            text=text,
+            is_final=action == FINAL,
+            segments=[TranscriptionSegmentDetail(**segment) for segment in segments],
+        )
+        await websocket.send_json(response.model_dump())
+
+    stream_sessions.inc()
+    try:
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                break
+            if message.get("bytes"):
+                session.push_audio(message["bytes"])
+                action = session.next_action()
+                while action is not None:
+                    await decode(action)
+                    action = session.next_action()
+            elif message.get("text"):
+                try:
+                    control = json.loads(message["text"])
+                except ValueError:
+                    control = None
+                if not isinstance(control, dict) or control.get("type") != "stop":
+                    await websocket.send_json({"type": "error", "detail": "Unrecognized control message"})
+                    continue
+                action = session.flush()
+                if action is not None:
+                    await decode(action)
+                await websocket.close()
+                break
+    except PoolSaturated as exc:
+        # An utterance could not be finalized: tell the client to reconnect later (1013 Try Again Later).
+        await websocket.send_json({"type": "error", "detail": str(exc), "pool": exc.pool,
+                                   "retry_after": exc.retry_after})
+        await websocket.close(code=1013)
+    except WebSocketDisconnect:
+        pass
+    finally:
+        stream_sessions.dec()
+    print(f"AI Service (Speech): Streaming transcription closed for recording_id: {recording_id}")
+
 @router.post("/transcribe_completed_audio", response_model=RealtimeTranscriptionResponse)
 async def transcribe_completed_audio_placeholder(
+    http_request: Request,
     recording_id: Optional[int] = Body(None),
     audio_data_ref: Optional[str] = Body(None) # Reference to where audio data is
 ):
     """
-    Placeholder for transcribing a complete audio file, returning only the final result.
-    The dummy data now includes speaker tags for a more complete simulation.
+    Transcribes a complete audio file, returning only the final result.
+    Simulated references (no file on disk) return the dummy final result.
     """
     print(f"AI Service (Speech): Received transcription request for completed audio recording_id: {recording_id}")
+    return await speech_pool.run(encoded, response_format(http_request), with_audio, audio_data_ref,
+                                 final_transcription)
+
+def final_transcription(source: Optional[AudioSource]) -> Dict[str, Any]:
+    """
+    RealtimeTranscriptionResponse fields, with the segments as a SegmentTable.
+    """
+    segments = transcribe_audio(source)
+    return {"text": segments.joined_text().strip(), "is_final": True, "segments": segments}
+
+def transcribe_source(source: AudioSource) -> List[dict]:
+    """
+    Transcribes the speech-only chunks of a recording, one chunk in memory at a time.
+    """
+    segments: List[dict] = []
+    for offset, chunk in source.speech_chunks():
+        segments.extend(transcribe_array(chunk, offset))
+    return segments
+
+def transcribe_audio(source: Optional[AudioSource]) -> SegmentTable:
+    """
+    Final transcript segments of a recording. Without audio (simulated
+    references) the dummy final segments are returned. Results are cached by
+    audio content and model.
+    """
+    if source is not None:
+        with stage("decode"):
+            key = content_key("transcription", asr_model_id(), source.digest(), segmentation_id())
+        with stage("inference"):
+            cached_segments = result_cache.cached("transcription", key, lambda: transcribe_source(source))
+        return SegmentTable.from_dicts(cached_segments)
+
     final_result_data = next((r for r in dummy_interim_results if r["is_final"]), None)
-    if not final_result_data: # Should not happen with current dummy data
-        return RealtimeTranscriptionResponse(
-            text="Error: No final result found in dummy data.",
-            is_final=True,
-            segments=[]
-        )
     # Ensure segments in the dummy final result have speaker if not already there (for consistency)
     # This is more for making the dummy data robust. Real WhisperX output would be processed.
-    processed_segments = []
-    for seg_data in final_result_data.get("segments", []):
-        segment = TranscriptionSegmentDetail(**seg_data)
-        if not segment.speaker: # Assign a default speaker if missing
-            segment.speaker = "SPEAKER_XX"
-        processed_segments.append(segment)
-
-    return RealtimeTranscriptionResponse(
-        text=final_result_data["text"],
-        is_final=final_result_data["is_final"],
-        segments=processed_segments
+    return SegmentTable.from_dicts(
+        dict(segment, speaker=segment.get("speaker") or "SPEAKER_XX") for segment in final_result_data["segments"]
     )
 
 
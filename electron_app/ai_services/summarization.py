@@ -0,0 +1,228 @@
+import asyncio
+import hashlib
+import re
+from collections import Counter
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from . import settings
+from .execution import nlp_pool
+from .result_cache import content_key, result_cache
+
+# --- Summarization Backend ---
+# Shared by the /ai/summarize endpoints and the recording pipeline.
+#
+# Transcripts are summarized map-reduce style, so a long session never has to
+# fit in one model context: the text is split into chunks of whole speaker
+# turns (a chunk never spans two protocol steps), the chunks are summarized in
+# parallel in the NLP pool, and their summaries are chunked and summarized
+# again, level by level, until a single chunk is left for the final summary.
+#
+# Chunk boundaries depend on content, not position: once a chunk is big enough,
+# a turn ends it if the turn's hash says so. An edit therefore only changes the
+# chunks around it. Every summary is cached under its input text, so
+# re-summarizing an edited transcript recomputes only the changed chunks and
+# the few summaries above them.
+
+SUMMARY_MODEL_ID = "extractive-1"
+
+# (section, text): a speaker turn or, above the first level, a chunk summary.
+Unit = Tuple[Optional[str], str]
+
+_SENTENCE_END = re.compile(r"(?<=[.!?…])\s+")
+_WORD = re.compile(r"\w+")
+
+def _sentences(text: str) -> List[str]:
+  return [sentence for line in text.splitlines() for sentence in (part.strip() for part in _SENTENCE_END.split(line))
+          if sentence]
+
+def generate_summary(text: str, max_words: int) -> Iterator[str]:
+  """
+  Yields the summary of one chunk token by token.
+  Placeholder until an LLM is wired in: keeps the sentences whose words are
+  most frequent in the chunk, in their original order, up to max_words.
+  """
+  sentences = _sentences(text)
+  frequencies = Counter(word for word in _WORD.findall(text.lower()) if len(word) > 2)
+
+  def score(sentence: str) -> float:
+    words = {word for word in _WORD.findall(sentence.lower()) if len(word) > 2}
+    return sum(frequencies[word] for word in words) / (len(sentence.split()) + 1) ** 0.5
+
+  chosen, length = [], 0
+  for index in sorted(range(len(sentences)), key=lambda index: -score(sentences[index])):
+    words = len(sentences[index].split())
+    if chosen and length + words > max_words:
+      continue
+    chosen.append(index)
+    length += words
+    if length >= max_words:
+      break
+  tokens = " ".join(sentences[index] for index in sorted(chosen)).split()[:max_words]
+  for position, token in enumerate(tokens):
+    yield token if position == 0 else " " + token
+
+# --- Chunking ---
+
+def transcript_units(text: str, segments: Optional[Sequence[Dict[str, Any]]] = None) -> List[Unit]:
+  """
+  Speaker turns of a transcript. With segments, consecutive segments of the
+  same speaker and section are one "SPEAKER: text" turn; without, every line
+  of the text is a turn. Turns longer than a chunk are split into sentences.
+  """
+  turns: List[Unit] = []
+  if segments:
+    speaker = section = None
+    for segment in segments:
+      segment_text = (segment.get("text") or "").strip()
+      if not segment_text:
+        continue
+      if turns and segment.get("speaker") == speaker and segment.get("section") == section:
+        turns[-1] = (section, turns[-1][1] + " " + segment_text)
+      else:
+        speaker, section = segment.get("speaker"), segment.get("section")
+        turns.append((section, f"{speaker}: {segment_text}" if speaker else segment_text))
+  else:
+    turns = [(None, line.strip()) for line in text.splitlines() if line.strip()]
+  units: List[Unit] = []
+  for section, turn in turns:
+    if len(turn.split()) > settings.SUMMARY_CHUNK_WORDS:
+      units.extend((section, sentence) for sentence in _sentences(turn))
+    else:
+      units.append((section, turn))
+  return units
+
+def _ends_chunk(text: str) -> bool:
+  return hashlib.blake2b(text.encode("utf-8"), digest_size=1).digest()[0] % 4 == 0
+
+def pack_chunks(units: Sequence[Unit], target_words: int) -> List[str]:
+  """
+  Groups units into chunks of roughly target_words (at most twice that,
+  unless one unit alone is longer), closing a chunk at a section change or
+  at a content-chosen unit.
+  """
+  chunks: List[str] = []
+  current: List[str] = []
+  words, section = 0, None
+  for unit_section, text in units:
+    unit_words = len(text.split())
+    if current and (unit_section != section or words + unit_words > 2 * target_words):
+      chunks.append("\n".join(current))
+      current, words = [], 0
+    current.append(text)
+    section = unit_section
+    words += unit_words
+    if words >= 2 * target_words or (words >= target_words // 2 and _ends_chunk(text)):
+      chunks.append("\n".join(current))
+      current, words = [], 0
+  if current:
+    chunks.append("\n".join(current))
+  return chunks
+
+def _next_level(chunks: List[str], summaries: List[str]) -> List[str]:
+  # A reduce input must fit a chunk (at most twice SUMMARY_CHUNK_WORDS) even if
+  # the model overshoots max_words, so any two summaries have to fit together.
+  limit = settings.SUMMARY_CHUNK_WORDS
+  cut = [" ".join(summary.split()[:limit]) for summary in summaries if summary]
+  combined = pack_chunks([(None, summary) for summary in cut], settings.SUMMARY_CHUNK_WORDS)
+  if len(combined) < len(chunks):
+    return combined
+  # Summaries that do not get shorter than their chunks would never converge:
+  # pair neighbours instead, which halves the count every level.
+  return ["\n".join(cut[index:index + 2]) for index in range(0, len(cut), 2)]
+
+def _summary_key(text: str, max_words: int) -> str:
+  return content_key("summary", SUMMARY_MODEL_ID, max_words, text)
+
+def _summarize_chunk(index: int, text: str, max_words: int) -> Tuple[int, str]:
+  return index, "".join(generate_summary(text, max_words))
+
+# --- Map-Reduce Summarization ---
+
+async def _stream_tokens(text: str, max_words: int) -> AsyncIterator[str]:
+  """
+  Runs generate_summary in the NLP pool and yields its tokens as they come.
+  """
+  loop = asyncio.get_running_loop()
+  tokens: asyncio.Queue = asyncio.Queue()
+  finished = object()
+
+  def produce():
+    for token in generate_summary(text, max_words):
+      loop.call_soon_threadsafe(tokens.put_nowait, token)
+
+  job = asyncio.ensure_future(nlp_pool.run(produce))
+  # Runs after the tokens queued above, also when the pool rejects the job.
+  job.add_done_callback(lambda _: tokens.put_nowait(finished))
+  try:
+    while True:
+      token = await tokens.get()
+      if token is finished:
+        break
+      yield token
+    await job
+  finally:
+    job.cancel()
+
+async def summarize_stream(
+  text: str, segments: Optional[Sequence[Dict[str, Any]]] = None
+) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+  """
+  Summarizes a transcript and yields (event, data) pairs: "progress" as chunk
+  summaries finish, "token" for each token of the final summary, then "done"
+  with the whole summary and how many summaries came from the cache.
+  """
+  chunks = pack_chunks(transcript_units(text, segments), settings.SUMMARY_CHUNK_WORDS)
+  first_level_chunks = len(chunks)
+  level = computed = cached = 0
+  while len(chunks) > 1:
+    keys = [_summary_key(chunk, settings.SUMMARY_CHUNK_SUMMARY_WORDS) for chunk in chunks]
+    found = await nlp_pool.run(result_cache.get_many, "summary", keys)
+    summaries = [found.get(key) for key in keys]
+    missing = [index for index, summary in enumerate(summaries) if summary is None]
+    cached += len(chunks) - len(missing)
+    progress = {"level": level, "chunks": len(chunks), "done": len(chunks) - len(missing)}
+    yield "progress", dict(progress)
+    jobs = [asyncio.ensure_future(nlp_pool.run(_summarize_chunk, index, chunks[index],
+                                               settings.SUMMARY_CHUNK_SUMMARY_WORDS)) for index in missing]
+    try:
+      for job in asyncio.as_completed(jobs):
+        index, summary = await job
+        summaries[index] = summary
+        progress["done"] += 1
+        yield "progress", dict(progress)
+    finally:
+      for job in jobs:
+        job.cancel()
+    computed += len(missing)
+    await nlp_pool.run(result_cache.put_many, "summary", {keys[index]: summaries[index] for index in missing})
+    chunks = _next_level(chunks, summaries)
+    level += 1
+
+  final_text = chunks[0] if chunks else ""
+  key = _summary_key(final_text, settings.SUMMARY_MAX_WORDS)
+  summary = await nlp_pool.run(result_cache.get, "summary", key) if final_text else ""
+  if summary is not None:
+    cached += bool(final_text)
+    for position, token in enumerate(summary.split()):
+      yield "token", {"text": token if position == 0 else " " + token}
+  else:
+    parts = []
+    async for token in _stream_tokens(final_text, settings.SUMMARY_MAX_WORDS):
+      parts.append(token)
+      yield "token", {"text": token}
+    summary = "".join(parts)
+    computed += 1
+    if summary:
+      await nlp_pool.run(result_cache.put, "summary", key, summary)
+  yield "done", {"summary": summary, "chunks": first_level_chunks, "levels": level + 1,
+                 "computed": computed, "cached": cached}
+
+async def summarize(text: str, segments: Optional[Sequence[Dict[str, Any]]] = None) -> Dict[str, Any]:
+  """
+  Like summarize_stream, but only returns the "done" data.
+  """
+  result: Dict[str, Any] = {}
+  async for event, data in summarize_stream(text, segments):
+    if event == "done":
+      result = data
+  return result
@@ -1,83 +1,111 @@
-from fastapi import APIRouter, Body, HTTPException
+from fastapi import APIRouter, Body, HTTPException, Query
 from pydantic import BaseModel
-from typing import Dict
+from typing import List, Optional
 import uuid
-import time
+
+from .. import settings
+from ..execution import PoolSaturated
+from ..metrics import TracedRoute, metrics
+from . import scheduler as scheduler_module
+from .scheduler import get_scheduler
 
 # --- Pydantic Models ---
 
 class TrainingJobRequest(BaseModel):
     model_type: str # e.g., "speech", "language", "ner"
+    num_threads: Optional[int] = None # CPU threads for this job; defaults to AI_TRAINING_THREADS_PER_JOB
 
 class TrainingJobStatus(BaseModel):
     job_id: str
     model_type: str
-    status: str # e.g., "queued", "starting", "running", "completed", "failed"
+    status: str # e.g., "queued", "running", "completed", "failed", "cancelled"
     progress: float # 0.0 to 100.0
     message: str
     last_updated: float # timestamp
+    created_at: Optional[float] = None
+
+class TrainingJobList(BaseModel):
+    jobs: List[TrainingJobStatus]
+
+# --- Job Store ---
+# Jobs are journaled in SQLite and run in a worker process pool (see
+# scheduler.py), so they survive restarts and progress without polling.
+
+def _to_status(job: dict) -> TrainingJobStatus:
+    return TrainingJobStatus(**{field: job[field] for field in TrainingJobStatus.model_fields})
+
+def on_startup():
+    """
+    Called once the training router is mounted: resumes interrupted jobs.
+    """
+    get_scheduler().recover()
 
-# --- In-memory Job Store ---
-# Note: This is not persistent and will reset on server restart.
-# For a real application, use a database or a more robust job queue.
-training_jobs_db: Dict[str, TrainingJobStatus] = {}
+def on_shutdown():
+    get_scheduler().shutdown()
 
 # --- FastAPI Router ---
-router = APIRouter()
+router = APIRouter(route_class=TracedRoute)
 
 @router.post("/start", response_model=TrainingJobStatus)
 async def start_training_job(
     request: TrainingJobRequest = Body(...)
 ):
     """
-    Starts a new dummy training job.
+    Queues a new training job in the worker pool.
     """
+    scheduler = get_scheduler()
+    if scheduler.status_counts().get("queued", 0) >= settings.TRAINING_MAX_QUEUED_JOBS:
+        # About one job's duration, when a queued job will have started.
+        retry_after = max(1, int(settings.TRAINING_TOTAL_STEPS * settings.TRAINING_STEP_SECONDS))
+        raise PoolSaturated("training", retry_after=retry_after)
     job_id = str(uuid.uuid4())
-    current_time = time.time()
-
-    initial_status = TrainingJobStatus(
-        job_id=job_id,
-        model_type=request.model_type,
-        status="starting", # Start with "starting" to trigger progress simulation on first status check
-        progress=0.0,
-        message=f"Training job for {request.model_type} model initialized.",
-        last_updated=current_time
-    )
-    training_jobs_db[job_id] = initial_status
-
-    print(f"AI Service (Training): Started job {job_id} for model type {request.model_type}")
-    return initial_status
+    num_threads = request.num_threads or settings.TRAINING_THREADS_PER_JOB
+    job = scheduler.submit(job_id, request.model_type, num_threads)
+    print(f"AI Service (Training): Queued job {job_id} for model type {request.model_type} "
+          f"({num_threads} threads)")
+    return _to_status(job)
 
 @router.get("/status/{job_id}", response_model=TrainingJobStatus)
 async def get_training_job_status(job_id: str):
     """
-    Returns the status of a training job, simulating progress.
+    Returns the status of a training job as last reported by its worker.
+    """
+    job = get_scheduler().get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Training job not found.")
+    return _to_status(job)
+
+@router.get("/list", response_model=TrainingJobList)
+async def list_training_jobs(
+    status: Optional[str] = Query(None),
+    limit: int = Query(100, ge=1, le=1000)
+):
+    """
+    Lists training jobs, newest first, optionally filtered by status.
+    """
+    return TrainingJobList(jobs=[_to_status(job) for job in get_scheduler().list(status, limit)])
+
+@router.post("/cancel/{job_id}", response_model=TrainingJobStatus)
+async def cancel_training_job(job_id: str):
+    """
+    Requests cancellation. Queued jobs stop immediately; running jobs stop at
+    their next step.
     """
-    if job_id not in training_jobs_db:
+    job = get_scheduler().cancel(job_id)
+    if job is None:
         raise HTTPException(status_code=404, detail="Training job not found.")
+    print(f"AI Service (Training): Cancellation requested for job {job_id}")
+    return _to_status(job)
+
+
+def _collect_metrics():
+    scheduler = scheduler_module._scheduler # Not created until the first training request
+    counts = scheduler.status_counts() if scheduler is not None else {}
+    return [
+        ("ai_training_jobs", "gauge", "Training jobs by status.",
+         [({"status": status}, count) for status, count in counts.items()]),
+        ("ai_queue_depth", "gauge", "Items waiting in a queue.", [({"queue": "training"}, counts.get("queued", 0))]),
+    ]
+
 
-    job = training_jobs_db[job_id]
-    current_time = time.time()
-
-    if job.status == "starting":
-        job.status = "running"
-        job.progress = 0.0 # Explicitly set to 0 when starting to run
-        job.message = f"Job {job_id} ({job.model_type}) is now running."
-    elif job.status == "running":
-        # Simulate progress increment only if some time has passed (e.g., > 1 sec)
-        # This is a very basic simulation.
-        if current_time - job.last_updated > 1: # Avoid instant completion
-            job.progress += 25.0 # Increment progress
-            if job.progress >= 100.0:
-                job.progress = 100.0
-                job.status = "completed"
-                job.message = f"Job {job_id} ({job.model_type}) completed successfully."
-            else:
-                job.message = f"Job {job_id} ({job.model_type}) is running, progress at {job.progress}%."
-    # No changes for "completed" or "failed" statuses in this simulation
-
-    job.last_updated = current_time
-    training_jobs_db[job_id] = job # Update the store
-
-    print(f"AI Service (Training): Status for job {job_id}: {job.status}, Progress: {job.progress}%")
-    return job
+metrics.register_collector(_collect_metrics)
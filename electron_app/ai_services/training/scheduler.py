@@ -0,0 +1,231 @@
+import json
+import multiprocessing
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, List, Optional
+
+from .. import settings
+from ..workers import limit_threads, lower_priority
+
+# --- Training Job Scheduler ---
+# Jobs are journaled in SQLite and executed in a bounded pool of worker
+# processes, so long runs never block the API event loop and survive restarts.
+# Workers write progress and a checkpoint after every step; on startup any job
+# that was queued or running is resubmitted and resumes from its checkpoint.
+# Cancellation is cooperative: the API sets a flag that workers check each step.
+
+ACTIVE_STATUSES = ("queued", "running")
+FINAL_STATUSES = ("completed", "failed", "cancelled")
+# A job is marked failed after its worker process died this many times.
+MAX_WORKER_CRASHES = 3
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id TEXT PRIMARY KEY,
+    model_type TEXT NOT NULL,
+    status TEXT NOT NULL,
+    progress REAL NOT NULL DEFAULT 0,
+    message TEXT NOT NULL DEFAULT '',
+    num_threads INTEGER NOT NULL,
+    checkpoint TEXT,
+    cancel_requested INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    last_updated REAL NOT NULL
+);
+"""
+
+
+def _connect(db_path: str) -> sqlite3.Connection:
+    connection = sqlite3.connect(db_path, timeout=30, check_same_thread=False)
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.row_factory = sqlite3.Row
+    return connection
+
+
+def _train_step(model_type: str, step: int, state: Dict) -> Dict:
+    """
+    One unit of training work. Placeholder until real fine-tuning lands: it only
+    sleeps, but it threads `state` through the checkpoint like a real trainer.
+    """
+    time.sleep(settings.TRAINING_STEP_SECONDS)
+    state["loss"] = round(1.0 / (step + 1), 4)
+    return state
+
+
+def run_training_job(job_id: str, db_path: str, total_steps: int) -> str:
+    """
+    Worker-process entry point. Resumes from the job's checkpoint, if any.
+    """
+    db = _connect(db_path)
+    row = db.execute("SELECT * FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+    limit_threads(row["num_threads"])
+    lower_priority(settings.BACKGROUND_WORKER_NICE)
+    checkpoint = json.loads(row["checkpoint"]) if row["checkpoint"] else {"step": 0, "state": {}}
+    step, state = checkpoint["step"], checkpoint["state"]
+    resumed = " (resumed from checkpoint)" if step else ""
+    with db:
+        db.execute("UPDATE jobs SET status = 'running', message = ?, last_updated = ? WHERE job_id = ?",
+                   (f"Job {job_id} ({row['model_type']}) is now running{resumed}.", time.time(), job_id))
+
+    while step < total_steps:
+        if db.execute("SELECT cancel_requested FROM jobs WHERE job_id = ?", (job_id,)).fetchone()[0]:
+            with db:
+                db.execute("UPDATE jobs SET status = 'cancelled', message = ?, last_updated = ? WHERE job_id = ?",
+                           (f"Job {job_id} was cancelled at step {step}.", time.time(), job_id))
+            return "cancelled"
+        state = _train_step(row["model_type"], step, state)
+        step += 1
+        progress = round(100.0 * step / total_steps, 2)
+        with db:
+            db.execute(
+                "UPDATE jobs SET progress = ?, checkpoint = ?, message = ?, last_updated = ? WHERE job_id = ?",
+                (progress, json.dumps({"step": step, "state": state}),
+                 f"Job {job_id} ({row['model_type']}) is running, progress at {progress}%.", time.time(), job_id),
+            )
+
+    with db:
+        db.execute("UPDATE jobs SET status = 'completed', progress = 100, message = ?, last_updated = ? "
+                   "WHERE job_id = ?",
+                   (f"Job {job_id} ({row['model_type']}) completed successfully.", time.time(), job_id))
+    return "completed"
+
+
+class TrainingScheduler:
+    def __init__(self, db_path: str, max_workers: int, total_steps: int):
+        self.db_path = db_path
+        self.max_workers = max_workers
+        self.total_steps = total_steps
+        self._db = _connect(db_path)
+        self._db.executescript(_SCHEMA)
+        # Re-entrant: Future.cancel() runs the done callback, which takes the lock again.
+        self._lock = threading.RLock()
+        self._futures: Dict[str, Future] = {}
+        self._shutting_down = False
+        self._crashes: Dict[str, int] = {}
+        self._executor = self._new_executor()
+
+    # --- Queries ---
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        with self._lock:
+            row = self._db.execute("SELECT * FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        return dict(row) if row else None
+
+    def list(self, status: Optional[str] = None, limit: int = 100) -> List[Dict]:
+        query = "SELECT * FROM jobs"
+        params: list = []
+        if status:
+            query += " WHERE status = ?"
+            params.append(status)
+        query += " ORDER BY created_at DESC LIMIT ?"
+        params.append(limit)
+        with self._lock:
+            return [dict(row) for row in self._db.execute(query, params)]
+
+    def status_counts(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._db.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+
+    # --- Commands ---
+
+    def submit(self, job_id: str, model_type: str, num_threads: int) -> Dict:
+        now = time.time()
+        with self._lock, self._db:
+            self._db.execute(
+                "INSERT INTO jobs (job_id, model_type, status, message, num_threads, created_at, last_updated) "
+                "VALUES (?, ?, 'queued', ?, ?, ?, ?)",
+                (job_id, model_type, f"Training job for {model_type} model queued.", num_threads, now, now),
+            )
+        self._dispatch(job_id)
+        return self.get(job_id)
+
+    def cancel(self, job_id: str) -> Optional[Dict]:
+        job = self.get(job_id)
+        if job is None or job["status"] in FINAL_STATUSES:
+            return job
+        with self._lock, self._db:
+            self._db.execute("UPDATE jobs SET cancel_requested = 1, last_updated = ? WHERE job_id = ?",
+                             (time.time(), job_id))
+            future = self._futures.get(job_id)
+            if future is not None and future.cancel():
+                # Never started, so no worker will see the flag.
+                self._db.execute("UPDATE jobs SET status = 'cancelled', message = ? WHERE job_id = ?",
+                                 (f"Job {job_id} was cancelled before it started.", job_id))
+        return self.get(job_id)
+
+    def recover(self) -> int:
+        """
+        Resubmits jobs interrupted by a restart. They resume from their checkpoints.
+        """
+        with self._lock, self._db:
+            job_ids = [row["job_id"] for row in self._db.execute(
+                "SELECT job_id FROM jobs WHERE status IN (?, ?) ORDER BY created_at", ACTIVE_STATUSES)]
+            self._db.execute("UPDATE jobs SET status = 'queued' WHERE status = 'running'")
+        for job_id in job_ids:
+            self._dispatch(job_id)
+        if job_ids:
+            print(f"AI Service (Training): Resumed {len(job_ids)} interrupted training jobs")
+        return len(job_ids)
+
+    def shutdown(self):
+        """
+        Stops workers without waiting for running jobs; they resume on next start.
+        """
+        self._shutting_down = True
+        # ProcessPoolExecutor has no public way to stop running tasks.
+        processes = list((getattr(self._executor, "_processes", None) or {}).values())
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        for process in processes:
+            process.terminate()
+
+    def _new_executor(self) -> ProcessPoolExecutor:
+        # spawn, not fork: workers must not inherit the server's threads and locks.
+        return ProcessPoolExecutor(max_workers=self.max_workers, mp_context=multiprocessing.get_context("spawn"))
+
+    def _dispatch(self, job_id: str):
+        with self._lock:
+            executor = self._executor
+            future = executor.submit(run_training_job, job_id, self.db_path, self.total_steps)
+            self._futures[job_id] = future
+        future.add_done_callback(lambda done: self._on_done(job_id, done, executor))
+
+    def _on_done(self, job_id: str, future: Future, executor: ProcessPoolExecutor):
+        with self._lock:
+            self._futures.pop(job_id, None)
+            if self._shutting_down or future.cancelled() or future.exception() is None:
+                return
+            if isinstance(future.exception(), BrokenProcessPool):
+                # A worker died (crash, OOM kill). Every job in that pool lands here;
+                # restart the pool once and resume them from their checkpoints.
+                crashes = self._crashes[job_id] = self._crashes.get(job_id, 0) + 1
+                if crashes <= MAX_WORKER_CRASHES:
+                    if executor is self._executor:
+                        self._executor = self._new_executor()
+                    print(f"AI Service (Training): Worker pool crashed, requeueing job {job_id}")
+                    self._dispatch(job_id)
+                    return
+            with self._db:
+                self._db.execute(
+                    "UPDATE jobs SET status = 'failed', message = ?, last_updated = ? "
+                    "WHERE job_id = ? AND status NOT IN ('completed', 'cancelled')",
+                    (f"Job {job_id} failed: {future.exception()!r}", time.time(), job_id))
+
+
+_scheduler: Optional[TrainingScheduler] = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler() -> TrainingScheduler:
+    global _scheduler
+    if _scheduler is None:
+        with _scheduler_lock:
+            if _scheduler is None:
+                _scheduler = TrainingScheduler(
+                    settings.data_path("training", "jobs.sqlite"),
+                    max_workers=settings.TRAINING_MAX_WORKERS,
+                    total_steps=settings.TRAINING_TOTAL_STEPS,
+                )
+    return _scheduler
@@ -0,0 +1,34 @@
+import os
+
+# --- Worker Process Helpers ---
+# Shared by every process pool in the service (training jobs, batch
+# transcription) so concurrent workers do not oversubscribe the CPU.
+
+
+def limit_threads(num_threads: int):
+    """
+    Caps math-library threads in this worker process. The environment variables
+    must be set before numpy/torch are imported, which is why pools use spawn.
+    """
+    for variable in ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS", "NUMEXPR_NUM_THREADS"):
+        os.environ[variable] = str(num_threads)
+    try:
+        import torch
+        torch.set_num_threads(num_threads)
+        torch.set_num_interop_threads(1)
+    except (ImportError, RuntimeError):
+        pass
+
+
+def lower_priority(niceness: int):
+    """
+    Raises this worker process's nice value to at least `niceness` (never
+    lowers it), so background work yields the CPU to the API's requests.
+    """
+    if niceness <= 0 or not hasattr(os, "setpriority"):
+        return
+    try:
+        if os.getpriority(os.PRIO_PROCESS, 0) < niceness:
+            os.setpriority(os.PRIO_PROCESS, 0, niceness)
+    except OSError:
+        pass
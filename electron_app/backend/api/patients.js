@@ -1,6 +1,24 @@
 const express = require('express');
 const router = express.Router();
 const { db } = require('../database/db'); // We'll add patient-specific DB functions later
+const axios = require('axios'); // For keeping the AI service's search index current
+
+const AI_SERVICE_URL = 'http://localhost:8000'; // URL of the Python AI service
+
+// Sends a patient's notes to the AI service's incremental search ingestion.
+// Only lines that changed since the last call are re-embedded there.
+const indexPatientForSearch = (patient) => {
+  const text = [patient.treatmentGoals, patient.medicalHistory].filter(Boolean).join('\n');
+  axios.post(`${AI_SERVICE_URL}/nlp/ingest`, {
+    records: [{
+      record_id: `patient-${patient.id}`,
+      type: 'patient',
+      title: `${patient.firstName} ${patient.lastName}`,
+      version: Date.now(),
+      text,
+    }],
+  }).catch(indexError => console.error(`Error indexing patient ID ${patient.id} for search:`, indexError.message));
+};
 
 // Patient-specific database interaction functions will be added here or in db.js
 
@@ -24,6 +42,7 @@ router.post('/', (req, res) => {
       console.error("Error creating patient:", err.message);
       return res.status(500).json({ error: 'Failed to create patient record', details: err.message });
     }
+    indexPatientForSearch({ id: this.lastID, firstName, lastName, medicalHistory, treatmentGoals });
     res.status(201).json({
       message: 'Patient created successfully',
       data: { id: this.lastID, firstName, lastName, dateOfBirth, contactInfo, medicalHistory, treatmentGoals },
@@ -91,6 +110,7 @@ router.put('/:id', (req, res) => {
     if (this.changes === 0) {
       return res.status(404).json({ message: `Patient with ID ${id} not found or no changes made` });
     }
+    indexPatientForSearch({ id, firstName, lastName, medicalHistory, treatmentGoals });
     res.json({
       message: `Patient with ID ${id} updated successfully`,
       data: { id, firstName, lastName, dateOfBirth, contactInfo, medicalHistory, treatmentGoals },
@@ -110,6 +130,8 @@ router.delete('/:id', (req, res) => {
     if (this.changes === 0) {
       return res.status(404).json({ message: `Patient with ID ${id} not found` });
     }
+    axios.post(`${AI_SERVICE_URL}/nlp/ingest/delete`, { record_ids: [`patient-${id}`] })
+      .catch(indexError => console.error(`Error removing patient ID ${id} from search:`, indexError.message));
     res.json({ message: `Patient with ID ${id} deleted successfully` });
   });
 });
@@ -1,6 +1,9 @@
 const express = require('express');
 const router = express.Router();
 const { db } = require('../database/db');
+const axios = require('axios'); // For keeping the AI service's search index current
+
+const AI_SERVICE_URL = 'http://localhost:8000'; // URL of the Python AI service
 
 // GET /api/protocols - Get a list of all protocols
 router.get('/', (req, res) => {
@@ -56,6 +59,16 @@ router.post('/', (req, res) => {
       console.error("Error creating protocol:", err.message);
       return res.status(500).json({ error: 'Failed to create protocol', details: err.message });
     }
+    // Index the description and one segment per step for search (does not block the response).
+    const stepLines = (steps || []).map(step => (typeof step === 'string' ? step : step.description || step.name || JSON.stringify(step)));
+    axios.post(`${AI_SERVICE_URL}/nlp/ingest`, {
+      records: [{
+        record_id: `protocol-${this.lastID}`,
+        type: 'protocol',
+        title: name,
+        text: [description, ...stepLines].filter(Boolean).join('\n'),
+      }],
+    }).catch(indexError => console.error(`Error indexing protocol ${name} for search:`, indexError.message));
     res.status(201).json({
       message: 'Protocol created successfully',
       data: { id: this.lastID, name, description, category, steps },
@@ -50,90 +50,44 @@ router.post('/:id/stop', async (req, res) => {
       });
     });
 
-    // 1. Call Python AI backend for detailed transcription (simulating WhisperX)
-    console.log(`Requesting detailed transcription for recording ID: ${id} from AI speech service...`);
-    const transcriptionResponse = await axios.post(`${AI_SERVICE_URL}/speech/transcribe_completed_audio`, {
-      recording_id: id,
-      audio_data_ref: "path/to/simulated_audio_for_" + id, // Dummy reference
-    });
-
-    let transcriptionText = "";
-    let initialSegments = []; // Segments from transcription service
+    // 1. Call the Python AI pipeline once: it decodes the audio a single time, runs
+    //    transcription and diarization concurrently, aligns speakers to segments,
+    //    then runs NER and summarization concurrently.
+    console.log(`Requesting processing for recording ID: ${id} from AI pipeline service...`);
+    let pipelineResponse;
+    try {
+      pipelineResponse = await axios.post(`${AI_SERVICE_URL}/pipeline/process`, {
+        recording_id: id,
+        audio_data_ref: "path/to/simulated_audio_for_" + id, // Dummy reference
+        num_speakers: null, // Let AI decide, or provide a hint
+        summarize: true,
+      });
+    } catch (pipelineError) {
+      pipelineResponse = pipelineError.response || { status: 500, data: { detail: pipelineError.message } };
+    }
 
-    if (transcriptionResponse.status === 200 && transcriptionResponse.data && transcriptionResponse.data.is_final) {
-      transcriptionText = transcriptionResponse.data.text;
-      initialSegments = transcriptionResponse.data.segments || [];
-      console.log(`Initial transcription for recording ID: ${id} received.`);
-    } else {
-      const errorDetail = transcriptionResponse.data ? JSON.stringify(transcriptionResponse.data) : `Status: ${transcriptionResponse.status}`;
-      console.warn(`AI speech service failed to transcribe recording ID: ${id}. ${errorDetail}`);
+    if (pipelineResponse.status !== 200 || !pipelineResponse.data) {
+      const errorDetail = pipelineResponse.data ? JSON.stringify(pipelineResponse.data) : `Status: ${pipelineResponse.status}`;
+      console.warn(`AI pipeline failed to process recording ID: ${id}. ${errorDetail}`);
       status = 'error_transcription_failed'; // More specific error
-      // Early update to DB if transcription fails fundamentally
+      // Early update to DB if processing fails fundamentally
       db.run('UPDATE recordings SET status = ?, endTime = ? WHERE id = ?', [status, endTime, id]);
       return res.status(500).json({ error: 'Transcription process failed.', details: errorDetail});
     }
 
-    // 2. Call Python AI backend for speaker diarization
-    console.log(`Requesting diarization for recording ID: ${id} from AI speech service...`);
-    const diarizationResponse = await axios.post(`${AI_SERVICE_URL}/speech/diarize`, {
-      recording_id: id,
-      // segments: initialSegments, // Optionally pass segments if diarization uses them
-      num_speakers: null // Let AI decide, or provide a hint
-    });
-
-    let finalSegments = initialSegments; // Default to initial segments
-
-    if (diarizationResponse.status === 200 && diarizationResponse.data) {
-      const diarizationResults = diarizationResponse.data; // List of {speaker, start_time, end_time}
-      console.log(`Diarization results for recording ID: ${id} received.`);
-
-      // Merge diarization results into transcription segments
-      // This is a simple merge logic: assumes segments from transcription and diarization align or can be matched by time.
-      // A more robust merge would involve complex logic to map speakers to word-level segments.
-      // For this placeholder, we'll try to assign speaker to existing segments based on time overlap.
-      finalSegments = initialSegments.map(seg => {
-        const matchingDiarization = diarizationResults.find(
-          d => seg.start_time >= d.start_time && seg.end_time <= d.end_time
-        );
-        return { ...seg, speaker: matchingDiarization ? matchingDiarization.speaker : (seg.speaker || "UNKNOWN") };
-      });
-      console.log(`Merged segments for recording ID: ${id} prepared.`);
-    } else {
-      console.warn(`AI speech service failed to diarize for recording ID: ${id}. Status: ${diarizationResponse.status}`);
-      // Proceed with transcription segments without speaker labels if diarization fails
-      // Or, set a different status like 'transcribed_no_diarization'
-    }
-
+    const transcriptionText = pipelineResponse.data.text || "";
+    const finalSegments = pipelineResponse.data.segments || []; // Speakers already assigned
     const segmentsJson = JSON.stringify(finalSegments);
-    let nerResultsJson = null;
-
-    // 3. Call Python AI backend for NER if transcription was successful
-    if (transcriptionText) {
-      console.log(`Requesting NER for recording ID: ${id} from AI NLP service...`);
-      try {
-        const nerResponse = await axios.post(`${AI_SERVICE_URL}/nlp/ner`, {
-          recording_id: id,
-          text: transcriptionText,
-        });
-        if (nerResponse.status === 200 && nerResponse.data && nerResponse.data.entities) {
-          nerResultsJson = JSON.stringify(nerResponse.data.entities);
-          console.log(`NER results for recording ID: ${id} received.`);
-        } else {
-          console.warn(`AI NLP service failed to extract entities for recording ID: ${id}. Status: ${nerResponse.status}`);
-          // Proceed without NER results, or set a specific status
-        }
-      } catch (nerError) {
-        console.error(`Error calling NER service for recording ID ${id}:`, nerError.message);
-        // Proceed without NER results
-      }
-    }
+    const nerResultsJson = JSON.stringify(pipelineResponse.data.entities || []);
+    const summaryText = pipelineResponse.data.summary || null;
+    console.log(`AI pipeline results for recording ID: ${id} received.`, pipelineResponse.data.timings);
 
-    // 4. Update recording with final transcription, diarization, and NER data
-    updateSql = 'UPDATE recordings SET status = ?, transcription_text = ?, transcription_segments = ?, ner_results = ? WHERE id = ?';
+    // 2. Update recording with final transcription, diarization, NER and summary data
+    updateSql = 'UPDATE recordings SET status = ?, transcription_text = ?, transcription_segments = ?, ner_results = ?, summary_text = ? WHERE id = ?';
     status = 'transcribed'; // Mark as transcribed (with or without diarization/NER)
 
     await new Promise((resolve, reject) => {
-      db.run(updateSql, [status, transcriptionText, segmentsJson, nerResultsJson, id], function(err) {
+      db.run(updateSql, [status, transcriptionText, segmentsJson, nerResultsJson, summaryText, id], function(err) {
         if (err) {
           console.error("Error saving final transcription, diarization, and NER data:", err.message);
           return reject({ status: 500, error: 'Failed to save all processed data', details: err.message });
@@ -143,6 +97,24 @@ router.post('/:id/stop', async (req, res) => {
       });
     });
 
+    // 3. Index the transcript for search (does not block the response). The AI
+    //    service diffs the segments against what it indexed for this recording
+    //    before and only embeds new or changed ones.
+    const searchRecord = {
+      record_id: `recording-${id}`,
+      type: 'recording_segment',
+      title: `Recording ${id}`,
+      segments: finalSegments
+        .filter(seg => seg.text && seg.text.trim())
+        .map(seg => ({
+          text: seg.text,
+          title: `Recording ${id} - ${seg.speaker || 'UNKNOWN'} @ ${Number(seg.start_time).toFixed(1)}s`,
+        })),
+    };
+    axios.post(`${AI_SERVICE_URL}/nlp/ingest`, { records: [searchRecord] })
+      .then(ingestResponse => console.log(`Indexed recording ID: ${id} for search (${ingestResponse.data.embedded} segments embedded).`))
+      .catch(indexError => console.error(`Error indexing recording ID ${id} for search:`, indexError.message));
+
     // Fetch the final state of the recording
     const finalRecordingSql = "SELECT * FROM recordings WHERE id = ?";
     db.get(finalRecordingSql, [id], (err, row) => {
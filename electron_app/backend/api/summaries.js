@@ -15,7 +15,7 @@ router.post('/generate', async (req, res) => {
 
   try {
     // 1. Fetch the transcription text from the database
-    const recordingSql = "SELECT transcription_text FROM recordings WHERE id = ?";
+    const recordingSql = "SELECT transcription_text, transcription_segments FROM recordings WHERE id = ?";
     const recording = await new Promise((resolve, reject) => {
       db.get(recordingSql, [recording_id], (err, row) => {
         if (err) {
@@ -31,11 +31,20 @@ router.post('/generate', async (req, res) => {
       });
     });
 
-    // 2. Call Python AI backend for summarization
+    // 2. Call Python AI backend for summarization. With the speaker-attributed
+    //    segments it chunks the transcript by speaker turn; chunk summaries are
+    //    cached, so re-summarizing after an edit only redoes the changed parts.
+    let segments = null;
+    try {
+      segments = recording.transcription_segments ? JSON.parse(recording.transcription_segments) : null;
+    } catch (parseError) {
+      console.warn(`Ignoring unreadable transcription segments for recording ID: ${recording_id}.`);
+    }
     console.log(`Requesting summary for recording ID: ${recording_id} from AI service...`);
     const aiResponse = await axios.post(`${AI_SERVICE_URL}/ai/summarize`, {
       recording_id: recording_id,
       transcription_text: recording.transcription_text, // Send transcription text
+      segments: Array.isArray(segments) && segments.length > 0 ? segments : null,
     });
 
     if (aiResponse.status === 200 && aiResponse.data && aiResponse.data.summary) {